@@ -1,14 +1,27 @@
 from .backend import Backend, PublishFunc
+from .capture_thread import CaptureThread
+from .frame_pacer import FramePacer
+from .frame_pool import AllocationCheck, FramePool
 from .backend_factory import BackendFactory
 from .picamera_backend import PiCameraBackend
+from .compositing_backend import CompositingBackend
 from .opencv_backend import OpenCVBackend
 from .opencv_static_image_backend import OpenCVStaticImageBackend
+from .headless_backend import HeadlessBackend
+from .video_file_backend import VideoFileBackend
 
 __all__ = [
     "Backend",
     "PublishFunc",
+    "CaptureThread",
+    "FramePacer",
+    "FramePool",
+    "AllocationCheck",
     "BackendFactory",
     "PiCameraBackend",
+    "CompositingBackend",
     "OpenCVBackend",
     "OpenCVStaticImageBackend",
+    "HeadlessBackend",
+    "VideoFileBackend",
 ]
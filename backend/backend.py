@@ -1,13 +1,28 @@
 from abc import ABC, abstractmethod
 from json import dumps
 from pathlib import Path
-from shutil import disk_usage
 from time import time
 from traceback import format_exc
-from typing import Callable
-
+from typing import Callable, Dict, Optional
+
+from backend.burn_in import BurnInRecorder
+from backend.disk_monitor import DiskMonitor, LowSpaceAction
+from backend.frame_pacer import FramePacer
+from backend.frame_pool import AllocationCheck, FramePool
+from backend.mjpeg_stream import MjpegStream
+from backend.pre_roll import PreRollBuffer
+from backend.recordings import RecordingManager
+from backend.telemetry import TelemetryWriter
+from backend.video_recorder import VideoRecorder
 from canvas import Canvas
-from config import ROTATION_KEY, read_configs
+from config import (
+    DEBUG_ALLOCATIONS_KEY,
+    DEFAULT_FRAMERATE,
+    FRAMERATE_KEY,
+    ROTATION_KEY,
+    read_configs,
+)
+from data import Data
 
 # A function which accepts a string and returns None
 PublishFunc = Callable[[str], None]
@@ -19,6 +34,15 @@ class Backend(ABC):
         Handle combining the video feed with overlays and displaying, and
         recording the video feed to a file. """
 
+    # Extension of the recorded video files
+    recording_file_extension = "h264"
+
+    # Folder recordings are saved in
+    recordings_folder = Path(__file__).parent.parent / "recordings"
+
+    # Whether on_loop is limited to the target frame rate
+    paced = True
+
     def __init__(
         self,
         width: int,
@@ -36,6 +60,21 @@ class Backend(ABC):
         self.recording = False
         self.recording_output_file = None
         self.recording_start_time = None
+        # Whether recordings have the overlay burnt in, which always records
+        # with VideoRecorder
+        self.burn_in = BurnInRecorder.is_enabled()
+        if self.burn_in:
+            self.recording_file_extension = VideoRecorder.file_extension
+        # Allocates the names of recording files, and splits recordings into
+        # segments if enabled
+        self.recordings = RecordingManager.from_configs(
+            self.recordings_folder, self.recording_file_extension
+        )
+        # Measures free disk space in the background, so the frame loop
+        # doesn't wait for the filesystem
+        self.disk_monitor = DiskMonitor.from_configs(
+            self.recordings_folder.parent, self.recordings
+        )
 
         # Time that we last called self.send_recording_status
         self.prev_record_status_time = 0
@@ -47,8 +86,41 @@ class Backend(ABC):
         # Time between recording statuses, in seconds
         self.video_status_interval = 60
 
+        configs = read_configs()
         # Rotation of video feed in degrees clockwise
-        self.video_rotation = read_configs().get(ROTATION_KEY, 0)
+        self.video_rotation = configs.get(ROTATION_KEY, 0)
+
+        # Limits how often on_loop runs to the target frame rate
+        self.frame_pacer = FramePacer(
+            configs.get(FRAMERATE_KEY, DEFAULT_FRAMERATE)
+        )
+
+        # Buffers for the frames passed between processing stages
+        self.frame_pool = FramePool()
+        # When debugging, checks that no arrays of a single channel's size
+        # or larger are allocated by each call to self._on_loop
+        self.allocation_check = None
+        if configs.get(DEBUG_ALLOCATIONS_KEY, False):
+            self.allocation_check = AllocationCheck(self.width * self.height)
+
+        # Streams the composited video over HTTP, if enabled. Only backends
+        # which composite frames themselves submit frames to it.
+        self.stream = MjpegStream.from_configs(self.frame_pool)
+
+        # The last few seconds of encoded video, which are added to the start
+        # of each recording, or None if disabled
+        self.pre_roll = PreRollBuffer.from_configs()
+
+        # Records the bike data for each frame alongside recordings, once
+        # the data has been given with self.set_data
+        self.telemetry: Optional[TelemetryWriter] = None
+
+    def set_data(self, data: Data) -> None:
+        """ Record a snapshot of data for each frame of recordings, in a
+            telemetry file alongside each video file, unless disabled in
+            configs.json. """
+        if TelemetryWriter.is_enabled():
+            self.telemetry = TelemetryWriter(data, self.recordings)
 
     @abstractmethod
     def _is_video_on(self) -> bool:
@@ -101,10 +173,25 @@ class Backend(ABC):
 
             This includes sending the recording status (if it is due) and
             depending on the backend, the display may be updated during this
-            call. This operation may be blocking to ensure the display is
-            updated at the correct framerate. """
+            call. This operation blocks for the rest of the frame to ensure
+            the display is updated at the correct framerate. """
         with self.exception_handler:
-            self._on_loop()
+            if self.allocation_check is None:
+                self._on_loop()
+            else:
+                with self.allocation_check:
+                    self._on_loop()
+
+        if self.paced:
+            self.frame_pacer.wait()
+
+        if (
+            self.recording
+            and self.disk_monitor.low_space
+            and self.disk_monitor.action is LowSpaceAction.stop
+        ):
+            print("Stopping recording, as the disk is nearly full")
+            self.stop_recording()
 
         if time() > self.prev_record_status_time + self.record_status_interval:
             self.send_recording_status()
@@ -116,8 +203,9 @@ class Backend(ABC):
     def _on_loop(self) -> None:
         """ Implemented by overlays to perform any necessary operations that
             should be performed on a regular period. This may involve updating
-            the display, which may be blocking. Should not be called outside
-            of the Backend class. """
+            the display. Waiting for the next frame is handled by
+            self.frame_pacer, so this should not sleep. Should not be called
+            outside of the Backend class. """
 
     @abstractmethod
     def stop_video(self) -> None:
@@ -136,29 +224,26 @@ class Backend(ABC):
             self.send_recording_status()
             return
 
-        # Ensure output folder exists
-        output_folder = Path(__file__).parent.parent / "recordings"
-        output_folder.mkdir(exist_ok=True)
-
-        # Find next available video filename
-        video_number = 1
-        output_file_pattern = "rec_{}.h264"
-        while (
-            output_folder / output_file_pattern.format(video_number)
-        ).exists():
-            video_number += 1
-        self.recording_output_file = str(
-            output_folder / output_file_pattern.format(video_number)
-        )
+        # Allocate the next available video filename
+        self.recording_output_file = self.recordings.start()
+
+        # The recorder writes the telemetry of each frame, from the first
+        try:
+            if self.telemetry is not None:
+                self.telemetry.start()
+        except Exception:
+            self.send_recording_error()
 
         # Start recording. Send an error if one occurs, otherwise a status.
         try:
             self._start_recording()
         except Exception:
             self.recording = False
+            self._stop_telemetry()
+            self.recordings.stop()
             self.send_recording_error()
-        else:
-            self.send_recording_status()
+            return
+        self.send_recording_status()
 
     def _start_recording(self) -> None:
         """ Start recording to the file at self.recording_output_file. Should
@@ -182,6 +267,17 @@ class Backend(ABC):
             self.send_recording_error()
         else:
             self.send_recording_status()
+        self._stop_telemetry()
+        self.recordings.stop()
+
+    def _stop_telemetry(self) -> None:
+        """ Write out and close the telemetry file, once the recorder has
+            written its last frame. """
+        if self.telemetry is not None:
+            try:
+                self.telemetry.stop()
+            except Exception:
+                self.send_recording_error()
 
     def _stop_recording(self) -> None:
         """ Stop recording and save to the file at self.recording_output_file.
@@ -191,6 +287,11 @@ class Backend(ABC):
             f"Recording is not supported with {type(self).__name__}"
         )
 
+    def get_recording_stats(self) -> Dict[str, float]:
+        """ Get any statistics about the current recording to include in the
+            recording status. """
+        return {}
+
     def check_recording_errors(self) -> None:
         """ Check if any errors have occured during recording, and if any have
             occured, throw exceptions. """
@@ -204,19 +305,24 @@ class Backend(ABC):
         if self.recording:
             try:
                 self.check_recording_errors()
+                if self.telemetry is not None:
+                    self.telemetry.check_errors()
                 message["status"] = "recording"
                 message["recordingMinutes"] = (
                     time() - self.recording_start_time
                 ) / 60
-                message["recordingFile"] = self.recording_output_file
+                message["recordingFile"] = (
+                    self.recordings.path or self.recording_output_file
+                )
+                message["recordingSegments"] = self.recordings.segments
+                message.update(self.get_recording_stats())
 
             except Exception:
                 self.send_recording_error()
                 return
         else:
             message["status"] = "off"
-        _, _, free_disk_space = disk_usage(Path(__file__).parent)
-        message["diskSpaceRemaining"] = free_disk_space
+        message.update(self.disk_monitor.get_stats())
 
         self.publish_recording_status_func(dumps(message))
         self.prev_record_status_time = time()
@@ -224,29 +330,44 @@ class Backend(ABC):
     def send_recording_error(self) -> None:
         """Send the most recent exception to the recording status topic."""
 
-        _, _, free_disk_space = disk_usage(Path(__file__).parent)
         message = {
             "status": "error",
             "error": format_exc(),
-            "diskSpaceRemaining": free_disk_space,
+            "diskSpaceRemaining": self.disk_monitor.free_bytes,
         }
         self.publish_recording_status_func(dumps(message))
         print(format_exc())
 
+    def get_video_stats(self) -> Dict[str, float]:
+        """ Get any statistics about the video feed to include in the video
+            status. """
+        return {}
+
     def send_video_status(self, status: bool = None) -> None:
         """ Publish the camera's status to the camera's online topic. """
         if status is None:
             status = self._is_video_on()
-        self.publish_video_status_func(dumps({"online": status}))
+        message = {"online": status, **self.frame_pacer.get_stats()}
+        message.update(self.get_video_stats())
+        if self.stream is not None:
+            message.update(self.stream.get_stats())
+        self.publish_video_status_func(dumps(message))
         self.prev_video_status_time = time()
 
     def __enter__(self):
         """ Ran when Python's `with ...` syntax is used on an instance of this
             class. """
         self.start_video()
+        self.frame_pacer.reset()
+        self.disk_monitor.start()
+        if self.stream is not None:
+            self.stream.start()
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
         """ Ran when exiting a `with` block. """
+        if self.stream is not None:
+            self.stream.stop()
+        self.disk_monitor.stop()
         self.stop_video()
         self.send_video_status(False)
@@ -36,5 +36,21 @@ class BackendFactory:
                 publish_video_status_func,
                 exception_handler,
             )
+        elif backend_name == "headless":
+            return backend.HeadlessBackend(
+                width,
+                height,
+                publish_recording_status_func,
+                publish_video_status_func,
+                exception_handler,
+            )
+        elif backend_name == "video_file":
+            return backend.VideoFileBackend(
+                width,
+                height,
+                publish_recording_status_func,
+                publish_video_status_func,
+                exception_handler,
+            )
         else:
             raise NotImplementedError(f"Unknown backend: {backend_name}")
@@ -0,0 +1,270 @@
+import os
+from collections import deque
+from enum import Enum
+from threading import Condition, Thread
+from time import perf_counter
+from typing import Callable, Deque, Dict, List, Optional, Union
+
+import numpy as np
+
+from config import RECORDING_SINK_KEY, read_configs
+
+
+class FsyncPolicy(Enum):
+    """ When written video is forced onto the storage device """
+
+    # Leave it to the OS
+    never = "never"
+    # Every BufferedSink.fsync_interval seconds
+    interval = "interval"
+    # When each file is closed
+    close = "close"
+
+
+class BufferedSink:
+    """ A file-like output for encoded video, which collects writes in memory
+        and writes them to the file on a background thread.
+
+        SD cards can stall writes for hundreds of milliseconds, so encoders
+        only ever copy into a buffer. Each full buffer is written to the file
+        in one write, of a whole number of blocks. If every buffer is waiting
+        to be written, another is allocated rather than waiting, up to
+        max_buffers. Past that, writes wait up to block_seconds for a buffer
+        to be written, and are dropped if none is, so a stalled card can't
+        use up the memory. Dropped writes are counted in self.get_stats.
+
+        The sink can move on to a new file with self.switch, after the data
+        already written to it. """
+
+    # Size of the blocks buffers are rounded up to, in bytes
+    block_size = 4096
+
+    # Number of recent write latencies kept to calculate percentiles
+    latency_window = 256
+
+    def __init__(
+        self,
+        path: str,
+        buffer_size: int = 1 << 20,
+        buffer_count: int = 4,
+        fsync_policy: FsyncPolicy = FsyncPolicy.close,
+        fsync_interval: float = 5,
+        clock: Callable[[], float] = perf_counter,
+        max_buffers: int = 32,
+        block_seconds: float = 0.05,
+    ):
+        self.path = path
+        self.buffer_size = -(-buffer_size // self.block_size) * self.block_size
+        self.max_buffers = max(max_buffers, buffer_count)
+        self.block_seconds = block_seconds
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self._clock = clock
+
+        # Empty buffers, and the buffer being filled with its length. Once a
+        # buffer is queued, the next is only taken when there is data for it.
+        self._free: List[bytearray] = [
+            bytearray(self.buffer_size) for _ in range(buffer_count)
+        ]
+        self._buffer: Optional[bytearray] = None
+        self._length = 0
+        # Filled buffers with their lengths, or paths of files to switch to
+        self._queue: Deque[Union[tuple, str]] = deque()
+        self._condition = Condition()
+        self._running = True
+        # Exception raised by the writer thread, see self.check_errors
+        self._error: Optional[Exception] = None
+
+        # Counters
+        self.buffers_allocated = buffer_count
+        self.bytes_written = 0
+        # Writes dropped as every buffer was waiting to be written
+        self.writes_dropped = 0
+        self.bytes_dropped = 0
+        # Most bytes waiting to be written at once
+        self.high_water = 0
+        self._pending = 0
+        self._latencies: Deque[float] = deque(maxlen=self.latency_window)
+
+        self._fd = self._open(path)
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def from_configs(path: str) -> "BufferedSink":
+        """ Creates a sink with the buffer and fsync settings from
+            configs.json """
+        configs = read_configs().get(RECORDING_SINK_KEY, {})
+        return BufferedSink(
+            path,
+            int(configs.get("bufferMegabytes", 1) * (1 << 20)),
+            configs.get("buffers", 4),
+            FsyncPolicy(configs.get("fsync", FsyncPolicy.close.value)),
+            configs.get("fsyncInterval", 5),
+            max_buffers=configs.get("maxBuffers", 32),
+            block_seconds=configs.get("blockSeconds", 0.05),
+        )
+
+    def write(self, data: bytes) -> int:
+        """ Copies data into the buffers, without waiting for the file unless
+            every buffer is full. Data which is dropped as there's no room
+            for it still counts as written, so encoders carry on. """
+        self.check_errors()
+        data = memoryview(data).cast("B")
+        with self._condition:
+            if not self._condition.wait_for(
+                lambda: self._has_room(len(data)), self.block_seconds
+            ):
+                self.writes_dropped += 1
+                self.bytes_dropped += len(data)
+                return len(data)
+
+            written = 0
+            while written < len(data):
+                if self._buffer is None:
+                    self._buffer = self._take_buffer()
+                start = self._length
+                end = min(self.buffer_size, start + len(data) - written)
+                stop = written + end - start
+                self._buffer[start:end] = data[written:stop]
+                written = stop
+                self._length = end
+                if end == self.buffer_size:
+                    self._queue_buffer()
+            self._pending += written
+            self.high_water = max(self.high_water, self._pending)
+        return written
+
+    def flush(self) -> None:
+        """ Queues the buffered data to be written, without waiting. """
+        with self._condition:
+            if self._length:
+                self._queue_buffer()
+
+    def switch(self, path: str) -> None:
+        """ Moves on to writing to the file at path, once everything written
+            so far is in the current file. """
+        with self._condition:
+            if self._length:
+                self._queue_buffer()
+            self._queue.append(path)
+            self._condition.notify_all()
+
+    def close(self) -> None:
+        """ Writes everything buffered to the file, then closes it. """
+        self.flush()
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join()
+        self.check_errors()
+
+    def check_errors(self) -> None:
+        """ Raises any exception which stopped the writer thread. """
+        if self._error is not None:
+            raise self._error
+
+    def get_stats(self) -> Dict[str, float]:
+        """ Get the write counters, eg. for the recording status. """
+        with self._condition:
+            latencies = np.array(self._latencies)
+            pending = self._pending
+        stats = {
+            "sinkPendingBytes": pending,
+            "sinkHighWaterBytes": self.high_water,
+            "sinkBuffers": self.buffers_allocated,
+            "sinkDroppedWrites": self.writes_dropped,
+            "sinkDroppedBytes": self.bytes_dropped,
+        }
+        if len(latencies):
+            p50, p99 = np.percentile(latencies, [50, 99])
+            stats.update(
+                {
+                    "writeLatencyP50": float(p50),
+                    "writeLatencyP99": float(p99),
+                    "writeLatencyMax": float(latencies.max()),
+                }
+            )
+        return stats
+
+    def _has_room(self, size: int) -> bool:
+        """ Whether there are enough buffers free, or left to allocate, for
+            size more bytes. Must be called while holding self._condition. """
+        if not self._running:
+            return True
+        needed = -(-(self._length + size) // self.buffer_size)
+        if self._buffer is not None:
+            needed -= 1
+        spare = self.max_buffers - self.buffers_allocated
+        return needed <= len(self._free) + spare
+
+    def _take_buffer(self) -> bytearray:
+        """ Takes a free buffer, or allocates one. Must be called while
+            holding self._condition. """
+        if self._free:
+            return self._free.pop()
+        self.buffers_allocated += 1
+        return bytearray(self.buffer_size)
+
+    def _queue_buffer(self) -> None:
+        """ Queues the current buffer to be written. Must be called while
+            holding self._condition. """
+        self._queue.append((self._buffer, self._length))
+        self._buffer = None
+        self._length = 0
+        self._condition.notify_all()
+
+    def _open(self, path: str) -> int:
+        return os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+
+    def _close_file(self) -> None:
+        if self.fsync_policy is not FsyncPolicy.never:
+            os.fsync(self._fd)
+        os.close(self._fd)
+
+    def _run(self) -> None:
+        last_fsync_time = self._clock()
+        try:
+            while True:
+                with self._condition:
+                    self._condition.wait_for(
+                        lambda: self._queue or not self._running
+                    )
+                    if not self._queue:
+                        break
+                    item = self._queue.popleft()
+
+                if isinstance(item, str):
+                    self._close_file()
+                    self._fd = self._open(item)
+                    self.path = item
+                    continue
+
+                buffer, length = item
+                start_time = self._clock()
+                view = memoryview(buffer)[:length]
+                while view:
+                    written = os.write(self._fd, view)
+                    view = view[written:]
+                if (
+                    self.fsync_policy is FsyncPolicy.interval
+                    and start_time - last_fsync_time >= self.fsync_interval
+                ):
+                    os.fsync(self._fd)
+                    last_fsync_time = start_time
+                latency = self._clock() - start_time
+
+                with self._condition:
+                    self._latencies.append(latency)
+                    self._pending -= length
+                    self.bytes_written += length
+                    self._free.append(buffer)
+                    self._condition.notify_all()
+        except Exception as error:
+            self._error = error
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+        else:
+            self._close_file()
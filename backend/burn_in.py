@@ -0,0 +1,253 @@
+from threading import Condition, Lock, Thread
+from time import perf_counter
+from typing import Callable, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from backend.frame_pool import FramePool
+from backend.recordings import RecordingManager
+from backend.telemetry import Snapshot, TelemetryWriter
+from backend.video_recorder import VideoRecorder
+from canvas import FlattenedCanvas
+from config import BURN_IN_KEY, read_configs
+
+
+class BurnInRecorder:
+    """ Records video with the overlay burnt in, at its own resolution and
+        frame rate, so recordings show what the rider saw.
+
+        Frames are handed to a worker thread, which blends the overlay onto
+        them and scales them to the recording size before they are queued
+        for the encoder. Writing a frame only copies it, so the display loop
+        isn't held up. If the worker is still busy with the previous frame,
+        that frame is dropped in favour of the new one.
+
+        Frames are only taken at up to framerate. If an overlay is given, a
+        copy of it is blended onto each frame (see self.update_overlay),
+        otherwise frames are expected to have the overlay on them already.
+        If a TelemetryWriter is given, the data is taken as each frame is
+        written, and recorded if the frame is. """
+
+    def __init__(
+        self,
+        path: str,
+        size: Tuple[int, int],
+        framerate: float,
+        overlay: Optional[FlattenedCanvas] = None,
+        pool: Optional[FramePool] = None,
+        recordings: Optional[RecordingManager] = None,
+        telemetry: Optional[TelemetryWriter] = None,
+    ):
+        """ size is the (width, height) of the recording """
+        self.size = size
+        self.framerate = framerate
+        self.pool = pool if pool is not None else FramePool()
+        self.telemetry = telemetry
+        self.recorder = VideoRecorder.from_configs(
+            path, framerate, size, self.pool, recordings, telemetry
+        )
+
+        # The overlay, and the copy of it used by the worker
+        self.overlay = overlay
+        self._overlay_copy: Optional[FlattenedCanvas] = None
+        if overlay is not None:
+            self._overlay_copy = FlattenedCanvas(overlay.width, overlay.height)
+        self._overlay_lock = Lock()
+
+        # Newest frame not yet taken by the worker, with its capture time
+        # and the data when it was captured
+        self._frame: Optional[
+            Tuple[float, np.ndarray, Optional[Snapshot]]
+        ] = None
+        self._condition = Condition()
+        self._thread: Optional[Thread] = None
+        self._running = False
+        # Time the next frame is due
+        self._next_frame_time: Optional[float] = None
+
+        # Counters
+        self.frames_dropped = 0
+
+    @staticmethod
+    def from_configs(
+        path: str,
+        default_framerate: float,
+        default_size: Tuple[int, int],
+        overlay: Optional[FlattenedCanvas] = None,
+        pool: Optional[FramePool] = None,
+        recordings: Optional[RecordingManager] = None,
+        telemetry: Optional[TelemetryWriter] = None,
+    ) -> "BurnInRecorder":
+        """ Creates a recorder with the frame rate and size set in
+            configs.json, defaulting to those given. """
+        configs = read_configs().get(BURN_IN_KEY, {})
+        width, height = default_size
+        return BurnInRecorder(
+            path,
+            (configs.get("width", width), configs.get("height", height)),
+            configs.get("fps", default_framerate),
+            overlay,
+            pool,
+            recordings,
+            telemetry,
+        )
+
+    @staticmethod
+    def is_enabled() -> bool:
+        """ Whether burn-in recording is enabled in configs.json """
+        return read_configs().get(BURN_IN_KEY, {}).get("enabled", False)
+
+    def start(self) -> None:
+        """ Opens the video file and starts the worker. """
+        self.update_overlay()
+        self.recorder.start()
+        self._running = True
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self, frame: np.ndarray) -> None:
+        """ Queues a copy of the frame to be recorded, unless it is too soon
+            after the last one. """
+        now = perf_counter()
+        period = 1 / self.framerate
+        if self._next_frame_time is not None and now < self._next_frame_time:
+            return
+        # Keep to the frame rate on average, without catching up on frames
+        # which were missed entirely
+        if (
+            self._next_frame_time is None
+            or now > self._next_frame_time + period
+        ):
+            self._next_frame_time = now
+        self._next_frame_time += period
+
+        snapshot = None
+        if self.telemetry is not None:
+            snapshot = self.telemetry.snapshot()
+        buffer = self.pool.acquire(frame.shape, frame.dtype)
+        np.copyto(buffer, frame)
+        with self._condition:
+            if self._frame is not None:
+                self.pool.release(self._frame[1])
+                self.frames_dropped += 1
+            self._frame = (now, buffer, snapshot)
+            self._condition.notify_all()
+
+    def update_overlay(self) -> None:
+        """ Copies the overlay for the worker to blend, if it has changed.
+            Must be called from the thread which flattens the overlay, after
+            each time it does. """
+        if self.overlay is None:
+            return
+        if self.overlay.version != self._overlay_copy.version:
+            with self._overlay_lock:
+                self.overlay.copy_layer_to(self._overlay_copy)
+
+    def write_pre_roll(
+        self, jpeg: bytes, capture_time: Optional[float] = None
+    ) -> int:
+        """ See VideoRecorder.write_pre_roll """
+        return self.recorder.write_pre_roll(jpeg, capture_time)
+
+    def stop(self) -> None:
+        """ Records any frame still waiting, then closes the video file. """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.recorder.stop()
+
+    def check_errors(self) -> None:
+        self.recorder.check_errors()
+
+    def get_stats(self) -> Dict[str, float]:
+        """ Get the recording counters, eg. for the recording status.
+            encodeLag is the seconds between the newest encoded frame being
+            written to this recorder and being encoded. """
+        stats = self.recorder.get_stats()
+        stats["droppedFrames"] += self.frames_dropped
+        return stats
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._frame is not None or not self._running
+                )
+                if self._frame is None:
+                    break
+                capture_time, frame, snapshot = self._frame
+                self._frame = None
+
+            output = frame
+            try:
+                if self._overlay_copy is not None:
+                    with self._overlay_lock:
+                        self._overlay_copy.blend_onto(frame)
+                output = self._scale(frame)
+                self.recorder.write(output, capture_time, snapshot)
+            finally:
+                self.pool.release(frame)
+                if output is not frame:
+                    self.pool.release(output)
+
+    def _scale(self, frame: np.ndarray) -> np.ndarray:
+        """ Scales the frame to the recording size, into a pooled buffer if
+            it isn't that size already. """
+        width, height = self.size
+        if frame.shape[:2] == (height, width):
+            return frame
+        output = self.pool.acquire((height, width, 3))
+        cv2.resize(
+            frame, (width, height), output, interpolation=cv2.INTER_AREA
+        )
+        return output
+
+
+class PiCameraFrameOutput:
+    """ A `picamera` recording output which collects raw BGR frames, for
+        recording from a splitter port.
+
+        `picamera` pads raw frames to a multiple of 32 pixels wide and 16
+        pixels high, so the padding is cropped off. The frame passed to the
+        callback is reused for the next frame, so it must be copied if it is
+        kept. """
+
+    def __init__(
+        self, width: int, height: int, callback: Callable[[np.ndarray], None]
+    ):
+        self.width = width
+        self.height = height
+        self.callback = callback
+        self.padded_width = -(-width // 32) * 32
+        self.padded_height = -(-height // 16) * 16
+        self._buffer = np.empty(
+            (self.padded_height, self.padded_width, 3), np.uint8
+        )
+        self._bytes = memoryview(self._buffer.reshape(-1))
+        self._length = 0
+        # The buffer without its padding
+        self.frame = self._buffer[:height, :width]
+
+    def write(self, data: bytes) -> int:
+        """ Collects data until a whole frame has been written, then passes
+            the frame on. """
+        data = memoryview(data).cast("B")
+        written = 0
+        while written < len(data):
+            start = self._length
+            end = min(len(self._bytes), start + len(data) - written)
+            stop = written + end - start
+            self._bytes[start:end] = data[written:stop]
+            written = stop
+            self._length = end
+            if end == len(self._bytes):
+                self._length = 0
+                self.callback(self.frame)
+        return written
+
+    def flush(self) -> None:
+        pass
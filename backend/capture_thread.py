@@ -0,0 +1,149 @@
+from threading import Condition, Thread
+from time import perf_counter, sleep
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from backend.frame_pool import FramePool
+
+
+class CaptureThread:
+    """ Continuously reads frames from a video capture (eg.
+        `cv2.VideoCapture`) on a background thread.
+
+        Only the newest frame is kept. If a frame has not been taken with
+        self.read before the next one arrives, it is dropped, so the reader
+        always gets the most recent frame regardless of how long it spends
+        processing each one.
+
+        If a frame pool is given, frames are read into buffers from the pool,
+        and dropped frames are handed back to it. The reader must then
+        release each frame it takes back to the pool once finished with it.
+        """
+
+    # Seconds to wait before retrying after the capture fails to read a frame
+    retry_interval = 0.01
+
+    # Seconds over which the capture frame rate is measured
+    fps_interval = 1
+
+    def __init__(self, capture, pool: Optional[FramePool] = None):
+        self.capture = capture
+        self.pool = pool
+        # Shape of the frames read so far, for acquiring buffers to read into
+        self._frame_shape: Optional[Tuple[int, ...]] = None
+
+        # Newest frame which hasn't been taken by self.read yet
+        self._frame: Optional[np.ndarray] = None
+        self._condition = Condition()
+        self._thread: Optional[Thread] = None
+        self._running = False
+
+        # Counters
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.read_failures = 0
+        # Time taken by the most recent capture.read() call, in seconds
+        self.read_latency = 0.0
+        # Average time taken by capture.read(), in seconds
+        self.mean_read_latency = 0.0
+        # Frames captured per second, measured over self.fps_interval
+        self.fps = 0.0
+
+        self._fps_start_time = 0.0
+        self._fps_start_count = 0
+
+    def start(self) -> None:
+        """ Start reading frames. Does nothing if already started. """
+        if self._running:
+            return
+        self._running = True
+        self._fps_start_time = perf_counter()
+        self._fps_start_count = self.frames_captured
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """ Stop reading frames and wait for the capture thread to exit. The
+            capture itself is not released. """
+        self._running = False
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def read(self, timeout: float = 0) -> Optional[np.ndarray]:
+        """ Take the newest frame.
+
+            Returns None if no new frame has arrived since the last call,
+            after waiting up to `timeout` seconds for one. Each frame is only
+            returned once, so the caller may modify it in place. """
+        with self._condition:
+            if timeout > 0:
+                self._condition.wait_for(
+                    lambda: self._frame is not None or not self._running,
+                    timeout,
+                )
+            frame = self._frame
+            self._frame = None
+        return frame
+
+    def get_stats(self) -> Dict[str, float]:
+        """ Get the capture counters, eg. for publishing as a status. """
+        return {
+            "captureFps": self.fps,
+            "framesCaptured": self.frames_captured,
+            "framesDropped": self.frames_dropped,
+            "readFailures": self.read_failures,
+            "readLatency": self.read_latency,
+            "meanReadLatency": self.mean_read_latency,
+        }
+
+    def _run(self) -> None:
+        while self._running:
+            buffer = None
+            if self.pool is not None and self._frame_shape is not None:
+                buffer = self.pool.acquire(self._frame_shape)
+
+            start_time = perf_counter()
+            if buffer is None:
+                success, frame = self.capture.read()
+            else:
+                success, frame = self.capture.read(buffer)
+            end_time = perf_counter()
+
+            if buffer is not None and frame is not buffer:
+                # Not read into the buffer, eg. if the frame size changed
+                self.pool.release(buffer)
+            if not success or frame is None:
+                self.read_failures += 1
+                sleep(self.retry_interval)
+                continue
+            self._frame_shape = frame.shape
+
+            with self._condition:
+                if self._frame is not None:
+                    self.frames_dropped += 1
+                    if self.pool is not None:
+                        self.pool.release(self._frame)
+                self._frame = frame
+                self._condition.notify_all()
+
+            self._update_stats(end_time - start_time, end_time)
+
+    def _update_stats(self, latency: float, now: float) -> None:
+        self.frames_captured += 1
+        self.read_latency = latency
+        self.mean_read_latency += (
+            latency - self.mean_read_latency
+        ) / self.frames_captured
+
+        elapsed = now - self._fps_start_time
+        if elapsed >= self.fps_interval:
+            self.fps = (self.frames_captured - self._fps_start_count) / elapsed
+            self._fps_start_time = now
+            self._fps_start_count = self.frames_captured
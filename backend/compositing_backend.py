@@ -0,0 +1,143 @@
+from threading import Lock
+from time import time
+from typing import Dict
+
+import numpy as np
+
+from backend import Backend, PublishFunc
+from backend.burn_in import BurnInRecorder
+from backend.pre_roll import JpegPreRollEncoder
+from backend.video_recorder import VideoRecorder
+from canvas import Canvas, FlattenedCanvas
+
+
+class CompositingBackend(Backend):
+    """ Base of the backends which blend the overlay onto each frame
+        themselves, rather than having the camera do it.
+
+        The overlay canvases are flattened into a single layer, self.overlay,
+        which subclasses blend onto their frames. Each composited frame is
+        passed to self._record_frame, which records it while recording, and
+        encodes it into the pre-roll buffer if enabled. """
+
+    recording_file_extension = VideoRecorder.file_extension
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        publish_recording_status_func: PublishFunc,
+        publish_video_status_func: PublishFunc,
+        exception_handler: PublishFunc,
+    ):
+        super().__init__(
+            width,
+            height,
+            publish_recording_status_func,
+            publish_video_status_func,
+            exception_handler,
+        )
+        # Encodes the composited frames while recording
+        self.recorder = None
+        # Held while a frame is passed on, so a recording can start between
+        # frames, with no frames missing after its pre-roll
+        self._record_lock = Lock()
+        # Encodes the composited frames into the pre-roll buffer
+        self.pre_roll_encoder = None
+        if self.pre_roll is not None:
+            self.pre_roll_encoder = JpegPreRollEncoder.from_configs(
+                self.pre_roll, self.frame_pool
+            )
+
+        self.base_canvas = Canvas(self.width, self.height)
+        self.data_canvas = Canvas(self.width, self.height)
+        self.message_canvas = Canvas(self.width, self.height)
+        # All three canvases merged, so only one layer is blended per frame
+        self.overlay = FlattenedCanvas(self.width, self.height)
+
+    def start_video(self) -> None:
+        if self.pre_roll_encoder is not None:
+            self.pre_roll_encoder.start()
+
+    def stop_video(self) -> None:
+        if self.recording:
+            self.stop_recording()
+        if self.pre_roll_encoder is not None:
+            self.pre_roll_encoder.stop()
+
+    def _on_base_canvas_updated(self, base_canvas: Canvas) -> None:
+        self.base_canvas = base_canvas
+        self._flatten_overlay()
+
+    def _on_canvases_updated(
+        self, data_canvas: Canvas, message_canvas: Canvas
+    ) -> None:
+        self.data_canvas = data_canvas
+        self.message_canvas = message_canvas
+        self._flatten_overlay()
+
+    def _flatten_overlay(self) -> None:
+        """ Merge the overlay canvases into the single layer drawn on each
+            frame. """
+        self.overlay.flatten(
+            [self.base_canvas, self.data_canvas, self.message_canvas]
+        )
+
+    def _record_frame(self, frame: np.ndarray, changed: bool = True) -> None:
+        """ Record a composited frame, and add it to the pre-roll buffer.
+            Recordings need a frame every loop, so this should be called
+            even if the frame is the same as last time, with changed False. """
+        with self._record_lock:
+            recorder = self.recorder
+            if recorder is not None:
+                recorder.write(frame)
+            if self.pre_roll_encoder is not None:
+                self.pre_roll_encoder.submit(frame, changed)
+
+    def _start_recording(self) -> None:
+        if self.burn_in:
+            # Frames are composited already, so burning in only changes the
+            # size and frame rate of the recording
+            recorder = BurnInRecorder.from_configs(
+                self.recording_output_file,
+                self.frame_pacer.framerate,
+                (self.width, self.height),
+                pool=self.frame_pool,
+                recordings=self.recordings,
+                telemetry=self.telemetry,
+            )
+        else:
+            recorder = VideoRecorder.from_configs(
+                self.recording_output_file,
+                self.frame_pacer.framerate,
+                (self.width, self.height),
+                self.frame_pool,
+                self.recordings,
+                self.telemetry,
+            )
+        recorder.start()
+        # The recording starts with the frames from just before now. No
+        # frames are composited in between the last of them and the first
+        # frame passed to the recorder.
+        with self._record_lock:
+            if self.pre_roll is not None:
+                self.pre_roll_encoder.flush()
+                self.pre_roll.replay_frames(recorder.write_pre_roll)
+            self.recorder = recorder
+        self.recording = True
+        self.recording_start_time = time()
+
+    def _stop_recording(self) -> None:
+        recorder = self.recorder
+        self.recorder = None
+        if recorder is not None:
+            recorder.stop()
+
+    def check_recording_errors(self) -> None:
+        if self.recorder is not None:
+            self.recorder.check_errors()
+
+    def get_recording_stats(self) -> Dict[str, float]:
+        if self.recorder is None:
+            return {}
+        return self.recorder.get_stats()
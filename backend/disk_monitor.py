@@ -0,0 +1,183 @@
+import os
+from enum import Enum
+from pathlib import Path
+from shutil import disk_usage
+from threading import Event, Thread
+from time import monotonic
+from typing import Callable, Dict, Optional, Union
+
+from backend.recordings import RecordingManager
+from config import DISK_MONITOR_KEY, read_configs
+
+
+class LowSpaceAction(Enum):
+    """ What to do when free disk space falls below the threshold """
+
+    # Only report it
+    none = "none"
+    # Stop the current recording
+    stop = "stop"
+    # Delete the oldest recording files, other than the current recording
+    prune = "prune"
+
+
+class DiskMonitor:
+    """ Measures free disk space and the rate the current recording is
+        written at on a background thread, so the frame loop never waits for
+        the filesystem.
+
+        The time left before the disk fills is predicted from the average
+        rate the current recording has grown at since it started. """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        recordings: RecordingManager,
+        interval: float = 5,
+        min_free_bytes: int = 0,
+        action: LowSpaceAction = LowSpaceAction.none,
+        clock: Callable[[], float] = monotonic,
+    ):
+        self.path = path
+        self.recordings = recordings
+        self.interval = interval
+        self.min_free_bytes = min_free_bytes
+        self.action = action
+        self._clock = clock
+
+        self._thread: Optional[Thread] = None
+        self._stopped = Event()
+
+        # First file of the recording being measured, and when it was first
+        # measured with its size then
+        self._recording: Optional[str] = None
+        self._start_time = 0.0
+        self._start_size = 0
+
+        # Measurements
+        self.free_bytes = 0
+        # Bytes per second the current recording is written at, if known
+        self.write_rate: Optional[float] = None
+        # Whether there is less than min_free_bytes free
+        self.low_space = False
+        self.files_pruned = 0
+
+        self.sample()
+
+    @staticmethod
+    def from_configs(
+        path: Union[str, Path], recordings: RecordingManager
+    ) -> "DiskMonitor":
+        """ Creates a monitor with the settings from configs.json """
+        configs = read_configs().get(DISK_MONITOR_KEY, {})
+        return DiskMonitor(
+            path,
+            recordings,
+            configs.get("interval", 5),
+            int(configs.get("minFreeMegabytes", 0) * 1e6),
+            LowSpaceAction(configs.get("action", LowSpaceAction.none.value)),
+        )
+
+    @property
+    def minutes_remaining(self) -> Optional[float]:
+        """ Predicted minutes of recording before the disk is full, or None
+            if unknown """
+        rate = self.write_rate
+        if not rate:
+            return None
+        return self.free_bytes / rate / 60
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def get_stats(self) -> Dict[str, float]:
+        """ Get the disk measurements, eg. for the recording status. """
+        stats = {"diskSpaceRemaining": self.free_bytes}
+        minutes_remaining = self.minutes_remaining
+        if minutes_remaining is not None:
+            stats["recordingMinutesRemaining"] = minutes_remaining
+        if self.files_pruned:
+            stats["filesPruned"] = self.files_pruned
+        return stats
+
+    def sample(self) -> None:
+        """ Measures the free space and recording rate, and prunes old
+            recordings if enabled and needed. """
+        self.free_bytes = disk_usage(self.path).free
+        self._measure_recording()
+        if (
+            self.free_bytes < self.min_free_bytes
+            and self.action is LowSpaceAction.prune
+        ):
+            self._prune()
+        self.low_space = self.free_bytes < self.min_free_bytes
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.sample()
+            except OSError as error:
+                print(f"Unable to measure disk space: {error}")
+
+    def _measure_recording(self) -> None:
+        segments = self.recordings.segments
+        if not segments:
+            self._recording = None
+            self.write_rate = None
+            return
+
+        size = 0
+        for segment in segments:
+            try:
+                size += os.path.getsize(segment)
+            except OSError:
+                pass
+        now = self._clock()
+        if segments[0] != self._recording:
+            self._recording = segments[0]
+            self._start_time = now
+            self._start_size = size
+            self.write_rate = None
+        elif now > self._start_time:
+            self.write_rate = (size - self._start_size) / (
+                now - self._start_time
+            )
+
+    def _prune(self) -> None:
+        """ Deletes the oldest recording files until there is enough free
+            space, never touching the current recording, or any files
+            alongside it such as its telemetry. """
+        current = set()
+        for path in self.recordings.segments:
+            name = os.path.basename(path)
+            match = RecordingManager.name_pattern.fullmatch(name)
+            if match:
+                current.add(match.groups())
+        files = []
+        if not self.recordings.folder.is_dir():
+            return
+        with os.scandir(self.recordings.folder) as entries:
+            for entry in entries:
+                match = RecordingManager.name_pattern.fullmatch(entry.name)
+                if match and match.groups() not in current:
+                    number, segment = match.groups()
+                    files.append((int(number), int(segment or 0), entry.path))
+
+        for _, _, path in sorted(files):
+            if self.free_bytes >= self.min_free_bytes:
+                break
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                continue
+            self.free_bytes += size
+            self.files_pruned += 1
@@ -0,0 +1,88 @@
+from time import perf_counter, sleep
+from typing import Callable, Dict, Optional
+
+
+class FramePacer:
+    """ Paces a loop to a target frame rate using a monotonic deadline.
+
+        Each call to self.wait sleeps only for whatever is left of the
+        current frame's time budget, so the time spent processing the frame
+        counts towards the frame period. If a frame overruns its budget, any
+        frame slots that were missed entirely are skipped rather than
+        rendered back to back, so the loop catches up straight away. """
+
+    # Seconds over which the frame rate is measured
+    fps_interval = 1
+
+    def __init__(
+        self,
+        framerate: float,
+        clock: Callable[[], float] = perf_counter,
+        sleep_func: Callable[[float], None] = sleep,
+    ):
+        if framerate <= 0:
+            raise ValueError(f"Invalid framerate {framerate}")
+        self.framerate = framerate
+        # Time between frames, in seconds
+        self.frame_period = 1 / framerate
+        self._clock = clock
+        self._sleep = sleep_func
+
+        # Time by which the current frame should be finished
+        self._deadline: Optional[float] = None
+
+        # Counters
+        # Frames which took longer than their time budget
+        self.overruns = 0
+        # Frame slots skipped to catch up after overruns
+        self.frames_skipped = 0
+        # Frames per second, measured over self.fps_interval
+        self.fps = 0.0
+
+        self._frame_count = 0
+        self._fps_start_time = 0.0
+        self._fps_start_count = 0
+
+    def reset(self) -> None:
+        """ Start pacing afresh from the next call to self.wait, eg. after
+            the loop was paused. """
+        self._deadline = None
+
+    def wait(self) -> None:
+        """ Sleep until the current frame's deadline. Should be called once at
+            the end of every frame. """
+        now = self._clock()
+        if self._deadline is None:
+            self._deadline = now
+            self._fps_start_time = now
+            self._fps_start_count = self._frame_count
+
+        if now <= self._deadline:
+            self._sleep(self._deadline - now)
+            self._deadline += self.frame_period
+        else:
+            self.overruns += 1
+            # Start the next frame straight away, within the slot that has
+            # already begun, and skip any slots missed entirely
+            missed = int((now - self._deadline) // self.frame_period)
+            self.frames_skipped += missed
+            self._deadline += (missed + 1) * self.frame_period
+
+        self._update_fps()
+
+    def get_stats(self) -> Dict[str, float]:
+        """ Get the pacing counters, eg. for publishing as a status. """
+        return {
+            "fps": self.fps,
+            "frameOverruns": self.overruns,
+            "framesSkipped": self.frames_skipped,
+        }
+
+    def _update_fps(self) -> None:
+        self._frame_count += 1
+        now = self._clock()
+        elapsed = now - self._fps_start_time
+        if elapsed >= self.fps_interval:
+            self.fps = (self._frame_count - self._fps_start_count) / elapsed
+            self._fps_start_time = now
+            self._fps_start_count = self._frame_count
@@ -0,0 +1,193 @@
+import dis
+import sys
+import tracemalloc
+from collections import Counter, defaultdict
+from threading import Lock
+from types import FrameType
+from typing import Any, Callable
+from typing import Counter as CounterType
+from typing import DefaultDict, List, Optional, Tuple
+
+import numpy as np
+
+# Shape and data type of a frame buffer
+FrameFormat = Tuple[Tuple[int, ...], np.dtype]
+# Size of an allocation and where it was made
+TraceKey = Tuple[int, tracemalloc.Traceback]
+
+
+class FramePool:
+    """ Preallocated frame buffers which are reused between frames, instead of
+        allocating new arrays for every frame.
+
+        Buffers are taken with self.acquire and must be handed back with
+        self.release once they are no longer used. This is safe to use from
+        multiple threads. """
+
+    def __init__(self):
+        self._free: DefaultDict[FrameFormat, List[np.ndarray]] = defaultdict(
+            list
+        )
+        self._lock = Lock()
+        # Number of buffers allocated by the pool
+        self.allocations = 0
+
+    def acquire(
+        self, shape: Tuple[int, ...], dtype: np.dtype = np.uint8
+    ) -> np.ndarray:
+        """ Takes a buffer of the given shape and data type, allocating one
+            if none are free. Its contents are undefined. """
+        frame_format = (tuple(shape), np.dtype(dtype))
+        with self._lock:
+            free = self._free[frame_format]
+            if free:
+                return free.pop()
+            self.allocations += 1
+        return np.empty(shape, dtype)
+
+    def release(self, frame: np.ndarray) -> None:
+        """ Hands a buffer back, so it can be reused by self.acquire. """
+        with self._lock:
+            self._free[(frame.shape, frame.dtype)].append(frame)
+
+    def preallocate(
+        self, shape: Tuple[int, ...], count: int, dtype: np.dtype = np.uint8
+    ) -> None:
+        """ Ensures at least `count` buffers of the given format are free. """
+        frame_format = (tuple(shape), np.dtype(dtype))
+        with self._lock:
+            free = self._free[frame_format]
+            while len(free) < count:
+                free.append(np.empty(shape, dtype))
+                self.allocations += 1
+
+
+class AllocationCheck:
+    """ Checks that no frame sized buffers are allocated while processing a
+        frame, using `tracemalloc`. This slows things down a lot, so it is
+        only meant for debugging.
+
+        Only NumPy arrays of at least frame_bytes which are allocated by the
+        code in the `with` block are counted, including temporary arrays
+        which are freed again before the end of it. Allocations by other
+        threads and small Python objects are ignored.
+
+        Temporary arrays are found by tracing each bytecode instruction run
+        by the `with` block's thread, and looking for new arrays whenever
+        the traced memory has changed by a frame's size since it was last
+        looked at.
+
+        eg. with allocation_check: process_frame() """
+
+    def __init__(
+        self,
+        frame_bytes: int,
+        max_allocations: int = 0,
+        warmup_frames: int = 10,
+        traceback_frames: int = 32,
+    ):
+        # Smallest array which counts as a frame sized allocation
+        self.frame_bytes = frame_bytes
+        # Most frame sized arrays which may be allocated for a frame
+        self.max_allocations = max_allocations
+        # Number of frames to skip checking, while buffers are set up
+        self.warmup_frames = warmup_frames
+        # Number of frames stored for each allocation, which must be enough
+        # to reach back to the `with` block
+        self.traceback_frames = traceback_frames
+        self.frames_checked = 0
+        # File and lines of the function the `with` block is in
+        self._caller: Optional[Tuple[str, int, int]] = None
+        # Frame the `with` block is in, and the trace functions to restore
+        self._caller_frame: Optional[FrameType] = None
+        self._previous_trace: Optional[Callable] = None
+        self._previous_frame_trace: Optional[Callable] = None
+        # Traced memory when the traces were last looked at
+        self._memory = 0
+        # Frame sized arrays allocated by the `with` block which were alive
+        # when the traces were last looked at, and all those found so far
+        self._alive: CounterType[TraceKey] = Counter()
+        self._allocations: List[TraceKey] = []
+
+    def __enter__(self):
+        if self.frames_checked < self.warmup_frames:
+            return self
+        if tracemalloc.get_traceback_limit() < self.traceback_frames:
+            tracemalloc.stop()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.traceback_frames)
+        frame = sys._getframe(1)
+        code = frame.f_code
+        last_line = max(
+            line for _, line in dis.findlinestarts(code) if line is not None
+        )
+        self._caller = (code.co_filename, code.co_firstlineno, last_line)
+        tracemalloc.clear_traces()
+        self._memory = tracemalloc.get_traced_memory()[0]
+        self._alive = Counter()
+        self._allocations = []
+
+        # Look for new arrays after every instruction in this thread
+        self._previous_trace = sys.gettrace()
+        self._previous_frame_trace = frame.f_trace
+        self._caller_frame = frame
+        frame.f_trace = self._trace
+        frame.f_trace_opcodes = True
+        sys.settrace(self._trace)
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.frames_checked += 1
+        frame = self._caller_frame
+        if frame is None:
+            return
+        sys.settrace(self._previous_trace)
+        frame.f_trace = self._previous_frame_trace
+        frame.f_trace_opcodes = False
+        self._caller_frame = None
+        if exc_type is not None:
+            return
+
+        self._find_allocations()
+        if len(self._allocations) > self.max_allocations:
+            size, traceback = max(self._allocations, key=lambda key: key[0])
+            raise AssertionError(
+                f"{len(self._allocations)} frame sized arrays were allocated"
+                f" while processing a frame, which is over the limit of"
+                f" {self.max_allocations}. The largest, of {size} bytes, was"
+                f" allocated at:\n" + "\n".join(traceback.format())
+            )
+
+    def _trace(self, frame: FrameType, event: str, arg: Any) -> Callable:
+        """ Trace function of the `with` block's thread, see sys.settrace """
+        if event == "call":
+            frame.f_trace_opcodes = True
+        memory = tracemalloc.get_traced_memory()[0]
+        if abs(memory - self._memory) >= self.frame_bytes:
+            self._find_allocations()
+        return self._trace
+
+    def _find_allocations(self) -> None:
+        """ Records the frame sized arrays allocated by the `with` block
+            since the traces were last looked at """
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.DomainFilter(True, np.lib.tracemalloc_domain)]
+        )
+        self._memory = tracemalloc.get_traced_memory()[0]
+        alive: CounterType[TraceKey] = Counter(
+            (trace.size, trace.traceback)
+            for trace in snapshot.traces
+            if trace.size >= self.frame_bytes
+            and self._in_caller(trace.traceback)
+        )
+        self._allocations.extend((alive - self._alive).elements())
+        self._alive = alive
+
+    def _in_caller(self, traceback: tracemalloc.Traceback) -> bool:
+        """ Checks whether an allocation was made by the `with` block """
+        filename, first_line, last_line = self._caller
+        return any(
+            frame.filename == filename
+            and first_line <= frame.lineno <= last_line
+            for frame in traceback
+        )
@@ -0,0 +1,277 @@
+from typing import Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# Region of a frame to keep, as (left, top, right, bottom) fractions of its
+# width and height
+Crop = Tuple[float, float, float, float]
+
+
+class FrameTransform:
+    """ Rotates, crops and scales video frames to the output size, and
+        optionally corrects lens distortion.
+
+        The steps needed are only worked out when the source frame size,
+        rotation, crop or output size changes, and every frame is written
+        into the same output buffer. When correcting lens distortion, all
+        of the steps are combined into a single `cv2.remap` pass. Otherwise,
+        `cv2.rotate` and `cv2.resize` are used, as they are faster than a
+        remap for these. """
+
+    rotate_codes = {
+        90: cv2.ROTATE_90_CLOCKWISE,
+        180: cv2.ROTATE_180,
+        270: cv2.ROTATE_90_COUNTERCLOCKWISE,
+    }
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        rotation: int = 0,
+        crop: Optional[Crop] = None,
+        camera_matrix: Optional[Sequence[Sequence[float]]] = None,
+        distortion_coefficients: Optional[Sequence[float]] = None,
+    ):
+        # Size of the output frames
+        self.width = width
+        self.height = height
+        # Rotation of the source frames in degrees clockwise
+        self.rotation = rotation
+        # Region of the rotated frame to keep, or None to keep all of it
+        self.crop = crop
+        # Lens calibration of the camera, for the source frame size, as given
+        # by `cv2.calibrateCamera`. Lens distortion is only corrected if both
+        # are given.
+        self.camera_matrix = camera_matrix
+        self.distortion_coefficients = distortion_coefficients
+
+        # Settings the current plan was worked out for
+        self._plan_key = None
+        # Remap tables, used when correcting lens distortion
+        self._maps: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        # Region of the source frame to keep, as slices
+        self._source_region: Tuple[slice, slice] = (slice(None), slice(None))
+        # Whether to resize before rotating, which is faster when shrinking
+        self._resize_first = False
+        # Frame after the first of rotating or resizing
+        self._intermediate: Optional[np.ndarray] = None
+        self.output: Optional[np.ndarray] = None
+
+    @property
+    def corrects_lens_distortion(self) -> bool:
+        return (
+            self.camera_matrix is not None
+            and self.distortion_coefficients is not None
+        )
+
+    def get_output_shape(self, frame: np.ndarray) -> Tuple[int, ...]:
+        """ Gets the shape of the frame which self.apply produces. """
+        return (self.height, self.width) + frame.shape[2:]
+
+    def apply(
+        self, frame: np.ndarray, dst: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """ Transforms a frame into dst, which is also returned.
+
+            If dst isn't given, self.output is used. This buffer is reused,
+            so its contents are replaced on the next call. """
+        key = (
+            frame.shape,
+            frame.dtype,
+            self.rotation,
+            self.width,
+            self.height,
+            self.crop,
+        )
+        if key != self._plan_key:
+            self._plan(frame)
+            self._plan_key = key
+
+        if dst is None:
+            if self.output is None or self.output.shape != (
+                self.get_output_shape(frame)
+            ):
+                self.output = np.empty(
+                    self.get_output_shape(frame), frame.dtype
+                )
+            dst = self.output
+
+        if self._maps is not None:
+            cv2.remap(
+                frame,
+                *self._maps,
+                cv2.INTER_LINEAR,
+                dst=dst,
+                borderMode=cv2.BORDER_REPLICATE,
+            )
+            return dst
+
+        frame = frame[self._source_region]
+        rotate_code = FrameTransform.rotate_codes.get(self.rotation)
+        if rotate_code is None:
+            self._resize(frame, dst)
+        elif self._intermediate is None:
+            cv2.rotate(frame, rotate_code, dst=dst)
+        elif self._resize_first:
+            self._resize(frame, self._intermediate)
+            cv2.rotate(self._intermediate, rotate_code, dst=dst)
+        else:
+            cv2.rotate(frame, rotate_code, dst=self._intermediate)
+            self._resize(self._intermediate, dst)
+        return dst
+
+    def invalidate(self) -> None:
+        """ Forces the transform to be worked out again, eg. after changing
+            the lens calibration. """
+        self._plan_key = None
+
+    @staticmethod
+    def _resize(src: np.ndarray, dst: np.ndarray) -> None:
+        if src.shape == dst.shape:
+            np.copyto(dst, src)
+        else:
+            cv2.resize(src, (dst.shape[1], dst.shape[0]), dst=dst)
+
+    def _plan(self, frame: np.ndarray) -> None:
+        if self.rotation not in (0, *FrameTransform.rotate_codes):
+            raise ValueError(f"Unsupported rotation {self.rotation}")
+
+        self._maps = None
+        self._intermediate = None
+        if self.corrects_lens_distortion:
+            self._build_maps(frame.shape)
+            return
+
+        source_height, source_width = frame.shape[:2]
+        left, top, right, bottom = self._get_rotated_crop(frame.shape)
+        # Convert the crop into the source frame, before rotation
+        if self.rotation == 90:
+            left, top, right, bottom = (
+                top,
+                source_height - right,
+                bottom,
+                source_height - left,
+            )
+        elif self.rotation == 180:
+            left, top, right, bottom = (
+                source_width - right,
+                source_height - bottom,
+                source_width - left,
+                source_height - top,
+            )
+        elif self.rotation == 270:
+            left, top, right, bottom = (
+                source_width - bottom,
+                left,
+                source_width - top,
+                right,
+            )
+        self._source_region = (
+            slice(round(top), round(bottom)),
+            slice(round(left), round(right)),
+        )
+
+        cropped_height = round(bottom) - round(top)
+        cropped_width = round(right) - round(left)
+        if self.rotation in (90, 270):
+            unrotated_size = (self.height, self.width)
+            rotated_size = (cropped_height, cropped_width)
+        else:
+            unrotated_size = (self.width, self.height)
+            rotated_size = (cropped_width, cropped_height)
+
+        if self.rotation == 0 or rotated_size == (self.width, self.height):
+            return
+        self._resize_first = (
+            self.width * self.height < cropped_width * cropped_height
+        )
+        if self._resize_first:
+            width, height = unrotated_size
+        else:
+            width, height = rotated_size
+        self._intermediate = np.empty(
+            (height, width) + frame.shape[2:], frame.dtype
+        )
+
+    def _get_rotated_crop(
+        self, source_shape: Tuple[int, ...]
+    ) -> Tuple[float, float, float, float]:
+        """ Gets the region of the rotated frame to keep, in pixels. """
+        source_height, source_width = source_shape[:2]
+        if self.rotation in (90, 270):
+            rotated_width, rotated_height = source_height, source_width
+        else:
+            rotated_width, rotated_height = source_width, source_height
+
+        left, top, right, bottom = self.crop or (0, 0, 1, 1)
+        return (
+            left * rotated_width,
+            top * rotated_height,
+            right * rotated_width,
+            bottom * rotated_height,
+        )
+
+    def _build_maps(self, source_shape: Tuple[int, ...]) -> None:
+        source_height, source_width = source_shape[:2]
+        left, top, right, bottom = self._get_rotated_crop(source_shape)
+
+        # Position of each output pixel's centre in the rotated frame, the
+        # same as `cv2.resize` would sample
+        x = (np.arange(self.width, dtype=np.float32) + 0.5) * (
+            (right - left) / self.width
+        ) + (left - 0.5)
+        y = (np.arange(self.height, dtype=np.float32) + 0.5) * (
+            (bottom - top) / self.height
+        ) + (top - 0.5)
+        x, y = np.meshgrid(x, y)
+
+        # Position in the source frame before rotation, matching `cv2.rotate`
+        if self.rotation == 90:
+            map_x, map_y = y, (source_height - 1) - x
+        elif self.rotation == 180:
+            map_x, map_y = (source_width - 1) - x, (source_height - 1) - y
+        elif self.rotation == 270:
+            map_x, map_y = (source_width - 1) - y, x
+        else:
+            map_x, map_y = x, y
+
+        map_x, map_y = self._distort(map_x, map_y, source_shape)
+        self._maps = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+
+    def _distort(
+        self, map_x: np.ndarray, map_y: np.ndarray, source_shape
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """ Converts positions in the undistorted source frame into positions
+            in the distorted frame the camera produced. """
+        source_height, source_width = source_shape[:2]
+        camera_matrix = np.array(self.camera_matrix, np.float64)
+        undistort_x, undistort_y = cv2.initUndistortRectifyMap(
+            camera_matrix,
+            np.array(self.distortion_coefficients, np.float64),
+            None,
+            camera_matrix,
+            (source_width, source_height),
+            cv2.CV_32FC1,
+        )
+        # Sample the undistortion maps at each position, so the geometric
+        # transform and the lens correction are combined into one map
+        map_x = np.ascontiguousarray(map_x, np.float32)
+        map_y = np.ascontiguousarray(map_y, np.float32)
+        return (
+            cv2.remap(
+                undistort_x,
+                map_x,
+                map_y,
+                cv2.INTER_LINEAR,
+                borderMode=cv2.BORDER_REPLICATE,
+            ),
+            cv2.remap(
+                undistort_y,
+                map_x,
+                map_y,
+                cv2.INTER_LINEAR,
+                borderMode=cv2.BORDER_REPLICATE,
+            ),
+        )
@@ -0,0 +1,165 @@
+from enum import Enum
+from pathlib import Path
+from time import perf_counter
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+from backend import PublishFunc
+from backend.compositing_backend import CompositingBackend
+from backend.frame_transform import FrameTransform
+from config import HEADLESS_KEY, read_configs
+
+
+class HeadlessOutput(Enum):
+    """ What the headless backend does with each composited frame """
+
+    # Throw the frame away
+    discard = "discard"
+    # Save every Nth frame as an image
+    files = "files"
+    # Copy the frame into a ring of the most recent frames, kept in memory
+    ring = "ring"
+
+
+class HeadlessBackend(CompositingBackend):
+    """ Composites the overlay onto frames without displaying them, as fast
+        as possible, for benchmarking and CI machines without a display.
+
+        Frames come from a static image if one is set, otherwise a few
+        synthetic camera frames are cycled through. They are composited and
+        recorded in the same way as OpenCVBackend, and the frame rate is
+        printed every second. """
+
+    # The loop isn't limited to the target frame rate
+    paced = False
+
+    # Size of the synthetic frames, like a typical webcam
+    synthetic_frame_size = (640, 480)
+    synthetic_frame_count = 8
+
+    # Seconds between printing the frame rate
+    report_interval = 1
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        publish_recording_status_func: PublishFunc,
+        publish_video_status_func: PublishFunc,
+        exception_handler: PublishFunc,
+    ):
+        super().__init__(
+            width,
+            height,
+            publish_recording_status_func,
+            publish_video_status_func,
+            exception_handler,
+        )
+        configs = read_configs().get(HEADLESS_KEY, {})
+        self.output = HeadlessOutput(
+            configs.get("output", HeadlessOutput.discard.value)
+        )
+        # Save every Nth frame, when saving frames to files
+        self.save_interval = configs.get("saveInterval", 60)
+        self.output_folder = Path(
+            configs.get(
+                "outputFolder",
+                Path(__file__).parent.parent / "headless_frames",
+            )
+        )
+        # Number of frames kept in memory, when writing to a ring
+        self.ring_size = configs.get("ringSize", 16)
+
+        self.sources: List[np.ndarray] = []
+        self.transform = FrameTransform(
+            self.width, self.height, self.video_rotation
+        )
+        self.ring: Optional[np.ndarray] = None
+        self.ring_index = 0
+
+        self.running = False
+        self.frame_count = 0
+        # Frames per second, measured over self.report_interval
+        self.fps = 0.0
+        self._report_start_time = 0.0
+        self._report_start_count = 0
+
+    def _is_video_on(self):
+        return self.running
+
+    def start_video(self) -> None:
+        if not self.sources:
+            self.sources = self._create_synthetic_frames()
+        if self.output is HeadlessOutput.files:
+            self.output_folder.mkdir(parents=True, exist_ok=True)
+        elif self.output is HeadlessOutput.ring:
+            self.ring = np.zeros(
+                (self.ring_size, self.height, self.width, 3), np.uint8
+            )
+        self.running = True
+        self._report_start_time = perf_counter()
+        self._report_start_count = self.frame_count
+        super().start_video()
+
+    def set_background(self, image_path: str) -> None:
+        """ Use a static image as the frame source """
+        self.sources = [cv2.imread(cv2.samples.findFile(image_path))]
+
+    def _create_synthetic_frames(self) -> List[np.ndarray]:
+        """ Creates smooth noise frames, which cost the same to process as
+            real camera frames. """
+        width, height = HeadlessBackend.synthetic_frame_size
+        random = np.random.default_rng(0)
+        return [
+            cv2.GaussianBlur(
+                random.integers(0, 256, (height, width, 3), np.uint8),
+                (9, 9),
+                3,
+            )
+            for _ in range(HeadlessBackend.synthetic_frame_count)
+        ]
+
+    def _on_loop(self) -> None:
+        frame = self.sources[self.frame_count % len(self.sources)]
+
+        self.transform.rotation = self.video_rotation
+        output = self.frame_pool.acquire(
+            self.transform.get_output_shape(frame)
+        )
+        self.transform.apply(frame, output)
+        self.overlay.blend_onto(output)
+        if self.stream is not None:
+            self.stream.submit(output)
+
+        if self.output is HeadlessOutput.files:
+            if self.frame_count % self.save_interval == 0:
+                cv2.imwrite(
+                    str(
+                        self.output_folder
+                        / f"frame_{self.frame_count:06d}.png"
+                    ),
+                    output,
+                )
+        elif self.output is HeadlessOutput.ring:
+            np.copyto(self.ring[self.ring_index], output)
+            self.ring_index = (self.ring_index + 1) % self.ring_size
+        self._record_frame(output)
+        self.frame_pool.release(output)
+
+        self.frame_count += 1
+        self._report_fps()
+
+    def _report_fps(self) -> None:
+        now = perf_counter()
+        elapsed = now - self._report_start_time
+        if elapsed >= self.report_interval:
+            self.fps = (self.frame_count - self._report_start_count) / elapsed
+            self._report_start_time = now
+            self._report_start_count = self.frame_count
+            print(f"{self.fps:.1f} frames/second")
+
+    def stop_video(self) -> None:
+        super().stop_video()
+        self.running = False
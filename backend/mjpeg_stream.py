@@ -0,0 +1,270 @@
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Condition, Thread
+from time import perf_counter
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from backend.frame_pool import FramePool
+from config import MJPEG_STREAM_KEY, read_configs
+
+
+class MjpegStream:
+    """ Serves composited frames as an MJPEG stream over HTTP, so they can be
+        watched from a browser, eg. on the local network.
+
+        Only clients on the same machine can connect by default. To serve
+        the local network, host must be set to the address to listen on, or
+        "" for every network interface.
+
+        Frames are JPEG encoded by a pool of worker threads, at no more than
+        max_fps. Submitting a frame never waits for encoding: frames are
+        skipped if it is too soon after the last one or every worker is busy.
+        Each client is sent the newest encoded frame whenever one is ready,
+        so clients which fall behind skip frames rather than queueing them.
+
+        The stream is at http://<host>:<port>/, and the newest frame alone at
+        http://<host>:<port>/frame.jpg """
+
+    boundary = "frame"
+
+    # Seconds after which the newest frame is sent again if there is no new
+    # one, so disconnected clients are noticed
+    resend_interval = 1
+
+    def __init__(
+        self,
+        port: int = 8080,
+        max_fps: float = 10,
+        quality: int = 70,
+        workers: int = 2,
+        host: str = "localhost",
+        pool: Optional[FramePool] = None,
+    ):
+        self.host = host
+        self.port = port
+        self.max_fps = max_fps
+        self.quality = quality
+        self.workers = workers
+        self.pool = pool if pool is not None else FramePool()
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._server_thread: Optional[Thread] = None
+        self._running = False
+
+        # Newest encoded frame, and how many frames were encoded before it
+        self._condition = Condition()
+        self._jpeg: Optional[bytes] = None
+        self._sequence = 0
+        # Time the last frame was submitted for encoding
+        self._last_submit_time: Optional[float] = None
+        self._encoding = 0
+
+        # Counters
+        self.frames_encoded = 0
+        self.frames_skipped = 0
+        self.clients = 0
+        # Time taken to encode the most recent frame, in seconds
+        self.encode_time = 0.0
+        # Average time taken to encode a frame, in seconds
+        self.mean_encode_time = 0.0
+
+    @staticmethod
+    def from_configs(
+        pool: Optional[FramePool] = None,
+    ) -> Optional["MjpegStream"]:
+        """ Creates a stream with the settings from configs.json, or returns
+            None if streaming isn't enabled. """
+        configs = read_configs().get(MJPEG_STREAM_KEY, {})
+        if not configs.get("enabled", False):
+            return None
+        return MjpegStream(
+            configs.get("port", 8080),
+            configs.get("maxFps", 10),
+            configs.get("quality", 70),
+            configs.get("workers", 2),
+            configs.get("host", "localhost"),
+            pool,
+        )
+
+    def start(self) -> None:
+        """ Starts the encoder workers and the HTTP server. """
+        self._running = True
+        self._executor = ThreadPoolExecutor(self.workers)
+        self._server = ThreadingHTTPServer(
+            (self.host, self.port), self._create_handler()
+        )
+        self._server.daemon_threads = True
+        self._server_thread = Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+        self._server_thread.start()
+
+    def stop(self) -> None:
+        """ Disconnects any clients and stops the server and workers. """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    @property
+    def server_port(self) -> int:
+        """ The port being served on, which is chosen by the OS if self.port
+            is 0. """
+        return self._server.server_address[1]
+
+    def submit(self, frame: np.ndarray) -> bool:
+        """ Queues a copy of the frame to be encoded and streamed, unless it
+            is too soon after the last frame or every worker is busy.
+
+            Returns whether the frame was queued. """
+        if not self._running:
+            return False
+        now = perf_counter()
+        with self._condition:
+            if (
+                self._last_submit_time is not None
+                and now - self._last_submit_time < 1 / self.max_fps
+            ) or self._encoding >= self.workers:
+                self.frames_skipped += 1
+                return False
+            self._last_submit_time = now
+            self._encoding += 1
+
+        buffer = self.pool.acquire(frame.shape, frame.dtype)
+        np.copyto(buffer, frame)
+        self._executor.submit(self._encode, buffer)
+        return True
+
+    def get_jpeg(self) -> Optional[bytes]:
+        """ Gets the newest encoded frame, if any. """
+        with self._condition:
+            return self._jpeg
+
+    def get_stats(self) -> Dict[str, float]:
+        """ Get the stream counters, eg. for publishing as a status. """
+        return {
+            "streamClients": self.clients,
+            "streamEncodeTime": self.encode_time,
+            "streamMeanEncodeTime": self.mean_encode_time,
+            "streamFramesEncoded": self.frames_encoded,
+        }
+
+    def _encode(self, frame: np.ndarray) -> None:
+        success = False
+        try:
+            start_time = perf_counter()
+            success, jpeg = cv2.imencode(
+                ".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+            )
+            encode_time = perf_counter() - start_time
+        finally:
+            self.pool.release(frame)
+            with self._condition:
+                self._encoding -= 1
+
+        if not success:
+            return
+        with self._condition:
+            self._jpeg = jpeg.tobytes()
+            self._sequence += 1
+            self.frames_encoded += 1
+            self.encode_time = encode_time
+            self.mean_encode_time += (
+                encode_time - self.mean_encode_time
+            ) / self.frames_encoded
+            self._condition.notify_all()
+
+    def _wait_for_frame(self, sequence: int) -> Optional[Tuple[int, bytes]]:
+        """ Waits for a frame newer than sequence, for up to
+            self.resend_interval. Returns the newest frame's (sequence, jpeg),
+            or None if the stream stopped or there are no frames yet. """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._sequence > sequence or not self._running,
+                self.resend_interval,
+            )
+            if not self._running or self._jpeg is None:
+                return None
+            return self._sequence, self._jpeg
+
+    def _create_handler(self) -> type:
+        """ Creates a request handler class which serves this stream """
+        return type("Handler", (MjpegStreamHandler,), {"stream": self})
+
+
+class MjpegStreamHandler(BaseHTTPRequestHandler):
+    """ Serves the frames of an MjpegStream, set as the class's stream by
+        subclassing it, see MjpegStream._create_handler. """
+
+    stream: MjpegStream
+
+    def do_GET(self):
+        if self.path == "/frame.jpg":
+            self._send_frame()
+        elif self.path in ["/", "/stream.mjpg"]:
+            self._send_stream()
+        else:
+            self.send_error(404)
+
+    def _send_frame(self) -> None:
+        jpeg = self.stream.get_jpeg()
+        if jpeg is None:
+            self.send_error(503, "No frames yet")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(jpeg)))
+        self.end_headers()
+        self.wfile.write(jpeg)
+
+    def _send_stream(self) -> None:
+        self.send_response(200)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header(
+            "Content-Type",
+            "multipart/x-mixed-replace; boundary=" + MjpegStream.boundary,
+        )
+        self.end_headers()
+
+        stream = self.stream
+        with stream._condition:
+            stream.clients += 1
+        try:
+            self._send_frames()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with stream._condition:
+                stream.clients -= 1
+
+    def _send_frames(self) -> None:
+        """ Sends each new frame as a part of the stream until it stops """
+        sequence = 0
+        while self.stream._running:
+            result = self.stream._wait_for_frame(sequence)
+            if result is None:
+                continue
+            sequence, jpeg = result
+            self.wfile.write(
+                (
+                    f"--{MjpegStream.boundary}\r\n"
+                    "Content-Type: image/jpeg\r\n"
+                    f"Content-Length: {len(jpeg)}\r\n\r\n"
+                ).encode()
+            )
+            self.wfile.write(jpeg)
+            self.wfile.write(b"\r\n")
+
+    def log_message(self, format, *args):
+        # Don't log every request
+        pass
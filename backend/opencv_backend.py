@@ -1,10 +1,13 @@
 import cv2
-from canvas import Canvas
 
-from backend import Backend, PublishFunc
+from backend import PublishFunc
+from backend.capture_thread import CaptureThread
+from backend.compositing_backend import CompositingBackend
+from backend.frame_transform import FrameTransform
+from config import CROP_KEY, LENS_CORRECTION_KEY, read_configs
 
 
-class OpenCVBackend(Backend):
+class OpenCVBackend(CompositingBackend):
     """ Gets and displays video using the OpenCV (`cv2`) library.
 
         This is intended for use with laptops with webcams, not on the
@@ -26,56 +29,67 @@ class OpenCVBackend(Backend):
             exception_handler,
         )
         self.webcam = None
-
-        framerate = 60
-        # Time between video frames when running on OpenCV, in milliseconds
-        self.frametime = int(1000 / framerate)
-
-        self.base_canvas = Canvas(self.width, self.height)
-        self.data_canvas = Canvas(self.width, self.height)
-        self.message_canvas = Canvas(self.width, self.height)
+        # Reads webcam frames in the background, so camera I/O doesn't add to
+        # the time taken to composite and display each frame
+        self.capture = None
+        # The frame currently displayed
+        self.frame = None
+
+        configs = read_configs()
+        lens_correction = configs.get(LENS_CORRECTION_KEY, {})
+        crop = configs.get(CROP_KEY)
+        # Rotates and scales each webcam frame to the display size
+        self.transform = FrameTransform(
+            self.width,
+            self.height,
+            self.video_rotation,
+            tuple(crop) if crop else None,
+            lens_correction.get("cameraMatrix"),
+            lens_correction.get("distortionCoefficients"),
+        )
 
     def start_video(self) -> None:
         # Uses whatever OpenCV determines to be the "default camera"
         default_camera_index = 0
         self.webcam = cv2.VideoCapture(default_camera_index)
+        self.capture = CaptureThread(self.webcam, self.frame_pool)
+        self.capture.start()
+        super().start_video()
 
     def _is_video_on(self):
         if self.webcam is None:
             return False
         return self.webcam.isOpened()
 
-    def _on_base_canvas_updated(self, base_canvas: Canvas) -> None:
-        self.base_canvas = base_canvas
-
-    def _on_canvases_updated(
-        self, data_canvas: Canvas, message_canvas: Canvas
-    ) -> None:
-        self.data_canvas = data_canvas
-        self.message_canvas = message_canvas
-
     def _on_loop(self) -> None:
         """ This function uses the cached overlays, as OpenCV needs us to
             manually add it to each frame. """
-        _, frame = self.webcam.read()
-
-        # Check flip
-        if self.video_rotation == 90:
-            frame = cv2.rotate(frame, cv2.cv2.ROTATE_90_CLOCKWISE)
-        elif self.video_rotation == 180:
-            frame = cv2.rotate(frame, cv2.cv2.ROTATE_180)
-        elif self.video_rotation == 270:
-            frame = cv2.rotate(frame, cv2.cv2.ROTATE_90_COUNTERCLOCKWISE)
-
-        frame = cv2.resize(frame, (self.width, self.height))
-
-        frame = self.base_canvas.copy_to(frame)
-        frame = self.data_canvas.copy_to(frame)
-        frame = self.message_canvas.copy_to(frame)
-
-        cv2.imshow("frame", frame)
-        cv2.waitKey(self.frametime)
+        # If no new webcam frame has arrived, keep showing the previous one
+        frame = self.capture.read()
+        if frame is not None:
+            self.transform.rotation = self.video_rotation
+            output = self.frame_pool.acquire(
+                self.transform.get_output_shape(frame)
+            )
+            self.transform.apply(frame, output)
+            self.frame_pool.release(frame)
+
+            self.overlay.blend_onto(output)
+            cv2.imshow("frame", output)
+            if self.stream is not None:
+                self.stream.submit(output)
+
+            if self.frame is not None:
+                self.frame_pool.release(self.frame)
+            self.frame = output
+
+        # Recordings need a frame every loop, even if it was shown before
+        if self.frame is not None:
+            self._record_frame(self.frame, frame is not None)
+        cv2.waitKey(1)
 
     def stop_video(self) -> None:
+        super().stop_video()
+        self.capture.stop()
         self.webcam.release()
         cv2.destroyAllWindows()
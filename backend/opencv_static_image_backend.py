@@ -1,13 +1,17 @@
 import cv2
 import numpy as np
-from canvas import Canvas
 
-from backend import Backend, PublishFunc
+from backend import PublishFunc
+from backend.compositing_backend import CompositingBackend
+from backend.frame_transform import FrameTransform
 
 
-class OpenCVStaticImageBackend(Backend):
+class OpenCVStaticImageBackend(CompositingBackend):
     """ Displays a static, local image in place of a video feed.
-        Uses the OpenCV (`cv2`) library. """
+        Uses the OpenCV (`cv2`) library.
+
+        As the image doesn't change, the displayed frame is only composited
+        again when the overlay or rotation changes. """
 
     def __init__(
         self,
@@ -24,58 +28,63 @@ class OpenCVStaticImageBackend(Backend):
             publish_video_status_func,
             exception_handler,
         )
-        self.background = np.zeros((self.height, self.width, 4), np.uint8)
-
-        framerate = 60
-        # Time between video frames when running on OpenCV, in milliseconds
-        self.frametime = int(1000 / framerate)
-
-        self.base_canvas = Canvas(self.width, self.height)
-        self.data_canvas = Canvas(self.width, self.height)
-        self.message_canvas = Canvas(self.width, self.height)
+        self.background = np.zeros((self.height, self.width, 3), np.uint8)
+        # Rotates and scales the background to the display size. Its output
+        # is kept as the rotated background.
+        self.transform = FrameTransform(
+            self.width, self.height, self.video_rotation
+        )
+        # Whether the background changed since it was last rotated
+        self._background_changed = True
+        # The rotated background with the overlay blended onto it
+        self.frame = None
+        # Overlay version and rotation self.frame was composited with
+        self._frame_key = None
 
     def _is_video_on(self):
         # Static image always has something displayed
         return True
 
-    def start_video(self) -> None:
-        # Nothing to do
-        pass
-
     def set_background(self, image_path: str) -> None:
         background_original = cv2.imread(cv2.samples.findFile(image_path))
-        self.background = cv2.resize(
-            background_original, (self.width, self.height)
-        )
-
-    def _on_base_canvas_updated(self, base_canvas: Canvas) -> None:
-        self.base_canvas = base_canvas
-
-    def _on_canvases_updated(
-        self, data_canvas: Canvas, message_canvas: Canvas
-    ) -> None:
-        self.data_canvas = data_canvas
-        self.message_canvas = message_canvas
+        # Scaled to the display size by self.transform, after rotation
+        self.background = background_original
+        self._background_changed = True
 
     def _on_loop(self) -> None:
         """ This function uses the cached overlays, as OpenCV needs us to
-            manually add it to each frame. """
-        frame = self.background
-
-        # Check flip
-        if self.video_rotation == 90:
-            frame = cv2.rotate(frame, cv2.cv2.ROTATE_90_CLOCKWISE)
-        elif self.video_rotation == 180:
-            frame = cv2.rotate(frame, cv2.cv2.ROTATE_180)
-        elif self.video_rotation == 270:
-            frame = cv2.rotate(frame, cv2.cv2.ROTATE_90_COUNTERCLOCKWISE)
-
-        frame = self.base_canvas.copy_to(frame)
-        frame = self.data_canvas.copy_to(frame)
-        frame = self.message_canvas.copy_to(frame)
-
-        cv2.imshow("frame", frame)
-        cv2.waitKey(self.frametime)
+            manually add it to each frame. The window keeps showing the last
+            frame, so nothing is done unless the frame has changed. """
+        key = (self.overlay.version, self.video_rotation)
+        changed = key != self._frame_key or self._background_changed
+        if changed:
+            self._compose_frame()
+            self._frame_key = key
+            cv2.imshow("frame", self.frame)
+            if self.stream is not None:
+                self.stream.submit(self.frame)
+
+        # Recordings need every frame, even when it hasn't changed
+        self._record_frame(self.frame, changed)
+        cv2.waitKey(1)
+
+    def _compose_frame(self) -> None:
+        """ Blend the overlay onto the rotated background, into self.frame """
+        if (
+            self._background_changed
+            or self.video_rotation != self.transform.rotation
+            or self.transform.output is None
+        ):
+            self.transform.rotation = self.video_rotation
+            self.transform.apply(self.background)
+            self._background_changed = False
+
+        rotated_background = self.transform.output
+        if self.frame is None or self.frame.shape != rotated_background.shape:
+            self.frame = np.empty_like(rotated_background)
+        np.copyto(self.frame, rotated_background)
+        self.overlay.blend_onto(self.frame)
 
     def stop_video(self) -> None:
+        super().stop_video()
         cv2.destroyAllWindows()
@@ -1,10 +1,15 @@
-from enum import Enum
 from time import time
 from typing import Dict
 
-from canvas import Canvas
+from canvas import Canvas, FlattenedCanvas
 
 from backend import Backend, PublishFunc
+from backend.burn_in import BurnInRecorder, PiCameraFrameOutput
+from backend.picamera_overlays import (
+    PiCameraOverlayLayer,
+    PiCameraOverlayManager,
+)
+from backend.recordings import PiCameraOutput, SegmentedFile
 
 # This check needs to be done here, as it's only place we use picamera.
 try:
@@ -15,23 +20,15 @@ except (ImportError, RuntimeError):
     ON_PI = False
 
 
-class PiCameraOverlayLayer(Enum):
-    """ The `picamera` layers which each overlay canvas should be placed on.
-
-        Higher layer numbers are placed in front of lower ones. """
-
-    video_feed = 2
-    base = 3
-    data = 4
-    message = 5
-
-
 class PiCameraBackend(Backend):
     """ Gets video and displays using the `picamera` library.
 
         This backend will only work when the `picamera` library is available,
         i.e. when running on a Raspberry Pi. """
 
+    # Camera port the frames to burn the overlay into are taken from
+    burn_in_splitter_port = 2
+
     def __init__(
         self,
         width: int,
@@ -56,9 +53,24 @@ class PiCameraBackend(Backend):
 
         self.pi_camera = PiCamera(resolution=(self.width, self.height))
 
-        self.prev_overlays: Dict[
-            PiCameraOverlayLayer, self.pi_camera.PiOverlayRenderer
-        ] = {}
+        self.overlays = PiCameraOverlayManager(
+            self.pi_camera, self.width, self.height
+        )
+        # Output being recorded to, which splits the recording into segments
+        # and writes them in the background
+        self.recording_file = None
+
+        # Records frames from the camera with the overlay burnt in. The
+        # overlay layers are shown by the GPU, so they are also flattened
+        # for the recording.
+        self.recorder = None
+        if self.burn_in:
+            # The pre-roll buffer holds H.264 without the overlay
+            self.pre_roll = None
+            self.base_canvas = Canvas(self.width, self.height)
+            self.data_canvas = Canvas(self.width, self.height)
+            self.message_canvas = Canvas(self.width, self.height)
+            self.overlay = FlattenedCanvas(self.width, self.height)
 
     def _is_video_on(self):
         return self.pi_camera.previewing
@@ -71,35 +83,29 @@ class PiCameraBackend(Backend):
         self.pi_camera.start_preview(
             fullscreen=False, window=(0, 0, self.width, self.height),
         )
+        if self.pre_roll is not None:
+            # Record into the pre-roll buffer all the time. Recordings are
+            # then taken from the buffer, see self._start_recording.
+            self.pi_camera.start_recording(
+                PiCameraOutput(self.pre_roll, self.pi_camera),
+                format="h264",
+                inline_headers=True,
+            )
 
     def update_picamera_overlay(
         self, canvas: Canvas, layer: PiCameraOverlayLayer
     ) -> None:
-        """Adds the overlay to a PiCamera preview.
+        """Shows the canvas as an overlay on the PiCamera preview.
 
-        If the overlay was already added, removes the old instance.
+        The layer's overlay is only updated if the canvas has changed.
         """
-        overlay = self.pi_camera.add_overlay(
-            canvas.img, format="bgra", size=(self.width, self.height)
-        )
-        overlay.layer = layer.value
-        overlay.fullscreen = False
-        overlay.window = (0, 0, self.width, self.height)
-
-        """
-        Rather than creating and swapping out overlays, the proper way to do
-        this would be with overlay.update(). Unfortunately, due to a bug in
-        PiCamera 1.13, this will spam us with errors.
-        (which don't matter, but still)
-        https://github.com/waveform80/picamera/issues/320
-        https://www.raspberrypi.org/forums/viewtopic.php?t=190120
-        """
-        if layer in self.prev_overlays:
-            self.pi_camera.remove_overlay(self.prev_overlays[layer])
-        self.prev_overlays[layer] = overlay
+        self.overlays.update(canvas, layer)
 
     def _on_base_canvas_updated(self, base_canvas: Canvas) -> None:
         self.update_picamera_overlay(base_canvas, PiCameraOverlayLayer.base)
+        if self.burn_in:
+            self.base_canvas = base_canvas
+            self._flatten_overlay()
 
     def _on_canvases_updated(
         self, data_canvas: Canvas, message_canvas: Canvas
@@ -110,25 +116,115 @@ class PiCameraBackend(Backend):
         self.update_picamera_overlay(
             message_canvas, PiCameraOverlayLayer.message
         )
+        if self.burn_in:
+            self.data_canvas = data_canvas
+            self.message_canvas = message_canvas
+            self._flatten_overlay()
+
+    def _flatten_overlay(self) -> None:
+        """ Merge the overlay canvases into the layer burnt into recordings,
+            and pass it to the recorder. """
+        self.overlay.flatten(
+            [self.base_canvas, self.data_canvas, self.message_canvas]
+        )
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.update_overlay()
 
     def _on_loop(self) -> None:
         # Set rotation
         self.pi_camera.rotation = self.video_rotation
 
     def stop_video(self) -> None:
+        self.overlays.close()
         self.pi_camera.stop_preview()
         self.stop_recording()
+        if self.pi_camera.recording:
+            self.pi_camera.stop_recording()
         self.pi_camera.close()
 
     def _start_recording(self) -> None:
-        self.pi_camera.start_recording(self.recording_output_file)
+        if self.burn_in:
+            self._start_burn_in_recording()
+            return
+
+        self.recording_file = SegmentedFile(
+            self.recording_output_file, self.recordings, self.telemetry
+        )
+        if self.pre_roll is None:
+            self.pi_camera.start_recording(
+                PiCameraOutput(self.recording_file, self.pi_camera),
+                format="h264",
+                inline_headers=True,
+            )
+        else:
+            # Write the buffered video from the last keyframe, then follow it
+            # with the video as it is encoded
+            self.pre_roll.start(
+                self.recording_file.write, self.recording_file.write_pre_roll
+            )
         self.recording = True
         self.recording_start_time = time()
         self.pi_camera.wait_recording(0.1)
 
+    def _start_burn_in_recording(self) -> None:
+        """ Record raw frames from a splitter port, which the recorder blends
+            the overlay onto and encodes. """
+        recorder = BurnInRecorder.from_configs(
+            self.recording_output_file,
+            self.frame_pacer.framerate,
+            (self.width, self.height),
+            self.overlay,
+            self.frame_pool,
+            self.recordings,
+            self.telemetry,
+        )
+        recorder.start()
+        self.recorder = recorder
+        self.pi_camera.start_recording(
+            PiCameraFrameOutput(self.width, self.height, recorder.write),
+            format="bgr",
+            splitter_port=PiCameraBackend.burn_in_splitter_port,
+            resize=(self.width, self.height),
+        )
+        self.recording = True
+        self.recording_start_time = time()
+
     def _stop_recording(self) -> None:
-        if self.pi_camera.recording:
-            self.pi_camera.stop_recording()
+        if self.burn_in:
+            recorder = self.recorder
+            self.recorder = None
+            if recorder is not None:
+                self.pi_camera.stop_recording(
+                    splitter_port=PiCameraBackend.burn_in_splitter_port
+                )
+                recorder.stop()
+            return
+
+        if self.pre_roll is None:
+            if self.pi_camera.recording:
+                self.pi_camera.stop_recording()
+        else:
+            self.pre_roll.stop()
+        if self.recording_file is not None:
+            self.recording_file.close()
+            self.recording_file = None
 
     def check_recording_errors(self) -> None:
+        if self.recorder is not None:
+            self.pi_camera.wait_recording(
+                splitter_port=PiCameraBackend.burn_in_splitter_port
+            )
+            self.recorder.check_errors()
+            return
+
         self.pi_camera.wait_recording()
+        if self.recording_file is not None:
+            self.recording_file.check_errors()
+
+    def get_recording_stats(self) -> Dict[str, float]:
+        if self.recorder is not None:
+            return self.recorder.get_stats()
+        if self.recording_file is None:
+            return {}
+        return self.recording_file.get_stats()
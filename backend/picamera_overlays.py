@@ -0,0 +1,134 @@
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+from zlib import crc32
+
+import numpy as np
+
+from canvas import Canvas
+
+
+class PiCameraOverlayLayer(Enum):
+    """ The `picamera` layers which each overlay canvas should be placed on.
+
+        Higher layer numbers are placed in front of lower ones. """
+
+    video_feed = 2
+    base = 3
+    data = 4
+    message = 5
+
+
+class _LayerRenderer:
+    """ A single `picamera` overlay renderer, and the buffers it is updated
+        from. """
+
+    def __init__(self, renderer, buffers: List[np.ndarray]):
+        self.renderer = renderer
+        self.buffers = buffers
+        # Index of the buffer last given to the renderer
+        self.front = 0
+        # Canvas and version last shown, to skip hashing unchanged canvases
+        self.canvas: Optional[Canvas] = None
+        self.version: Optional[int] = None
+        # Hash of the contents last shown
+        self.content_hash: Optional[int] = None
+
+
+class PiCameraOverlayManager:
+    """ Shows canvases as `picamera` overlays, keeping a single renderer for
+        each layer.
+
+        Creating a renderer allocates MMAL resources, so renderers are
+        created once and then updated in place. Previously overlays were
+        replaced on every update, as `overlay.update()` produced errors with
+        buffers which weren't padded to the size `picamera` expects (see
+        https://github.com/waveform80/picamera/issues/320). Each layer has
+        two padded buffers, which are written to in turn, so a buffer isn't
+        modified while the renderer may still be reading it. Pixels are only
+        uploaded when the canvas contents have changed. """
+
+    # `picamera` expects overlay buffers to have their width and height
+    # rounded up to multiples of these
+    width_alignment = 32
+    height_alignment = 16
+
+    def __init__(self, camera, width: int, height: int):
+        """ camera is the `picamera.PiCamera` to add overlays to """
+        self.camera = camera
+        self.width = width
+        self.height = height
+        self._renderers: Dict[PiCameraOverlayLayer, _LayerRenderer] = {}
+
+        # Counters
+        # Number of renderers created
+        self.renderers_created = 0
+        # Number of times new pixels were given to a renderer
+        self.uploads = 0
+        # Number of updates skipped as the canvas was unchanged
+        self.skipped = 0
+
+    @property
+    def padded_size(self) -> Tuple[int, int]:
+        """ The (width, height) of the buffers given to `picamera` """
+        return (
+            -(-self.width // self.width_alignment) * self.width_alignment,
+            -(-self.height // self.height_alignment) * self.height_alignment,
+        )
+
+    def update(self, canvas: Canvas, layer: PiCameraOverlayLayer) -> bool:
+        """ Shows the canvas on the given layer.
+
+            Returns True if the overlay was updated, or False if the canvas
+            was unchanged since it was last shown. """
+        layer_renderer = self._renderers.get(layer)
+        if layer_renderer is not None:
+            if (
+                canvas is layer_renderer.canvas
+                and canvas.version == layer_renderer.version
+            ):
+                self.skipped += 1
+                return False
+            layer_renderer.canvas = canvas
+            layer_renderer.version = canvas.version
+
+            content_hash = crc32(canvas.img)
+            if content_hash == layer_renderer.content_hash:
+                self.skipped += 1
+                return False
+            layer_renderer.content_hash = content_hash
+
+            back = 1 - layer_renderer.front
+            buffer = layer_renderer.buffers[back]
+            buffer[: self.height, : self.width] = canvas.img
+            layer_renderer.renderer.update(buffer)
+            layer_renderer.front = back
+            self.uploads += 1
+            return True
+
+        padded_width, padded_height = self.padded_size
+        buffers = [
+            np.zeros((padded_height, padded_width, 4), np.uint8)
+            for _ in range(2)
+        ]
+        buffers[0][: self.height, : self.width] = canvas.img
+        renderer = self.camera.add_overlay(
+            buffers[0], format="bgra", size=(self.width, self.height)
+        )
+        renderer.layer = layer.value
+        renderer.fullscreen = False
+        renderer.window = (0, 0, self.width, self.height)
+
+        layer_renderer = _LayerRenderer(renderer, buffers)
+        layer_renderer.canvas = canvas
+        layer_renderer.version = canvas.version
+        layer_renderer.content_hash = crc32(canvas.img)
+        self._renderers[layer] = layer_renderer
+        self.renderers_created += 1
+        self.uploads += 1
+        return True
+
+    def close(self) -> None:
+        """ Removes all of the overlays from the camera. """
+        for layer_renderer in self._renderers.values():
+            self.camera.remove_overlay(layer_renderer.renderer)
+        self._renderers.clear()
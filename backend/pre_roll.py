@@ -0,0 +1,283 @@
+from collections import deque
+from threading import Condition, Lock, Thread
+from time import monotonic
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from backend.frame_pool import FramePool
+from config import PRE_ROLL_KEY, read_configs
+
+# A function which accepts a chunk of encoded video, whether it starts at a
+# keyframe, and whether it ends a frame
+ChunkSink = Callable[[bytes, bool, bool], None]
+# A function which accepts an encoded frame, and the time it was captured
+FrameSink = Callable[[bytes, float], None]
+
+
+class PreRollBuffer:
+    """ Keeps the last few seconds of encoded video in memory, so that
+        recordings can include what happened just before they were started.
+
+        Encoded chunks are written continuously, and the oldest are discarded
+        once they are older than `seconds` or the buffer exceeds `max_bytes`.
+        When a recording starts, the buffered chunks are passed to it from
+        the first keyframe onwards, optionally followed by every chunk written
+        until it stops. As this is done while holding the buffer's lock, no
+        chunks are missed or reordered in between.
+
+        Chunks come from a PiCameraOutput on the Pi, or a JpegPreRollEncoder
+        with OpenCV. Each chunk is kept with the time it was written, or the
+        time its frame was captured if given. """
+
+    def __init__(
+        self,
+        seconds: float,
+        max_bytes: int,
+        clock: Callable[[], float] = monotonic,
+    ):
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        # Times chunks are written and captured at are from this clock
+        self.clock = clock
+
+        # Chunks as (time written or captured, whether it starts at a
+        # keyframe, whether it ends a frame, data)
+        self._chunks: Deque[Tuple[float, bool, bool, bytes]] = deque()
+        # Bytes of the distinct chunks buffered. The same chunk may be
+        # written repeatedly, eg. a JPEG of a frame which hasn't changed, so
+        # the chunks held are counted by identity.
+        self._size = 0
+        self._references: Dict[int, int] = {}
+        self._lock = Lock()
+        # Where new chunks are passed while recording
+        self._sink: Optional[ChunkSink] = None
+
+    @staticmethod
+    def from_configs(
+        clock: Callable[[], float] = monotonic,
+    ) -> Optional["PreRollBuffer"]:
+        """ Creates a buffer with the length set in configs.json, or returns
+            None if pre-roll is disabled. """
+        configs = read_configs().get(PRE_ROLL_KEY, {})
+        seconds = configs.get("seconds", 5)
+        if seconds <= 0:
+            return None
+        return PreRollBuffer(
+            seconds, int(configs.get("maxMegabytes", 64) * 1e6), clock
+        )
+
+    @property
+    def size(self) -> int:
+        """ Number of bytes buffered """
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def write(
+        self,
+        data: bytes,
+        keyframe: bool = True,
+        frame_end: bool = True,
+        capture_time: Optional[float] = None,
+    ) -> int:
+        """ Adds a chunk of encoded video. keyframe should be True if a
+            recording could start from this chunk, and frame_end if it is the
+            last chunk of a frame. capture_time is when the chunk's frame was
+            captured, from self.clock, if known. """
+        data = bytes(data)
+        with self._lock:
+            now = self.clock()
+            if capture_time is None:
+                capture_time = now
+            self._chunks.append((capture_time, keyframe, frame_end, data))
+            self._reference(data, 1)
+            while self._chunks and (
+                now - self._chunks[0][0] > self.seconds
+                or self._size > self.max_bytes
+            ):
+                self._reference(self._chunks.popleft()[3], -1)
+
+            if self._sink is not None:
+                self._sink(data, keyframe, frame_end)
+        return len(data)
+
+    def flush(self) -> None:
+        """ Part of the file-like interface. Chunks are always buffered. """
+
+    def _reference(self, data: bytes, change: int) -> None:
+        """ Counts a chunk being added to or removed from the buffer, and
+            adds its size when the first reference is added and takes it
+            away when the last is removed """
+        key = id(data)
+        count = self._references.get(key, 0) + change
+        if count:
+            self._references[key] = count
+        else:
+            del self._references[key]
+        if count == (1 if change > 0 else 0):
+            self._size += change * len(data)
+
+    def replay(self, sink: ChunkSink) -> int:
+        """ Passes the buffered chunks to sink, from the first keyframe.
+
+            Returns the number of chunks passed on. """
+        with self._lock:
+            return self._replay(sink)
+
+    def replay_frames(self, sink: FrameSink) -> int:
+        """ Passes the buffered chunks to sink with the time each was written
+            or captured, from the first keyframe. This is for chunks which
+            are each a frame, eg. from a JpegPreRollEncoder.
+
+            Returns the number of chunks passed on. """
+        with self._lock:
+            return self._replay(sink, timed=True)
+
+    def start(
+        self, sink: ChunkSink, replay_sink: Optional[ChunkSink] = None
+    ) -> int:
+        """ Passes the buffered chunks to replay_sink, or sink if not given,
+            then each new chunk to sink until self.stop is called.
+
+            Returns the number of buffered chunks passed on. """
+        with self._lock:
+            count = self._replay(replay_sink or sink)
+            self._sink = sink
+        return count
+
+    def _replay(self, sink: Callable, timed: bool = False) -> int:
+        count = 0
+        started = False
+        for timestamp, keyframe, frame_end, data in self._chunks:
+            started = started or keyframe
+            if not started:
+                continue
+            if timed:
+                sink(data, timestamp)
+            else:
+                sink(data, keyframe, frame_end)
+            count += 1
+        return count
+
+    def stop(self) -> None:
+        """ Stops passing new chunks on. """
+        with self._lock:
+            self._sink = None
+
+
+class JpegPreRollEncoder:
+    """ Encodes frames as JPEGs on a background thread and writes them into
+        a PreRollBuffer, for backends which composite frames themselves.
+
+        Submitting a frame never waits for encoding. If the previous frame
+        hasn't been encoded yet, it is dropped in favour of the new one. Each
+        JPEG is written with the time its frame was submitted, so recordings
+        can fill the gaps left by dropped frames. """
+
+    def __init__(
+        self,
+        buffer: PreRollBuffer,
+        quality: int = 90,
+        pool: Optional[FramePool] = None,
+    ):
+        self.buffer = buffer
+        self.quality = quality
+        self.pool = pool if pool is not None else FramePool()
+
+        # Newest frame which hasn't been encoded yet, with the time it was
+        # submitted
+        self._frame: Optional[Tuple[float, np.ndarray]] = None
+        # Whether a frame is being encoded
+        self._encoding = False
+        # Most recently encoded frame
+        self._jpeg: Optional[bytes] = None
+        self._condition = Condition()
+        self._thread: Optional[Thread] = None
+        self._running = False
+
+        # Counters
+        self.frames_encoded = 0
+        self.frames_dropped = 0
+
+    @staticmethod
+    def from_configs(
+        buffer: PreRollBuffer, pool: Optional[FramePool] = None
+    ) -> "JpegPreRollEncoder":
+        """ Creates an encoder with the quality set in configs.json """
+        configs = read_configs().get(PRE_ROLL_KEY, {})
+        return JpegPreRollEncoder(buffer, configs.get("quality", 90), pool)
+
+    def start(self) -> None:
+        self._running = True
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def flush(self) -> None:
+        """ Waits for the frame which was last submitted to be written to the
+            buffer. New frames mustn't be submitted meanwhile. """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: (self._frame is None and not self._encoding)
+                or not self._running
+            )
+
+    def stop(self) -> None:
+        """ Encodes any frame still waiting, then stops the thread. """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, frame: np.ndarray, changed: bool = True) -> None:
+        """ Queues a copy of the frame to be encoded. If the frame hasn't
+            changed since it was last submitted, the previous JPEG is reused
+            instead. """
+        now = self.buffer.clock()
+        with self._condition:
+            if not changed and self._jpeg is not None:
+                # Unless a newer frame is still waiting to be encoded, which
+                # is written once it has been
+                if self._frame is None and not self._encoding:
+                    self.buffer.write(self._jpeg, capture_time=now)
+                return
+
+        buffer = self.pool.acquire(frame.shape, frame.dtype)
+        np.copyto(buffer, frame)
+        with self._condition:
+            if self._frame is not None:
+                self.pool.release(self._frame[1])
+                self.frames_dropped += 1
+            self._frame = (now, buffer)
+            self._condition.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._frame is not None or not self._running
+                )
+                if self._frame is None:
+                    break
+                capture_time, frame = self._frame
+                self._frame = None
+                self._encoding = True
+
+            try:
+                success, jpeg = cv2.imencode(
+                    ".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+                )
+            finally:
+                self.pool.release(frame)
+            with self._condition:
+                self._encoding = False
+                self._condition.notify_all()
+                if not success:
+                    continue
+                self._jpeg = jpeg.tobytes()
+                self.buffer.write(self._jpeg, capture_time=capture_time)
+                self.frames_encoded += 1
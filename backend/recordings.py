@@ -0,0 +1,261 @@
+import os
+import re
+from pathlib import Path
+from threading import Lock
+from time import monotonic
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Union
+
+from backend.buffered_sink import BufferedSink
+from config import RECORDING_SEGMENTS_KEY, read_configs
+
+if TYPE_CHECKING:
+    # Which imports this module
+    from backend.telemetry import TelemetryWriter
+
+
+class RecordingManager:
+    """ Allocates the names of recording files in the recordings folder, and
+        decides when a recording should roll over into a new segment.
+
+        The folder is only listed once, when the first recording starts.
+        Names are then allocated from a counter, so starting a recording
+        doesn't get slower as recordings build up.
+
+        Recordings are named rec_<number>.<extension>. If segments are
+        enabled, each segment is instead named
+        rec_<number>_<segment>.<extension>, so that a recording is split into
+        several files which each hold up to segment_seconds of video, or up
+        to segment_bytes. This limits how much is lost if power is lost while
+        recording. """
+
+    # Matches the names of recordings, and segments of recordings
+    name_pattern = re.compile(r"rec_(\d+)(?:_(\d+))?\.\w+")
+
+    # Seconds between checking the size of the file being recorded
+    size_check_interval = 1
+
+    def __init__(
+        self,
+        folder: Union[str, Path],
+        extension: str,
+        segment_seconds: Optional[float] = None,
+        segment_bytes: Optional[int] = None,
+        clock: Callable[[], float] = monotonic,
+    ):
+        self.folder = Path(folder)
+        self.extension = extension
+        self.segment_seconds = segment_seconds
+        self.segment_bytes = segment_bytes
+        self._clock = clock
+
+        # Number of the next recording, or None until the folder is listed
+        self._next_number: Optional[int] = None
+        self._number = 0
+        # Files of the current recording, the newest last
+        self._segments: List[str] = []
+        self._lock = Lock()
+
+        # When the current segment started, and its size when last checked
+        self._segment_start_time = 0.0
+        self._size_check_time = 0.0
+
+    @staticmethod
+    def from_configs(
+        folder: Union[str, Path], extension: str
+    ) -> "RecordingManager":
+        """ Creates a manager with the segment length set in configs.json """
+        configs = read_configs().get(RECORDING_SEGMENTS_KEY, {})
+        megabytes = configs.get("megabytes")
+        return RecordingManager(
+            folder,
+            extension,
+            configs.get("seconds"),
+            int(megabytes * 1e6) if megabytes else None,
+        )
+
+    @property
+    def segmented(self) -> bool:
+        """ Whether recordings are split into segments """
+        return bool(self.segment_seconds or self.segment_bytes)
+
+    @property
+    def path(self) -> Optional[str]:
+        """ The file currently being recorded to, if any """
+        with self._lock:
+            return self._segments[-1] if self._segments else None
+
+    @property
+    def segments(self) -> List[str]:
+        """ The files of the current recording, oldest first """
+        with self._lock:
+            return list(self._segments)
+
+    def start(self) -> str:
+        """ Allocates the name of a new recording, and returns the path of
+            its first file. """
+        if self._next_number is None:
+            self._next_number = self._scan_folder()
+        with self._lock:
+            self._number = self._next_number
+            self._next_number += 1
+            self._segments = []
+        return self._start_segment()
+
+    def next_segment(self) -> str:
+        """ Returns the path of the next segment of the current recording """
+        return self._start_segment()
+
+    def stop(self) -> None:
+        """ Forgets the segments of the current recording. """
+        with self._lock:
+            self._segments = []
+
+    def should_roll(self, size: Optional[int] = None) -> bool:
+        """ Whether the current segment is full, so the recording should move
+            on to the next one. size is the bytes written to the segment, or
+            if not given, the size of the file is checked every
+            self.size_check_interval. """
+        if not self.segmented or not self._segments:
+            return False
+        now = self._clock()
+        if (
+            self.segment_seconds
+            and now - self._segment_start_time >= self.segment_seconds
+        ):
+            return True
+        if not self.segment_bytes:
+            return False
+
+        if size is None:
+            if now - self._size_check_time < self.size_check_interval:
+                return False
+            self._size_check_time = now
+            try:
+                size = os.path.getsize(self._segments[-1])
+            except OSError:
+                return False
+        return size >= self.segment_bytes
+
+    def _start_segment(self) -> str:
+        with self._lock:
+            if self.segmented:
+                name = f"rec_{self._number}_{len(self._segments) + 1}"
+            else:
+                name = f"rec_{self._number}"
+            path = str(self.folder / f"{name}.{self.extension}")
+            self._segments.append(path)
+        self._segment_start_time = self._size_check_time = self._clock()
+        return path
+
+    def _scan_folder(self) -> int:
+        """ Creates the folder if needed, and finds the number after the
+            highest numbered recording in it. """
+        self.folder.mkdir(parents=True, exist_ok=True)
+        highest = 0
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                match = RecordingManager.name_pattern.fullmatch(entry.name)
+                if match:
+                    highest = max(highest, int(match.group(1)))
+        return highest + 1
+
+
+class SegmentedFile:
+    """ A file-like output for encoded video which moves on to the next
+        segment of the recording when the current one is full.
+
+        Segments can only start at a keyframe, so that each can be played on
+        its own. A full segment is only closed once a keyframe is written.
+
+        The video is written through a BufferedSink, so writing never waits
+        for the storage device. If a TelemetryWriter is given, a record is
+        written for each frame once its last chunk is. """
+
+    def __init__(
+        self,
+        path: str,
+        recordings: Optional[RecordingManager],
+        telemetry: Optional["TelemetryWriter"] = None,
+    ):
+        self.recordings = recordings
+        self.telemetry = telemetry
+        self._sink = BufferedSink.from_configs(path)
+        # Bytes written to the current segment
+        self.size = 0
+
+    def write(
+        self, data: bytes, keyframe: bool = True, frame_end: bool = True
+    ) -> int:
+        """ Writes a chunk of video. frame_end is whether it is the last
+            chunk of a frame. """
+        written = self._write(data, keyframe)
+        if frame_end and self.telemetry is not None:
+            self.telemetry.write(self.telemetry.snapshot())
+        return written
+
+    def write_pre_roll(
+        self, data: bytes, keyframe: bool = True, frame_end: bool = True
+    ) -> int:
+        """ Writes a chunk of video from before the recording started, eg.
+            from a PreRollBuffer, whose frames have no telemetry. """
+        written = self._write(data, keyframe)
+        if frame_end and self.telemetry is not None:
+            self.telemetry.write()
+        return written
+
+    def _write(self, data: bytes, keyframe: bool) -> int:
+        if (
+            keyframe
+            and self.recordings is not None
+            and self.recordings.should_roll(self.size)
+        ):
+            self._sink.switch(self.recordings.next_segment())
+            self.size = 0
+        self.size += len(data)
+        return self._sink.write(data)
+
+    def flush(self) -> None:
+        self._sink.flush()
+
+    def close(self) -> None:
+        self._sink.close()
+
+    def check_errors(self) -> None:
+        """ Raises any exception from writing the file. """
+        self._sink.check_errors()
+
+    def get_stats(self) -> Dict[str, float]:
+        return self._sink.get_stats()
+
+
+class PiCameraOutput:
+    """ A `picamera` recording output which passes each chunk of video on
+        with whether it starts at a keyframe and whether it ends a frame, eg.
+        to a PreRollBuffer or SegmentedFile.
+
+        Chunks start at a keyframe when they are an SPS header, which
+        `picamera` writes before every keyframe when recording H.264 with
+        inline headers. SPS headers aren't frames of their own. """
+
+    # Value of picamera.PiVideoFrameType.sps_header
+    sps_header = 2
+
+    def __init__(self, output, camera):
+        """ output has a write(data, keyframe, frame_end) method """
+        self.output = output
+        self.camera = camera
+
+    def write(self, data: bytes) -> int:
+        frame = self.camera.frame
+        keyframe = (
+            frame is not None and frame.frame_type == PiCameraOutput.sps_header
+        )
+        frame_end = (
+            frame is not None
+            and frame.complete
+            and frame.frame_type != PiCameraOutput.sps_header
+        )
+        return self.output.write(data, keyframe, frame_end)
+
+    def flush(self) -> None:
+        pass
@@ -0,0 +1,245 @@
+import math
+import os
+import struct
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from backend.buffered_sink import BufferedSink
+from backend.recordings import RecordingManager
+from config import TELEMETRY_KEY, read_configs
+from data import Data
+
+# Start of each telemetry file: magic, format version, number of fields,
+# size of each record and the frame index of the first record
+HEADER = struct.Struct("<4sHHIQ")
+# Follows the header for each field: its name and struct format
+FIELD = struct.Struct("<32s8s")
+# Start of each record: frame index, monotonic time and a bit for each field
+# which is set if the field's value is valid
+RECORD_PREFIX = "QdI"
+
+MAGIC = b"MHPT"
+VERSION = 2
+
+# Struct formats of the values of each type of field. Strings are cut short.
+FIELD_FORMATS = {int: "q", float: "d", bool: "?", str: "32s"}
+# Messages from the DAShboard are longer than other strings
+MESSAGE_FORMAT = "128s"
+
+# The time, valid bits and values of the data when a frame was recorded,
+# which is written once the frame has been (see TelemetryWriter.snapshot)
+Snapshot = Tuple[Any, ...]
+
+
+def telemetry_path(video_path: str) -> str:
+    """ The path of the telemetry file recorded alongside a video file """
+    name = os.path.splitext(video_path)[0]
+    return f"{name}.{TelemetryWriter.file_extension}"
+
+
+class TelemetryWriter:
+    """ Records a snapshot of the bike data for each frame of a recording, to
+        a file alongside each video file.
+
+        Each file starts with a header listing the fields, followed by a
+        fixed-size record for every frame from the header's first frame
+        index on, so the record of any frame is found by seeking straight to
+        it (see TelemetryReader). Records hold the frame index, a monotonic
+        timestamp, and the value and validity of every field, including
+        whether the DAS is logging and its message.
+
+        Records are written by the recorder, once for each frame it writes to
+        the video, so frame indexes count the frames of the video from the
+        start of the recording. The data is taken with self.snapshot when a
+        frame is captured, and written with self.write once the frame is.
+        Frames from before the recording started, eg. from the pre-roll,
+        have records without a time or any valid fields.
+
+        When a recording moves on to its next segment, a new telemetry file
+        is started alongside it, whose first frame is the first frame of the
+        segment. Files are written through a BufferedSink, so writing never
+        waits for the storage device. """
+
+    # Extension of the telemetry files
+    file_extension = "telemetry"
+
+    def __init__(
+        self,
+        data: Data,
+        recordings: RecordingManager,
+        clock: Callable[[], float] = monotonic,
+    ):
+        self.data = data
+        self.recordings = recordings
+        self._clock = clock
+        self.fields: List[str] = list(data.data) + ["logging", "message"]
+        if len(self.fields) > 32:
+            raise ValueError("Telemetry records have room for 32 fields")
+        self._data_values = list(data.data.values()) + [
+            data.logging,
+            data.message,
+        ]
+        self.formats = [
+            FIELD_FORMATS[value.data_type] for value in self._data_values
+        ]
+        self.formats[-1] = MESSAGE_FORMAT
+        self.record = struct.Struct(
+            "<" + RECORD_PREFIX + "".join(self.formats)
+        )
+        # Snapshot of frames without any data
+        self._empty: Snapshot = (float("nan"), 0) + tuple(
+            self._pack_value(None, value_format)
+            for value_format in self.formats
+        )
+
+        # Index of the next frame to be written
+        self.frame_index = 0
+        # Video file the current telemetry file is alongside
+        self._video_path: Optional[str] = None
+        self._sink: Optional[BufferedSink] = None
+        # Held while writing, as records are written by the recorder's thread
+        self._lock = Lock()
+
+    @staticmethod
+    def is_enabled() -> bool:
+        """ Whether telemetry is recorded, as set in configs.json """
+        return read_configs().get(TELEMETRY_KEY, {}).get("enabled", True)
+
+    def start(self) -> None:
+        """ Opens the telemetry file for the current recording. Must be
+            called before the recorder writes any frames. """
+        video_path = self.recordings.path
+        sink = BufferedSink.from_configs(telemetry_path(video_path))
+        self._write_header(sink, 0)
+        with self._lock:
+            self.frame_index = 0
+            self._video_path = video_path
+            self._sink = sink
+
+    def snapshot(self) -> Snapshot:
+        """ Takes the current data, to be written for a frame being
+            captured now. """
+        valid = 0
+        values = []
+        for i, value in enumerate(self._data_values):
+            if value.is_valid():
+                valid |= 1 << i
+            values.append(self._pack_value(value.value, self.formats[i]))
+        return (self._clock(), valid, *values)
+
+    def write(self, snapshot: Optional[Snapshot] = None) -> None:
+        """ Records the snapshot for the next frame of the video, or a record
+            without data if snapshot is None. """
+        with self._lock:
+            if self._sink is None:
+                return
+            path = self.recordings.path
+            if path is not None and path != self._video_path:
+                self._video_path = path
+                self._sink.switch(telemetry_path(path))
+                self._write_header(self._sink, self.frame_index)
+
+            if snapshot is None:
+                snapshot = self._empty
+            self._sink.write(self.record.pack(self.frame_index, *snapshot))
+            self.frame_index += 1
+
+    def stop(self) -> None:
+        """ Writes out and closes the telemetry file. """
+        with self._lock:
+            sink = self._sink
+            self._sink = None
+        if sink is not None:
+            sink.close()
+
+    def check_errors(self) -> None:
+        """ Raises any exception from writing the file. """
+        sink = self._sink
+        if sink is not None:
+            sink.check_errors()
+
+    def _write_header(self, sink: BufferedSink, first_frame: int) -> None:
+        sink.write(
+            HEADER.pack(
+                MAGIC,
+                VERSION,
+                len(self.fields),
+                self.record.size,
+                first_frame,
+            )
+        )
+        for field, value_format in zip(self.fields, self.formats):
+            sink.write(FIELD.pack(field.encode(), value_format.encode()))
+
+    @staticmethod
+    def _pack_value(value: Any, value_format: str) -> Any:
+        """ Converts a field's value to what its struct format takes """
+        if value_format.endswith("s"):
+            return b"" if value is None else str(value).encode()
+        if value is None:
+            return 0
+        return value
+
+
+class TelemetryReader:
+    """ Reads the records of a telemetry file written by TelemetryWriter.
+
+        The record of a frame is looked up by indexing the reader with the
+        frame index, eg. reader[120], which seeks straight to it. """
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        magic, version, count, record_size, first_frame = HEADER.unpack(
+            self.file.read(HEADER.size)
+        )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a telemetry file")
+        self.first_frame = first_frame
+        self.fields: List[str] = []
+        formats = []
+        for _ in range(count):
+            name, value_format = FIELD.unpack(self.file.read(FIELD.size))
+            self.fields.append(name.rstrip(b"\0").decode())
+            formats.append(value_format.rstrip(b"\0").decode())
+        self.formats = formats
+        self.record = struct.Struct("<" + RECORD_PREFIX + "".join(formats))
+        if self.record.size != record_size:
+            raise ValueError(f"{path} has records of an unknown layout")
+        self.header_size = HEADER.size + count * FIELD.size
+
+    def __len__(self) -> int:
+        """ Number of records in the file """
+        size = os.fstat(self.file.fileno()).st_size - self.header_size
+        return size // self.record.size
+
+    def __getitem__(self, frame_index: int) -> Tuple[float, Dict[str, Any]]:
+        """ Returns the time of the frame, and each field's value, or None
+            where it wasn't valid. The time is None for frames recorded
+            without data. """
+        record_index = frame_index - self.first_frame
+        if not 0 <= record_index < len(self):
+            raise IndexError(f"No record of frame {frame_index}")
+        self.file.seek(self.header_size + record_index * self.record.size)
+        _, timestamp, valid, *values = self.record.unpack(
+            self.file.read(self.record.size)
+        )
+        fields = {}
+        for i, (field, value) in enumerate(zip(self.fields, values)):
+            if not valid & (1 << i):
+                value = None
+            elif self.formats[i].endswith("s"):
+                value = value.rstrip(b"\0").decode(errors="replace")
+            fields[field] = value
+        if math.isnan(timestamp):
+            timestamp = None
+        return timestamp, fields
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
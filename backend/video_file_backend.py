@@ -0,0 +1,282 @@
+from collections import deque
+from enum import Enum
+from threading import Condition, Thread
+from time import perf_counter
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from backend import PublishFunc
+from backend.compositing_backend import CompositingBackend
+from backend.frame_pool import FramePool
+from backend.opencv_backend import OpenCVBackend
+from config import VIDEO_FILE_KEY, read_configs
+
+
+class VideoPacing(Enum):
+    """ How quickly frames of a video file are played """
+
+    # At the video's own frame rate, dropping frames if the loop falls behind
+    realtime = "realtime"
+    # At a set frame rate, dropping frames if the loop falls behind
+    fixed = "fixed"
+    # Every frame in turn, as fast as the loop takes them
+    fast = "fast"
+
+
+class VideoFileReader:
+    """ Decodes frames from a video file (eg. `cv2.VideoCapture`) ahead of
+        time on a background thread, and plays them back like a camera.
+
+        Up to decode_ahead frames are decoded before they are needed, so the
+        reader rarely waits for the decoder. With realtime or fixed pacing,
+        each frame is due at its time in the video from the first read, and
+        self.read returns the newest frame due, dropping any before it. With
+        fast pacing, self.read waits for and returns every frame in order.
+
+        Frames are read into buffers from the pool. The reader must release
+        each frame it takes back to the pool once finished with it. """
+
+    def __init__(
+        self,
+        capture,
+        pool: FramePool,
+        pacing: VideoPacing = VideoPacing.realtime,
+        framerate: Optional[float] = None,
+        loop: bool = True,
+        decode_ahead: int = 8,
+        clock: Callable[[], float] = perf_counter,
+    ):
+        """ framerate is that of the video, or the frame rate to play it at
+            with fixed pacing """
+        self.capture = capture
+        self.pool = pool
+        self.pacing = pacing
+        self.framerate = framerate or capture.get(cv2.CAP_PROP_FPS) or 30
+        self.loop = loop
+        self.decode_ahead = decode_ahead
+        self._clock = clock
+
+        # Decoded frames with their index since the video started playing
+        self._queue: Deque[Tuple[int, np.ndarray]] = deque()
+        self._condition = Condition()
+        self._thread: Optional[Thread] = None
+        self._running = False
+        # Whether the end of the video was reached, without looping
+        self.finished = False
+        # Time of the first read, which frame times are counted from
+        self._start_time: Optional[float] = None
+
+        # Counters
+        self.frames_decoded = 0
+        self.frames_dropped = 0
+        self.loops = 0
+
+    def start(self) -> None:
+        """ Start decoding frames. Does nothing if already started. """
+        if self._running:
+            return
+        self._running = True
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """ Stop decoding and release any decoded frames. The capture itself
+            is not released. """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        while self._queue:
+            self.pool.release(self._queue.popleft()[1])
+
+    def read(self) -> Optional[np.ndarray]:
+        """ Take the next frame to show, or None if no new frame is due yet.
+            With fast pacing, waits for the next frame to be decoded. """
+        with self._condition:
+            if self.pacing is VideoPacing.fast:
+                self._condition.wait_for(
+                    lambda: self._queue or self.finished or not self._running
+                )
+                if not self._queue:
+                    return None
+                return self._take()
+
+            now = self._clock()
+            if self._start_time is None:
+                self._start_time = now
+            due = (now - self._start_time) * self.framerate
+            frame = None
+            while self._queue and self._queue[0][0] <= due:
+                if frame is not None:
+                    self.pool.release(frame)
+                    self.frames_dropped += 1
+                frame = self._take()
+            return frame
+
+    @property
+    def done(self) -> bool:
+        """ Whether the end of the video was reached without looping, and
+            every frame has been read """
+        with self._condition:
+            return self.finished and not self._queue
+
+    def get_stats(self) -> Dict[str, float]:
+        """ Get the playback counters, eg. for publishing as a status. """
+        return {
+            "videoFramesDecoded": self.frames_decoded,
+            "videoFramesDropped": self.frames_dropped,
+            "videoLoops": self.loops,
+        }
+
+    def _take(self) -> np.ndarray:
+        """ Takes the oldest decoded frame. Must be called while holding
+            self._condition. """
+        _, frame = self._queue.popleft()
+        self._condition.notify_all()
+        return frame
+
+    def _run(self) -> None:
+        shape = None
+        # Frames decoded when the video last looped, to stop if it is empty
+        loop_start = 0
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: len(self._queue) < self.decode_ahead
+                    or not self._running
+                )
+                if not self._running:
+                    return
+
+            if shape is None:
+                buffer = None
+                success, frame = self.capture.read()
+            else:
+                buffer = self.pool.acquire(shape)
+                success, frame = self.capture.read(buffer)
+            if buffer is not None and frame is not buffer:
+                # Not read into the buffer, eg. at the end of the video
+                self.pool.release(buffer)
+            if not success or frame is None:
+                if self.loop and self.frames_decoded > loop_start:
+                    loop_start = self.frames_decoded
+                    self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    self.loops += 1
+                    continue
+                with self._condition:
+                    self.finished = True
+                    self._condition.notify_all()
+                return
+            shape = frame.shape
+
+            with self._condition:
+                self._queue.append((self.frames_decoded, frame))
+                self.frames_decoded += 1
+                self._condition.notify_all()
+
+
+class VideoFileBackend(OpenCVBackend):
+    """ Plays a recorded video file (eg. .h264 or .mp4) as the camera feed,
+        set with self.set_video.
+
+        Frames are composited and displayed in the same way as OpenCVBackend,
+        so the same video gives reproducible input for profiling without a
+        camera. The pacing is set in configs.json (see VideoPacing). With
+        fast pacing, the loop isn't limited to the target frame rate until
+        a video which doesn't loop has ended. The last frame then stays
+        shown. """
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        publish_recording_status_func: PublishFunc,
+        publish_video_status_func: PublishFunc,
+        exception_handler: PublishFunc,
+    ):
+        super().__init__(
+            width,
+            height,
+            publish_recording_status_func,
+            publish_video_status_func,
+            exception_handler,
+        )
+        configs = read_configs().get(VIDEO_FILE_KEY, {})
+        self.pacing = VideoPacing(
+            configs.get("pacing", VideoPacing.realtime.value)
+        )
+        # Frame rate to play the video at with fixed pacing
+        self.fixed_framerate = configs.get("fps", self.frame_pacer.framerate)
+        self.loop = configs.get("loop", True)
+        self.decode_ahead = configs.get("decodeAhead", 8)
+        self.paced = self.pacing is not VideoPacing.fast
+
+        self.video_path: Optional[str] = None
+        self._video_started = False
+
+    def set_video(self, video_path: str) -> None:
+        """ Play the video file at video_path, from the start """
+        self.video_path = video_path
+        if self._video_started:
+            self._close_video()
+            self._open_video()
+
+    def start_video(self) -> None:
+        self._video_started = True
+        if self.video_path is not None:
+            self._open_video()
+        # Without opening the webcam, as OpenCVBackend would
+        CompositingBackend.start_video(self)
+
+    def _open_video(self) -> None:
+        self.paced = self.pacing is not VideoPacing.fast
+        self.webcam = cv2.VideoCapture(self.video_path)
+        if not self.webcam.isOpened():
+            raise FileNotFoundError(f"Could not open {self.video_path}")
+        framerate = None
+        if self.pacing is VideoPacing.fixed:
+            framerate = self.fixed_framerate
+        self.capture = VideoFileReader(
+            self.webcam,
+            self.frame_pool,
+            self.pacing,
+            framerate,
+            self.loop,
+            self.decode_ahead,
+        )
+        self.capture.start()
+
+    def _close_video(self) -> None:
+        if self.capture is not None:
+            self.capture.stop()
+            self.capture = None
+        if self.webcam is not None:
+            self.webcam.release()
+            self.webcam = None
+
+    def _is_video_on(self):
+        return self.capture is not None and not self.capture.finished
+
+    def _on_loop(self) -> None:
+        if self.capture is None:
+            return
+        super()._on_loop()
+        # Nothing is left to play, so wait for each frame rather than
+        # spinning through the loop
+        if not self.paced and self.capture.done:
+            self.paced = True
+
+    def stop_video(self) -> None:
+        CompositingBackend.stop_video(self)
+        self._close_video()
+        self._video_started = False
+        cv2.destroyAllWindows()
+
+    def get_video_stats(self) -> Dict[str, float]:
+        if self.capture is None:
+            return {}
+        return self.capture.get_stats()
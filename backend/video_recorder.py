@@ -0,0 +1,319 @@
+from collections import deque
+from enum import Enum
+from threading import Condition, Thread
+from time import perf_counter
+from typing import Deque, Dict, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from backend.frame_pool import FramePool
+from backend.recordings import RecordingManager
+from backend.telemetry import Snapshot, TelemetryWriter
+from config import (
+    RECORDING_QUEUE_POLICY_KEY,
+    RECORDING_QUEUE_SIZE_KEY,
+    read_configs,
+)
+
+
+class QueueFullPolicy(Enum):
+    """ What to do with a new frame when the recording queue is full """
+
+    # Discard the oldest queued frame to make room
+    drop_oldest = "dropOldest"
+    # Wait for the encoder to make room
+    block = "block"
+
+
+class VideoRecorder:
+    """ Records frames to a video file with `cv2.VideoWriter`.
+
+        Frames are copied into a bounded queue, which is drained by an
+        encoder thread, so encoding doesn't hold up the frame loop. When the
+        queue is full, the policy decides whether frames are dropped or the
+        caller waits.
+
+        If a RecordingManager is given, the video is split into segments
+        once the current file is full. The encoder thread moves on to the
+        next file between frames, so no frames are lost.
+
+        Frames from before the recording started (see self.write_pre_roll)
+        are kept in a separate queue, which is encoded first and never
+        dropped from.
+
+        If a TelemetryWriter is given, the data is taken as each frame is
+        written to the recorder, and recorded once the frame is encoded, so
+        dropped frames have no records. """
+
+    # Codec of the recorded video, which must suit the file extension
+    fourcc = "MJPG"
+    file_extension = "avi"
+
+    # Seconds over which the encoded frame rate is measured
+    fps_interval = 1
+
+    def __init__(
+        self,
+        path: str,
+        framerate: float,
+        size: Tuple[int, int],
+        pool: Optional[FramePool] = None,
+        queue_size: int = 30,
+        policy: QueueFullPolicy = QueueFullPolicy.drop_oldest,
+        recordings: Optional[RecordingManager] = None,
+        telemetry: Optional[TelemetryWriter] = None,
+    ):
+        """ size is the (width, height) of the frames to record """
+        self.path = path
+        self.framerate = framerate
+        self.size = size
+        self.pool = pool if pool is not None else FramePool()
+        self.queue_size = queue_size
+        self.policy = policy
+        self.recordings = recordings
+        self.telemetry = telemetry
+
+        # Frames to encode, with the time they were captured and the data
+        # to record with them
+        self._queue: Deque[
+            Tuple[float, np.ndarray, Optional[Snapshot]]
+        ] = deque()
+        # JPEGs of frames from before the recording, encoded before self._queue
+        self._pre_roll: Deque[Tuple[Optional[float], bytes]] = deque()
+        # Capture time of the first pre-roll frame, and the newest JPEG,
+        # which is repeated to fill gaps between pre-roll frames
+        self._pre_roll_start: Optional[float] = None
+        self._pre_roll_jpeg: Optional[bytes] = None
+        self._condition = Condition()
+        self._thread: Optional[Thread] = None
+        self._running = False
+        # Exception raised by the encoder thread, see self.check_errors
+        self._error: Optional[Exception] = None
+        # The last JPEG decoded by the encoder thread, and its image
+        self._decoded_jpeg: Optional[bytes] = None
+        self._decoded_image: Optional[np.ndarray] = None
+
+        # Counters
+        self.frames_encoded = 0
+        self.frames_dropped = 0
+        # Frames queued from before the recording, including repeats
+        self.pre_roll_frames = 0
+        # Seconds between the most recent frame being captured and encoded
+        self.encode_lag = 0.0
+        # Frames encoded per second, measured over self.fps_interval
+        self.fps = 0.0
+        self._fps_start_time = 0.0
+        self._fps_start_count = 0
+
+    @staticmethod
+    def from_configs(
+        path: str,
+        framerate: float,
+        size: Tuple[int, int],
+        pool: Optional[FramePool] = None,
+        recordings: Optional[RecordingManager] = None,
+        telemetry: Optional[TelemetryWriter] = None,
+    ) -> "VideoRecorder":
+        """ Creates a recorder with the queue settings from configs.json """
+        configs = read_configs()
+        return VideoRecorder(
+            path,
+            framerate,
+            size,
+            pool,
+            configs.get(RECORDING_QUEUE_SIZE_KEY, 30),
+            QueueFullPolicy(
+                configs.get(
+                    RECORDING_QUEUE_POLICY_KEY,
+                    QueueFullPolicy.drop_oldest.value,
+                )
+            ),
+            recordings,
+            telemetry,
+        )
+
+    def start(self) -> None:
+        """ Opens the video file and starts the encoder thread. """
+        writer = self._open_writer(self.path)
+        self._running = True
+        self._fps_start_time = perf_counter()
+        self._thread = Thread(target=self._run, args=(writer,), daemon=True)
+        self._thread.start()
+
+    def write(
+        self,
+        frame: np.ndarray,
+        capture_time: Optional[float] = None,
+        snapshot: Optional[Snapshot] = None,
+    ) -> None:
+        """ Queues a copy of the frame to be recorded. capture_time is when
+            the frame was captured, from perf_counter, and defaults to now.
+            snapshot is the data when it was captured, and is taken now if
+            not given. """
+        if capture_time is None:
+            capture_time = perf_counter()
+        if snapshot is None and self.telemetry is not None:
+            snapshot = self.telemetry.snapshot()
+        buffer = self.pool.acquire(frame.shape, frame.dtype)
+        np.copyto(buffer, frame)
+
+        with self._condition:
+            if self.policy is QueueFullPolicy.block:
+                self._condition.wait_for(
+                    lambda: len(self._queue) < self.queue_size
+                    or not self._running
+                )
+            elif len(self._queue) >= self.queue_size:
+                self._release(self._queue.popleft()[1])
+                self.frames_dropped += 1
+
+            if not self._running:
+                self.pool.release(buffer)
+                return
+            self._queue.append((capture_time, buffer, snapshot))
+            self._condition.notify_all()
+
+    def write_pre_roll(
+        self, jpeg: bytes, capture_time: Optional[float] = None
+    ) -> int:
+        """ Queues a JPEG encoded frame from before the recording started, eg.
+            from PreRollBuffer.replay_frames. These are always queued, as the
+            pre-roll buffer already limits how many there are.
+
+            capture_time is when the frame was captured, from any clock. Each
+            frame is recorded at the slot of the recording's frame rate
+            nearest that time. The previous frame is repeated to fill the
+            slots before it, eg. where the pre-roll encoder fell behind and
+            dropped frames, so the pre-roll plays at the right speed. A frame
+            whose slot is already filled is only used for the gaps after it.
+
+            Returns the number of frames queued. """
+        jpeg = bytes(jpeg)
+        with self._condition:
+            if capture_time is None:
+                slot = self.pre_roll_frames
+            else:
+                if self._pre_roll_start is None:
+                    self._pre_roll_start = (
+                        capture_time - self.pre_roll_frames / self.framerate
+                    )
+                elapsed = capture_time - self._pre_roll_start
+                slot = round(elapsed * self.framerate)
+
+            queued = 0
+            while self.pre_roll_frames < slot:
+                self._pre_roll.append((None, self._pre_roll_jpeg))
+                self.pre_roll_frames += 1
+                queued += 1
+            if self.pre_roll_frames == slot:
+                self._pre_roll.append((None, jpeg))
+                self.pre_roll_frames += 1
+                queued += 1
+            self._pre_roll_jpeg = jpeg
+            self._condition.notify_all()
+        return queued
+
+    def stop(self) -> None:
+        """ Encodes any frames still queued, then closes the video file. """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def check_errors(self) -> None:
+        """ Raises any exception which stopped the encoder thread. """
+        if self._error is not None:
+            raise self._error
+
+    def get_stats(self) -> Dict[str, float]:
+        """ Get the recording counters, eg. for the recording status. """
+        with self._condition:
+            queue_depth = len(self._queue) + len(self._pre_roll)
+        return {
+            "encodedFps": self.fps,
+            "queueDepth": queue_depth,
+            "droppedFrames": self.frames_dropped,
+            "encodeLag": self.encode_lag,
+        }
+
+    def _open_writer(self, path: str) -> cv2.VideoWriter:
+        writer = cv2.VideoWriter(
+            path,
+            cv2.VideoWriter_fourcc(*self.fourcc),
+            self.framerate,
+            self.size,
+        )
+        if not writer.isOpened():
+            raise RuntimeError(f"Unable to open {path} for recording")
+        return writer
+
+    def _run(self, writer: cv2.VideoWriter) -> None:
+        try:
+            while True:
+                with self._condition:
+                    self._condition.wait_for(
+                        lambda: self._queue
+                        or self._pre_roll
+                        or not self._running
+                    )
+                    if self._pre_roll:
+                        capture_time, frame = self._pre_roll.popleft()
+                        snapshot = None
+                    elif self._queue:
+                        capture_time, frame, snapshot = self._queue.popleft()
+                    else:
+                        break
+                    self._condition.notify_all()
+
+                try:
+                    writer.write(self._decode(frame))
+                finally:
+                    self._release(frame)
+                if self.telemetry is not None:
+                    self.telemetry.write(snapshot)
+                if capture_time is not None:
+                    self.encode_lag = perf_counter() - capture_time
+                self._update_fps()
+
+                recordings = self.recordings
+                if recordings is not None and recordings.should_roll():
+                    writer.release()
+                    writer = self._open_writer(recordings.next_segment())
+        except Exception as error:
+            self._error = error
+            with self._condition:
+                self._running = False
+                self._condition.notify_all()
+        finally:
+            writer.release()
+
+    def _decode(self, frame: Union[np.ndarray, bytes]) -> np.ndarray:
+        """ Decodes JPEGs, scaling them to the recording size if needed.
+            Repeats of the same JPEG are only decoded once. """
+        if not isinstance(frame, bytes):
+            return frame
+        if frame is self._decoded_jpeg:
+            return self._decoded_image
+        image = cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_COLOR)
+        if (image.shape[1], image.shape[0]) != tuple(self.size):
+            image = cv2.resize(image, tuple(self.size))
+        self._decoded_jpeg = frame
+        self._decoded_image = image
+        return image
+
+    def _release(self, frame: Union[np.ndarray, bytes]) -> None:
+        """ Returns a queued frame's buffer to the pool """
+        if not isinstance(frame, bytes):
+            self.pool.release(frame)
+
+    def _update_fps(self) -> None:
+        self.frames_encoded += 1
+        now = perf_counter()
+        elapsed = now - self._fps_start_time
+        if elapsed >= self.fps_interval:
+            self.fps = (self.frames_encoded - self._fps_start_count) / elapsed
+            self._fps_start_time = now
+            self._fps_start_count = self.frames_encoded
@@ -1,5 +1,17 @@
+from collections import OrderedDict
+from contextlib import contextmanager
 from enum import Enum
-from typing import Tuple, Union
+from functools import lru_cache
+from typing import (
+    Callable,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import cv2
 import numpy as np
@@ -26,22 +38,302 @@ Colourlike = Union[ColourTuple3, ColourTuple4, Colour]
 
 Coord = Tuple[int, int]
 
+# A rectangular region of a canvas, as (left, top, right, bottom). The right
+# and bottom edges are exclusive, so the region can be used to slice images.
+Rect = Tuple[int, int, int, int]
+
+
+def _add_region(regions: List[Rect], region: Rect) -> None:
+    """ Adds region to the list regions, merging it with any existing regions
+        it overlaps so that no pixel is covered twice. """
+    left, top, right, bottom = region
+    if left >= right or top >= bottom:
+        return
+    merged = True
+    while merged:
+        merged = False
+        for other in regions:
+            if (
+                left <= other[2]
+                and other[0] <= right
+                and top <= other[3]
+                and other[1] <= bottom
+            ):
+                regions.remove(other)
+                left, top = min(left, other[0]), min(top, other[1])
+                right, bottom = max(right, other[2]), max(bottom, other[3])
+                merged = True
+                break
+    regions.append((left, top, right, bottom))
+
+
+def _regions_overlap(region: Rect, other: Rect) -> bool:
+    """ Checks whether two regions share any pixels """
+    return (
+        region[0] < other[2]
+        and other[0] < region[2]
+        and region[1] < other[3]
+        and other[1] < region[3]
+    )
+
+
+def _masked_copy(
+    dest: np.ndarray, src: np.ndarray, mask: np.ndarray, region: Rect
+) -> None:
+    """ Copies the pixels of src where mask is non-zero over dest, within
+        region. """
+    left, top, right, bottom = region
+    src = src[top:bottom, left:right]
+    cv2.bitwise_and(
+        src,
+        src,
+        dst=dest[top:bottom, left:right],
+        mask=mask[top:bottom, left:right],
+    )
+
+
+def _alpha_blend(
+    dest: np.ndarray,
+    premultiplied: np.ndarray,
+    inverse_alpha: np.ndarray,
+    region: Rect,
+) -> None:
+    """ Blends an image over dest within region, in place, given the image's
+        colour premultiplied by its alpha and its inverse alpha (255 - alpha).
+
+        This calculates dest * (255 - alpha) / 255 + colour * alpha / 255
+        with saturating 8-bit arithmetic, using the precomputed terms. """
+    left, top, right, bottom = region
+    dest = dest[top:bottom, left:right]
+    cv2.multiply(dest, inverse_alpha[top:bottom, left:right], dest, 1 / 255)
+    cv2.add(dest, premultiplied[top:bottom, left:right], dest)
+
+
+def _align_text(coord: Coord, width: int, align: str) -> Coord:
+    """ Gets the bottom left corner of text of a given width, which is drawn
+        at coord with the given alignment. See Canvas.draw_text. """
+    if align == "left":
+        return coord
+    if align == "right":
+        return (coord[0] - width, coord[1])
+    if align == "centre":
+        return (coord[0] - width // 2, coord[1])
+    raise ValueError(f"Invalid text alignment '{align}'")
+
+
+class TextSprite:
+    """ Pre-rendered text which can be quickly drawn onto a canvas.
+
+        Drawing a sprite gives the same result as OpenCV's anti-aliased text:
+        the colour is blended with the canvas by how much of each pixel the
+        text covers, and the alpha of every covered pixel is set to that
+        coverage. Both parts are stored ready to apply as a multiply-add:
+        inverse scales the existing BGRA pixels and premultiplied is added
+        on top. """
+
+    def __init__(self, inverse: np.ndarray, premultiplied: np.ndarray):
+        self.inverse = inverse
+        self.premultiplied = premultiplied
+        self.shape = inverse.shape[:2]
+
+    @staticmethod
+    def from_coverage(
+        coverage: np.ndarray, colour: ColourTuple4
+    ) -> "TextSprite":
+        """ Creates a sprite from a single channel image of how much of each
+            pixel is covered by the text, from 0 to 255. """
+        height, width = coverage.shape
+
+        inverse = np.empty((height, width, 4), np.uint8)
+        inverse[:, :, :3] = (255 - coverage)[:, :, np.newaxis]
+        inverse[:, :, 3] = np.where(coverage > 0, 0, 255)
+
+        bgr = np.array(colour[:3], np.float32)
+        premultiplied = np.empty((height, width, 4), np.uint8)
+        premultiplied[:, :, :3] = np.rint(
+            coverage[:, :, np.newaxis] * bgr / 255
+        )
+        premultiplied[:, :, 3] = coverage
+        return TextSprite(inverse, premultiplied)
+
+
+class SpriteCache:
+    """ A bounded cache of TextSprites, which discards the least recently used
+        sprite once full.
+
+        hits and misses count lookups since the cache was created or last
+        cleared, and can be used to choose a suitable max_size. """
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._sprites = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self, key: Hashable, create: Callable[[], TextSprite]
+    ) -> TextSprite:
+        """ Returns the sprite stored under key, calling create to render and
+            store it if it isn't cached. """
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+
+        self.misses += 1
+        sprite = create()
+        self._sprites[key] = sprite
+        if len(self._sprites) > self.max_size:
+            self._sprites.popitem(last=False)
+        return sprite
+
+    def clear(self) -> None:
+        """ Removes all sprites and resets the hit and miss counters """
+        self._sprites.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._sprites)
+
+
+class BlendMode(Enum):
+    """ How a canvas is combined with the frames it is drawn over """
+
+    # Pixels with an alpha above Canvas.minimum_alpha replace the frame, and
+    # all others are ignored, including the faint anti-aliased edges of
+    # text, whose colour isn't added onto the frame. This is the cheapest
+    # mode.
+    mask = "mask"
+    # Pixels are blended with the frame in proportion to their alpha
+    alpha = "alpha"
+
 
 class Canvas:
     """ A writeable image, for creating overlay content """
 
     font = cv2.FONT_HERSHEY_SIMPLEX
 
-    def __init__(self, width: int, height: int):
+    # Rendered text, shared between all canvases
+    sprite_cache = SpriteCache()
+
+    # Alpha must be greater than this value for a pixel to be shown
+    minimum_alpha = 180
+
+    def __init__(
+        self, width: int, height: int, blend_mode: BlendMode = BlendMode.mask
+    ):
         """ Initialises to plain black and transparent """
         self.width = width
         self.height = height
-        self.img = None
-        self.clear()
+        self.img = np.zeros((self.height, self.width, 4), np.uint8)
+
+        # Regions which have been drawn to since the last clear
+        self._regions: List[Rect] = []
+        # Regions which have been drawn to or cleared since the cached
+        # blending data was last rebuilt
+        self._dirty_regions: List[Rect] = []
+        # Lists collecting the regions drawn to, see record_regions
+        self._region_recorders: List[List[Rect]] = []
+        # Incremented whenever the canvas contents change
+        self.version = 0
+
+        # Contents of self.img prepared for blending onto a frame, depending
+        # on the blend mode. In mask mode, this is the BGR image and the mask
+        # of visible pixels. In alpha mode, it is the BGR image premultiplied
+        # by alpha and the inverse alpha. These are only rebuilt where the
+        # canvas has changed since they were last used.
+        self._bgr = None
+        self._mask = None
+        self._premultiplied = None
+        self._inverse_alpha = None
+        self._blend_mode = None
+        self.blend_mode = blend_mode
+
+    @property
+    def blend_mode(self) -> BlendMode:
+        """ How the canvas is combined with the frames it is drawn over """
+        return self._blend_mode
+
+    @blend_mode.setter
+    def blend_mode(self, blend_mode: BlendMode) -> None:
+        if blend_mode is self._blend_mode:
+            return
+        self._blend_mode = blend_mode
+
+        shape = (self.height, self.width)
+        if blend_mode is BlendMode.mask:
+            self._bgr = np.zeros(shape + (3,), np.uint8)
+            self._mask = np.zeros(shape, np.uint8)
+            self._premultiplied = self._inverse_alpha = None
+        else:
+            self._premultiplied = np.zeros(shape + (3,), np.uint8)
+            self._inverse_alpha = np.full(shape + (3,), 255, np.uint8)
+            self._bgr = self._mask = None
+
+        self._dirty_regions = list(self._regions)
+        self.version += 1
+
+    @property
+    def regions(self) -> List[Rect]:
+        """ The non-overlapping regions of the canvas which may contain
+            content. Everything outside of these is transparent. """
+        return self._regions
+
+    def _mark_region(self, region: Rect) -> None:
+        """ Internal method - records that region has been drawn to, after
+            clipping it to the canvas bounds. """
+        left, top, right, bottom = region
+        region = (
+            max(left, 0),
+            max(top, 0),
+            min(right, self.width),
+            min(bottom, self.height),
+        )
+        _add_region(self._regions, region)
+        _add_region(self._dirty_regions, region)
+        for recorder in self._region_recorders:
+            _add_region(recorder, region)
+        self.version += 1
+
+    @contextmanager
+    def record_regions(self) -> Iterator[List[Rect]]:
+        """ Collects the regions drawn to within a `with` block.
+
+            eg. with canvas.record_regions() as regions: ... """
+        regions: List[Rect] = []
+        self._region_recorders.append(regions)
+        try:
+            yield regions
+        finally:
+            self._region_recorders.remove(regions)
 
     def clear(self) -> None:
         """ Sets the entire canvas contents to transparent black """
-        self.img = np.zeros((self.height, self.width, 4), np.uint8)
+        for left, top, right, bottom in self._regions:
+            self.img[top:bottom, left:right] = 0
+            _add_region(self._dirty_regions, (left, top, right, bottom))
+        if self._regions:
+            self.version += 1
+        self._regions = []
+
+    def clear_region(self, region: Rect) -> None:
+        """ Sets the contents of a region of the canvas to transparent black.
+
+            The region is still included in self.regions until the whole
+            canvas is cleared. """
+        left, top, right, bottom = region
+        if not any(_regions_overlap(region, other) for other in self._regions):
+            return
+        self.img[top:bottom, left:right] = 0
+        _add_region(self._dirty_regions, region)
+        self.version += 1
+
+    def mark_changed(self) -> None:
+        """ Flags that self.img has been modified outside of the draw methods,
+            so the cached blending data must be rebuilt. """
+        self._mark_region((0, 0, self.width, self.height))
 
     @staticmethod
     def _get_colour_tuple(colour: Colourlike) -> ColourTuple4:
@@ -62,15 +354,53 @@ class Canvas:
         thickness_increase = 0.5
         return round(size + thickness_increase)
 
+    @staticmethod
+    def _get_text_padding(height: int, thickness: int) -> int:
+        """ Gets the space needed around text of a given height and thickness
+            to fit its descenders and stroke width. """
+        return thickness + int(height * 0.5)
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _get_text_layout(
+        text: str, size: float, thickness: int
+    ) -> Tuple[int, int, int]:
+        """ Internal method - measures text, remembering the result for the
+            most recently used strings. """
+        (width, height), baseline = cv2.getTextSize(
+            text, Canvas.font, size, thickness
+        )
+        return width, height, baseline
+
+    @staticmethod
+    def get_text_layout(text: str, size: float) -> Tuple[int, int, int]:
+        """ Gets the width, height and baseline in pixels of some given text
+            at a given size.
+
+            The baseline is the distance that descenders extend below the
+            bottom of the text. Results are cached, so repeated calls for the
+            same text are cheap. """
+        thickness = Canvas._get_text_thickness(size)
+        return Canvas._get_text_layout(text, size, thickness)
+
     @staticmethod
     def get_text_dimensions(text, size: float) -> Tuple[int, int]:
         """ Gets the width and height in pixels of some given text at a given
             size. """
-        thickness = Canvas._get_text_thickness(size)
-        width_height_tuple, _ = cv2.getTextSize(
-            text, Canvas.font, size, thickness
-        )
-        return width_height_tuple
+        width, height, _ = Canvas.get_text_layout(text, size)
+        return width, height
+
+    @staticmethod
+    def get_text_origin(
+        text: str, coord: Coord, size: float, align: str = "left"
+    ) -> Coord:
+        """ Gets the bottom left corner of text drawn at coord with the given
+            alignment, as used by draw_text.
+
+            Components which always draw text of the same width can calculate
+            this once and draw with left alignment from then on. """
+        width, _ = Canvas.get_text_dimensions(text, size)
+        return _align_text(coord, width, align)
 
     def draw_text(
         self, text, coord, size=1.5, colour=Colour.black, align="left"
@@ -84,28 +414,71 @@ class Canvas:
             (the top left of the screen is the origin) """
         colour = Canvas._get_colour_tuple(colour)
         thickness = Canvas._get_text_thickness(size)
+        width, height = self.get_text_dimensions(text, size)
+        bottom_left = _align_text(coord, width, align)
 
-        if align != "left":
-            width, _ = self.get_text_dimensions(text, size)
-            if align == "right":
-                bottom_left = (coord[0] - width, coord[1])
-            elif align == "centre":
-                bottom_left = (coord[0] - width // 2, coord[1])
-            else:
-                raise ValueError(f"Invalid text alignment '{align}'")
-        else:
-            bottom_left = coord
+        padding = Canvas._get_text_padding(height, thickness)
+        sprite = Canvas.sprite_cache.get(
+            (text, size, colour, thickness),
+            lambda: Canvas._render_text_sprite(
+                text, size, colour, thickness, padding
+            ),
+        )
+        self.draw_sprite(
+            sprite,
+            (bottom_left[0] - padding, bottom_left[1] - height - padding),
+        )
 
+    @staticmethod
+    def _render_text_sprite(
+        text: str,
+        size: float,
+        colour: ColourTuple4,
+        thickness: int,
+        padding: int,
+    ) -> TextSprite:
+        """ Internal method - renders text to a new sprite, with padding
+            pixels of space around the text dimensions. """
+        width, height = Canvas.get_text_dimensions(text, size)
+        coverage = np.zeros(
+            (height + 2 * padding, width + 2 * padding), np.uint8
+        )
         cv2.putText(
-            self.img,
+            coverage,
             text,
-            bottom_left,
+            (padding, height + padding),
             Canvas.font,
             size,
-            colour,
+            255,
             thickness,
             cv2.LINE_AA,
         )
+        return TextSprite.from_coverage(coverage, colour)
+
+    def draw_sprite(self, sprite: TextSprite, top_left: Coord) -> None:
+        """ Draws a pre-rendered sprite to the canvas, with its top left
+            corner at top_left. Anti-aliased edges are blended with the
+            existing canvas contents in the same way as OpenCV's drawing
+            functions. """
+        sprite_height, sprite_width = sprite.shape
+        left, top = top_left
+        right, bottom = left + sprite_width, top + sprite_height
+
+        # Clip the sprite to the canvas
+        sprite_left, sprite_top = max(-left, 0), max(-top, 0)
+        left, top = max(left, 0), max(top, 0)
+        right, bottom = min(right, self.width), min(bottom, self.height)
+        if left >= right or top >= bottom:
+            return
+        sprite_slice = (
+            slice(sprite_top, sprite_top + bottom - top),
+            slice(sprite_left, sprite_left + right - left),
+        )
+
+        self._mark_region((left, top, right, bottom))
+        dest = self.img[top:bottom, left:right]
+        cv2.multiply(dest, sprite.inverse[sprite_slice], dest, 1 / 255)
+        cv2.add(dest, sprite.premultiplied[sprite_slice], dest)
 
     def draw_rect(
         self,
@@ -119,6 +492,14 @@ class Canvas:
         of the rectangle (the top left of the screen is the origin)
         """
         colour = Canvas._get_colour_tuple(colour)
+        self._mark_region(
+            (
+                min(top_left[0], bottom_right[0]),
+                min(top_left[1], bottom_right[1]),
+                max(top_left[0], bottom_right[0]) + 1,
+                max(top_left[1], bottom_right[1]) + 1,
+            )
+        )
         cv2.rectangle(
             self.img, top_left, bottom_right, colour, thickness=cv2.FILLED
         )
@@ -132,21 +513,364 @@ class Canvas:
         left of the screen is the origin).
         """
         colour = Canvas._get_colour_tuple(colour)
+        self._mark_region(
+            (
+                center[0] - radius - 1,
+                center[1] - radius - 1,
+                center[0] + radius + 2,
+                center[1] + radius + 2,
+            )
+        )
         cv2.circle(self.img, center, radius, colour, thickness=cv2.FILLED)
 
-    def copy_to(self, dest: np.ndarray) -> np.ndarray:
-        """Writes the contents of self.img over dest.
+    def _update_cache(self) -> None:
+        """ Internal method - rebuilds the cached blending data from self.img
+            wherever the canvas has changed since it was last built. """
+        for left, top, right, bottom in self._dirty_regions:
+            img = self.img[top:bottom, left:right]
+            if self._blend_mode is BlendMode.mask:
+                self._bgr[top:bottom, left:right] = img[:, :, :3]
+                np.greater(
+                    img[:, :, 3],
+                    Canvas.minimum_alpha,
+                    out=self._mask[top:bottom, left:right],
+                )
+            else:
+                bgr = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+                alpha = cv2.cvtColor(
+                    np.ascontiguousarray(img[:, :, 3]), cv2.COLOR_GRAY2BGR
+                )
+                cv2.multiply(
+                    bgr,
+                    alpha,
+                    self._premultiplied[top:bottom, left:right],
+                    1 / 255,
+                )
+                np.subtract(
+                    255, alpha, out=self._inverse_alpha[top:bottom, left:right]
+                )
+        self._dirty_regions = []
+
+    def blend_onto(self, dest: np.ndarray) -> None:
+        """Writes the contents of the canvas over dest, in place.
+
+        dest must be a BGR image of the same size as the canvas. In mask
+        mode, pixels with an alpha above Canvas.minimum_alpha replace those in
+        dest and all others are left untouched. In alpha mode, every pixel is
+        blended with dest in proportion to its alpha.
+
+        Only the regions of the canvas which have been drawn to are
+        processed, and no memory is allocated unless the canvas has changed
+        since the last blend.
+        """
+        self._update_cache()
+        for region in self._regions:
+            if self._blend_mode is BlendMode.mask:
+                _masked_copy(dest, self._bgr, self._mask, region)
+            else:
+                _alpha_blend(
+                    dest, self._premultiplied, self._inverse_alpha, region
+                )
+
+    def _blend_inverse_alpha_onto(self, inverse_alpha: np.ndarray) -> None:
+        """ Internal method - multiplies an inverse alpha image by the inverse
+            alpha of the canvas, as needed to stack the canvas in front of
+            another layer. """
+        self._update_cache()
+        for left, top, right, bottom in self._regions:
+            dest = inverse_alpha[top:bottom, left:right]
+            if self._blend_mode is BlendMode.mask:
+                dest[self._mask[top:bottom, left:right] != 0] = 0
+            else:
+                cv2.multiply(
+                    dest,
+                    self._inverse_alpha[top:bottom, left:right],
+                    dest,
+                    1 / 255,
+                )
+
+    def copy_to(
+        self, dest: np.ndarray, dst: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Returns a copy of dest with the canvas contents written over it.
 
-        This also accounts for transparency.
+        This also accounts for transparency. The copy is written into dst if
+        given, which must be the same shape as dest, and otherwise allocated.
 
-        Use this method to put the overlay contents over the video feed
+        Prefer blend_onto where dest may be modified, as it avoids copying
+        the frame.
         """
-        # Extract the alpha mask of the BGRA canvas, convert to BGR
-        blue, green, red, alpha = cv2.split(self.img)
-        minimum_alpha = 180  # alpha must be > this value to show a pixel
-        img = cv2.merge((blue, green, red))
-        _, mask = cv2.threshold(alpha, minimum_alpha, 255, cv2.THRESH_BINARY)
-
-        # Black-out the area behind the canvas on the destination
-        dest = cv2.bitwise_and(dest, dest, mask=cv2.bitwise_not(mask))
-        return cv2.add(dest, img)
+        if dst is None:
+            result = dest.copy()
+        else:
+            result = dst
+            np.copyto(result, dest)
+        self.blend_onto(result)
+        return result
+
+
+class FlattenedCanvas:
+    """ Several canvases merged into a single pre-blended layer.
+
+        Compositing a FlattenedCanvas onto a frame costs the same as a single
+        Canvas, no matter how many canvases were flattened into it. It must be
+        re-flattened whenever any of its canvases change.
+
+        The layer uses mask blending if all of its canvases do, and otherwise
+        alpha blending, which gives the same result as blending each canvas in
+        turn. """
+
+    def __init__(self, width: int, height: int):
+        """ Initialises to an empty, fully transparent layer """
+        self.width = width
+        self.height = height
+        self.blend_mode = BlendMode.mask
+        self._bgr = np.zeros((self.height, self.width, 3), np.uint8)
+        self._mask = np.zeros((self.height, self.width), np.uint8)
+        self._premultiplied = np.zeros((self.height, self.width, 3), np.uint8)
+        self._inverse_alpha = np.full(
+            (self.height, self.width, 3), 255, np.uint8
+        )
+        self._regions: List[Rect] = []
+        # The canvases last flattened, and their versions at the time
+        self._flattened_versions = []
+        # Incremented whenever the layer is rebuilt
+        self.version = 0
+
+    @property
+    def regions(self) -> List[Rect]:
+        """ The non-overlapping regions of the layer which may contain
+            content. See Canvas.regions. """
+        return self._regions
+
+    def flatten(self, canvases: Iterable[Canvas]) -> None:
+        """ Rebuilds the layer from canvases, ordered from back to front.
+
+            Does nothing if none of the canvases have changed since they
+            were last flattened. """
+        canvases = list(canvases)
+        versions = [(canvas, canvas.version) for canvas in canvases]
+        if len(versions) == len(self._flattened_versions) and all(
+            canvas is old_canvas and version == old_version
+            for (canvas, version), (old_canvas, old_version) in zip(
+                versions, self._flattened_versions
+            )
+        ):
+            return
+        self._flattened_versions = versions
+        self.version += 1
+
+        self._regions = []
+        for canvas in canvases:
+            for region in canvas.regions:
+                _add_region(self._regions, region)
+
+        if all(canvas.blend_mode is BlendMode.mask for canvas in canvases):
+            self.blend_mode = BlendMode.mask
+            for left, top, right, bottom in self._regions:
+                self._bgr[top:bottom, left:right] = 0
+                self._mask[top:bottom, left:right] = 0
+            for canvas in canvases:
+                canvas.blend_onto(self._bgr)
+                for left, top, right, bottom in canvas.regions:
+                    mask = self._mask[top:bottom, left:right]
+                    cv2.bitwise_or(
+                        mask, canvas._mask[top:bottom, left:right], mask
+                    )
+        else:
+            # Blending a canvas onto the premultiplied colour of the layers
+            # behind it gives the premultiplied colour of them combined
+            self.blend_mode = BlendMode.alpha
+            for left, top, right, bottom in self._regions:
+                self._premultiplied[top:bottom, left:right] = 0
+                self._inverse_alpha[top:bottom, left:right] = 255
+            for canvas in canvases:
+                canvas.blend_onto(self._premultiplied)
+                canvas._blend_inverse_alpha_onto(self._inverse_alpha)
+
+    def copy_layer_to(self, dest: "FlattenedCanvas") -> None:
+        """ Makes dest, which must be the same size, a copy of this layer.
+            Only the regions of either layer are copied, so this is cheap
+            enough to snapshot the layer for use on another thread. """
+        for left, top, right, bottom in dest._regions:
+            dest._bgr[top:bottom, left:right] = 0
+            dest._mask[top:bottom, left:right] = 0
+            dest._premultiplied[top:bottom, left:right] = 0
+            dest._inverse_alpha[top:bottom, left:right] = 255
+        for left, top, right, bottom in self._regions:
+            for src, dst in [
+                (self._bgr, dest._bgr),
+                (self._mask, dest._mask),
+                (self._premultiplied, dest._premultiplied),
+                (self._inverse_alpha, dest._inverse_alpha),
+            ]:
+                dst[top:bottom, left:right] = src[top:bottom, left:right]
+        dest._regions = list(self._regions)
+        dest.blend_mode = self.blend_mode
+        dest.version = self.version
+
+    def blend_onto(self, dest: np.ndarray) -> None:
+        """ Writes the flattened layer over dest, in place. See
+            Canvas.blend_onto. """
+        for region in self._regions:
+            if self.blend_mode is BlendMode.mask:
+                _masked_copy(dest, self._bgr, self._mask, region)
+            else:
+                _alpha_blend(
+                    dest, self._premultiplied, self._inverse_alpha, region
+                )
+
+
+class GlyphAtlas:
+    """ Pre-rendered characters of a single size and colour, for quickly
+        drawing numeric values.
+
+        Each value is assembled by copying the characters' slices of the atlas
+        side by side, then drawn onto the canvas in one step. Digits in the
+        Canvas font all have the same width, so values with a fixed format
+        always have the same width. """
+
+    characters = "0123456789.:-w"
+
+    def __init__(self, size: float, colour: Colourlike):
+        self.size = size
+        self.colour = Canvas._get_colour_tuple(colour)
+        thickness = Canvas._get_text_thickness(size)
+        _, self.height = Canvas.get_text_dimensions(self.characters, size)
+        self.padding = Canvas._get_text_padding(self.height, thickness)
+
+        # Each character's advance is the distance to the next character.
+        # At most sizes, no character is drawn outside of its advance, so
+        # characters can be placed side by side without overlapping.
+        self.advances = {}
+        for char in self.characters:
+            width, _ = Canvas.get_text_dimensions(char, size)
+            width_of_two, _ = Canvas.get_text_dimensions(char * 2, size)
+            self.advances[char] = width_of_two - width
+        # Text dimensions include a little extra width after the last
+        # character, which is needed to align values like Canvas.draw_text
+        width, _ = Canvas.get_text_dimensions("0", size)
+        self.trailing_width = width - self.advances["0"]
+
+        # Render every character into a single strip, recording where each
+        # character's slice starts
+        self.offsets = {}
+        strip_width = sum(self.advances.values())
+        coverage = np.zeros((self.height + 2 * self.padding, strip_width))
+        coverage = coverage.astype(np.uint8)
+        x = 0
+        for char in self.characters:
+            self.offsets[char] = x
+            cv2.putText(
+                coverage,
+                char,
+                (x, self.height + self.padding),
+                Canvas.font,
+                size,
+                255,
+                thickness,
+                cv2.LINE_AA,
+            )
+            x += self.advances[char]
+        self.strip = TextSprite.from_coverage(coverage, self.colour)
+
+        # At some sizes, characters are drawn a little past their advance,
+        # where they would be cut off in the atlas. Values are then drawn
+        # with Canvas.draw_text instead.
+        self.fits_advances = all(
+            self._fits_advance(char, thickness) for char in self.characters
+        )
+
+        # Space to assemble values in, grown when longer values are drawn
+        self._value = None
+        self._grow_value(8 * self.advances["0"] + 2 * self.padding)
+
+    def _grow_value(self, width: int) -> None:
+        """ Internal method - reallocates the space values are assembled in
+            to be width pixels wide. """
+        self._value = TextSprite.from_coverage(
+            np.zeros((self.strip.shape[0], width), np.uint8), self.colour
+        )
+
+    def _fits_advance(self, char: str, thickness: int) -> bool:
+        """ Internal method - checks whether a character is only drawn
+            within its advance. """
+        margin = self.height
+        advance = self.advances[char]
+        coverage = np.zeros(
+            (self.height + 2 * self.padding, advance + 2 * margin), np.uint8
+        )
+        cv2.putText(
+            coverage,
+            char,
+            (margin, self.height + self.padding),
+            Canvas.font,
+            self.size,
+            255,
+            thickness,
+            cv2.LINE_AA,
+        )
+        end = margin + advance
+        return not coverage[:, :margin].any() and not coverage[:, end:].any()
+
+    def can_draw(self, text: str) -> bool:
+        """ Checks whether text can be drawn from the atlas, which is when
+            every character is in it and is drawn within its advance """
+        return self.fits_advances and all(
+            char in self.advances for char in text
+        )
+
+    def get_text_width(self, text: str) -> int:
+        """ Gets the width in pixels of text drawn with this atlas, as
+            measured by Canvas.get_text_dimensions """
+        return sum(self.advances[char] for char in text) + self.trailing_width
+
+    def get_text_origin(
+        self, text: str, coord: Coord, align: str = "left"
+    ) -> Coord:
+        """ Gets the bottom left corner of text drawn at coord with the given
+            alignment. See Canvas.get_text_origin.
+
+            As all digits have the same width, the result can be calculated
+            once for a fixed format such as "00:00" and used for any value in
+            that format. """
+        return _align_text(coord, self.get_text_width(text), align)
+
+    def draw_text(
+        self, canvas: Canvas, text: str, coord: Coord, align: str = "left"
+    ) -> None:
+        """ Draws text to canvas, falling back to Canvas.draw_text if it
+            contains characters not in the atlas. Coord and align have the
+            same meaning as in Canvas.draw_text. """
+        if not self.can_draw(text):
+            canvas.draw_text(text, coord, self.size, self.colour, align)
+            return
+
+        width = self.get_text_width(text)
+        left, bottom = _align_text(coord, width, align)
+
+        sprite_width = width - self.trailing_width + 2 * self.padding
+        if sprite_width > self._value.shape[1]:
+            self._grow_value(sprite_width)
+        inverse = self._value.inverse
+        premultiplied = self._value.premultiplied
+
+        # The left padding is never written to, but the right padding may
+        # hold characters from a longer value drawn previously
+        x = self.padding
+        for char in text:
+            start = self.offsets[char]
+            end = start + self.advances[char]
+            next_x = x + self.advances[char]
+            inverse[:, x:next_x] = self.strip.inverse[:, start:end]
+            premultiplied[:, x:next_x] = self.strip.premultiplied[:, start:end]
+            x = next_x
+        inverse[:, x:sprite_width] = 255
+        premultiplied[:, x:sprite_width] = 0
+
+        canvas.draw_sprite(
+            TextSprite(
+                inverse[:, :sprite_width], premultiplied[:, :sprite_width]
+            ),
+            (left - self.padding, bottom - self.height - self.padding),
+        )
@@ -6,6 +6,7 @@ from .message import Message
 from .dashboard_message import DAShboardMessage
 from .das_disconnect_message import DASDisconnectMessage
 from .logging_indicator import LoggingIndicator
+from .retained_renderer import RetainedRenderer
 
 __all__ = [
     "Component",
@@ -18,4 +19,5 @@ __all__ = [
     "DAShboardMessage",
     "DASDisconnectMessage",
     "LoggingIndicator",
+    "RetainedRenderer",
 ]
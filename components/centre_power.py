@@ -1,4 +1,4 @@
-from canvas import Canvas, Colour
+from canvas import Canvas, Colour, GlyphAtlas
 from components import Component
 from data import Data
 
@@ -19,6 +19,9 @@ class CentrePower(Component):
 
     power_tolerance = 0.05
 
+    # The power is drawn from pre-rendered characters
+    power_atlas = GlyphAtlas(power_size, Colour.white)
+
     def __init__(self, screen_w: int, screen_h: int):
         self.power_coord = (
             screen_w // 2,
@@ -29,7 +32,9 @@ class CentrePower(Component):
     def draw_base(self, canvas: Canvas):
         pass
 
-    def draw_data(self, canvas: Canvas, data: Data):
+    def get_render_state(self, data: Data):
+        """ Returns the power text, recommended power text and the colour of
+            the recommended power text. """
         power = data["power"].get()
         rec_power = data["rec_power"].get()
 
@@ -53,13 +58,14 @@ class CentrePower(Component):
                 if power_diff <= CentrePower.power_tolerance
                 else Colour.red
             )
+        return power_str, rec_power_str, rec_power_colour
 
-        canvas.draw_text(
-            power_str,
-            self.power_coord,
-            CentrePower.power_size,
-            Colour.white,
-            "centre",
+    def draw_data(self, canvas: Canvas, data: Data):
+        power_str, rec_power_str, rec_power_colour = self.get_render_state(
+            data
+        )
+        CentrePower.power_atlas.draw_text(
+            canvas, power_str, self.power_coord, "centre"
         )
         canvas.draw_text(
             rec_power_str,
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import Hashable
 
 from canvas import Canvas
 from data import Data
@@ -14,3 +15,12 @@ class Component(ABC):
     def draw_data(self, canvas: Canvas, data: Data):
         """ Called at a regular interval to update dynamic data being displayed
             on the overlay from this component. """
+
+    def get_render_state(self, data: Data) -> Hashable:
+        """ Returns everything which determines what draw_data would draw for
+            the given data, such as the formatted values and their colours.
+
+            If the render state is unchanged since the last update, the
+            component does not need to be redrawn. Components which return
+            None are redrawn on every update. """
+        return None
@@ -25,6 +25,9 @@ class DASDisconnectMessage(Message):
         for the overlay is connected."""
         self.client = client
 
+    def get_render_state(self, data: Data):
+        return (self.client.is_connected(),)
+
     def draw_data(self, canvas: Canvas, data: Data) -> None:
         if not self.client.is_connected():
             self._display_message(
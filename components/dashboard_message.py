@@ -9,6 +9,11 @@ class DAShboardMessage(Message):
     Messages can only be received when the overlay is connected to the DAS.
     """
 
+    def get_render_state(self, data: Data):
+        if not data.has_message():
+            return (None,)
+        return (data.get_message(),)
+
     def draw_data(self, canvas: Canvas, data: Data) -> None:
         if not data.has_message():
             return
@@ -1,5 +1,5 @@
-from typing import Callable, Tuple
-from canvas import Canvas, Colour
+from typing import Callable, Dict, Tuple
+from canvas import Canvas, Colour, Coord, GlyphAtlas
 from components import Component
 from data import Data
 
@@ -19,6 +19,9 @@ class DataField(Component):
 
     height = title_height + data_height + spacing
 
+    # Values are drawn from pre-rendered characters, rendered once at startup
+    data_atlas = GlyphAtlas(data_size, Colour.white)
+
     def __init__(
         self,
         title: str,
@@ -38,25 +41,37 @@ class DataField(Component):
             coordinate[1] - DataField.spacing - DataField.data_height,
         )
         self.data_coord = (coordinate[0] + DataField.width, coordinate[1])
+        # Where each title is drawn from, so the right alignment is only
+        # worked out once per title
+        self.title_origins: Dict[str, Coord] = {}
+        self.get_title_origin()
+
+    def get_title_origin(self) -> Coord:
+        """ Gets the bottom left corner of the current title """
+        origin = self.title_origins.get(self.title)
+        if origin is None:
+            origin = Canvas.get_text_origin(
+                self.title, self.title_coord, DataField.title_size, "right"
+            )
+            self.title_origins[self.title] = origin
+        return origin
 
     def draw_base(self, canvas: Canvas):
         canvas.draw_text(
             self.title,
-            self.title_coord,
+            self.get_title_origin(),
             DataField.title_size,
             Colour.white,
-            "right",
         )
 
+    def get_render_state(self, data: Data):
+        return (self.title, self.value_func(data))
+
     def draw_data(self, canvas: Canvas, data: Data):
         if not self.is_title_static:
             DataField.draw_base(self, canvas)
-        canvas.draw_text(
-            self.value_func(data),
-            self.data_coord,
-            DataField.data_size,
-            Colour.white,
-            "right",
+        DataField.data_atlas.draw_text(
+            canvas, self.value_func(data), self.data_coord, "right"
         )
 
 
@@ -64,6 +79,13 @@ class SpeedField(DataField):
     """ A specialised version of DataField which prefers to display GPS velocity,
         but falls back to reed or ANT+ speed if GPS velocity is unavailable """
 
+    titles = {
+        "gps_speed": "GPS KPH",
+        "ant_speed": "ANT+ KPH",
+        "reed_velocity": "REED KPH",
+        None: "KPH",
+    }
+
     def get_data_source(data: Data) -> str or None:
         priority_list = ["gps_speed", "reed_velocity", "ant_speed"]
         for source in priority_list:
@@ -83,15 +105,13 @@ class SpeedField(DataField):
     def draw_base(self, canvas: Canvas):
         pass
 
+    def get_render_state(self, data: Data):
+        source = SpeedField.get_data_source(data)
+        return (SpeedField.titles[source], self.value_func(data))
+
     def draw_data(self, canvas: Canvas, data: Data):
         source = SpeedField.get_data_source(data)
-        titles = {
-            "gps_speed": "GPS KPH",
-            "ant_speed": "ANT+ KPH",
-            "reed_velocity": "REED KPH",
-            None: "KPH",
-        }
-        self.title = titles[source]
+        self.title = SpeedField.titles[source]
         super().draw_data(canvas, data)
 
 
@@ -99,6 +119,11 @@ class VoltageField(DataField):
     """ A specialised version of DataField which displays the voltage adjusting
         for it's values whether the battery is low, medium or high."""
 
+    voltage_atlases = {
+        colour: GlyphAtlas(DataField.data_size * 0.7, colour)
+        for colour in [Colour.white, Colour.yellow, Colour.red]
+    }
+
     def __init__(
         self,
         title: str,
@@ -111,20 +136,29 @@ class VoltageField(DataField):
     def draw_base(self, canvas: Canvas):
         return super().draw_base(canvas)
 
-    def draw_data(self, canvas: Canvas, data: Data):
-        if not self.is_title_static:
-            DataField.draw_base(self, canvas)
-        voltage_value = self.value_func(data)
+    @staticmethod
+    def get_colour(voltage_value: str) -> Colour:
+        """ Gets the colour to display a formatted voltage value in. """
         if voltage_value == "--" or float(voltage_value) >= 7.3:
-            colour = Colour.white
+            return Colour.white
         elif float(voltage_value) >= 7.0:
-            colour = Colour.yellow
+            return Colour.yellow
         else:
-            colour = Colour.red
-        canvas.draw_text(
+            return Colour.red
+
+    def get_render_state(self, data: Data):
+        voltage_value = self.value_func(data)
+        return (
+            self.title,
             voltage_value,
-            self.data_coord,
-            DataField.data_size * 0.7,
-            colour,
-            "right",
+            VoltageField.get_colour(voltage_value),
+        )
+
+    def draw_data(self, canvas: Canvas, data: Data):
+        if not self.is_title_static:
+            DataField.draw_base(self, canvas)
+        voltage_value = self.value_func(data)
+        colour = VoltageField.get_colour(voltage_value)
+        VoltageField.voltage_atlases[colour].draw_text(
+            canvas, voltage_value, self.data_coord, "right"
         )
@@ -15,6 +15,9 @@ class LoggingIndicator(Component):
     def draw_base(self, canvas: Canvas):
         pass
 
+    def get_render_state(self, data: Data):
+        return (data.is_logging(),)
+
     def draw_data(self, canvas: Canvas, data: Data):
         if data.is_logging():
             canvas.draw_circle(
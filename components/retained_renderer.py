@@ -0,0 +1,72 @@
+from typing import Hashable, List, Set
+
+from canvas import Canvas, Rect, _regions_overlap
+from components import Component
+from data import Data
+
+
+def _overlaps(regions: List[Rect], others: List[Rect]) -> bool:
+    """ Checks whether any region in regions shares pixels with any region in
+        others. """
+    return any(
+        _regions_overlap(region, other)
+        for region in regions
+        for other in others
+    )
+
+
+class RetainedRenderer:
+    """ Draws the data of a list of components onto a canvas, only redrawing
+        the components whose render state has changed since the last update.
+
+        The canvas must not be drawn on or cleared by anything else. Each
+        component is cleared by erasing the regions it drew to, so any other
+        components which overlap these regions are redrawn too. """
+
+    def __init__(self, components: List[Component]):
+        self.components = components
+        # Render state and drawn regions of each component, by index
+        self._states: List[Hashable] = [None] * len(components)
+        self._regions: List[List[Rect]] = [[] for _ in components]
+        self._drawn = False
+
+    def draw_data(self, canvas: Canvas, data: Data) -> bool:
+        """ Updates the canvas with the latest data.
+
+            Returns True if anything was redrawn, or False if the canvas was
+            left unchanged. """
+        states = [
+            component.get_render_state(data) for component in self.components
+        ]
+        to_redraw: Set[int] = {
+            index
+            for index, state in enumerate(states)
+            if not self._drawn or state is None or state != self._states[index]
+        }
+        self._states = states
+        self._drawn = True
+        if not to_redraw:
+            return False
+
+        # Clearing a component may erase part of one it overlaps, which must
+        # then be cleared and redrawn as well
+        cleared: Set[int] = set()
+        while to_redraw - cleared:
+            for index in to_redraw - cleared:
+                for region in self._regions[index]:
+                    canvas.clear_region(region)
+                cleared.add(index)
+            for index, regions in enumerate(self._regions):
+                if index not in to_redraw and any(
+                    _overlaps(regions, self._regions[other])
+                    for other in cleared
+                ):
+                    to_redraw.add(index)
+
+        # Redraw in the original order, so overlapping components stay
+        # stacked in the same way
+        for index in sorted(to_redraw):
+            with canvas.record_regions() as regions:
+                self.components[index].draw_data(canvas, data)
+            self._regions[index] = regions
+        return True
@@ -23,3 +23,7 @@ class TransparentRectangle(Component):
 
     def draw_data(self, canvas: Canvas, data: Data):
         pass
+
+    def get_render_state(self, data: Data):
+        # Nothing is drawn on the data layer
+        return ()
@@ -12,12 +12,59 @@ CONFIG_FILE = "configs.json"
 ACTIVE_OVERLAY_KEY = "activeOverlay"
 OVERLAY_FILE_PATTERN = "overlay_*.py"
 CURRENT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+# Directory configs.json is kept in, which tests point elsewhere
+CONFIG_DIRECTORY = CURRENT_DIRECTORY
 
 ROTATION_KEY = "rotation"
+# Target frame rate of the video feed and overlay, in frames per second
+FRAMERATE_KEY = "framerate"
+# Region of the rotated video to show, as [left, top, right, bottom] fractions
+CROP_KEY = "crop"
+# Camera calibration to correct lens distortion with, containing
+# "cameraMatrix" and "distortionCoefficients" from cv2.calibrateCamera
+LENS_CORRECTION_KEY = "lensCorrection"
+# Whether to check that no frames are allocated while processing each frame
+DEBUG_ALLOCATIONS_KEY = "debugAllocations"
+# Number of frames which may wait to be encoded when recording with OpenCV
+RECORDING_QUEUE_SIZE_KEY = "recordingQueueSize"
+# What to do when the recording queue is full, "dropOldest" or "block"
+RECORDING_QUEUE_POLICY_KEY = "recordingQueuePolicy"
+# Length of each file recordings are split into, as "seconds" and/or
+# "megabytes". Recordings aren't split if neither is set.
+RECORDING_SEGMENTS_KEY = "recordingSegments"
+# Options for how recordings are written on the Pi: "bufferMegabytes",
+# "buffers", "maxBuffers", "blockSeconds", "fsync" ("never", "interval" or
+# "close") and "fsyncInterval"
+RECORDING_SINK_KEY = "recordingSink"
+# Options for monitoring free disk space: "interval" (seconds between
+# checks), "minFreeMegabytes" and "action" ("none", "stop" or "prune") to take
+# when there is less free space than that
+DISK_MONITOR_KEY = "diskMonitor"
+# Options for recording the video with the overlay burnt in: "enabled",
+# and the "width", "height" and "fps" of the recording
+BURN_IN_KEY = "burnIn"
+# Options for recording the bike data for each frame alongside recordings:
+# "enabled"
+TELEMETRY_KEY = "telemetry"
+# Options for playing a video file as the camera feed: "pacing" ("realtime",
+# "fixed" or "fast"), "fps" (with fixed pacing), "loop" and "decodeAhead"
+VIDEO_FILE_KEY = "videoFile"
+# Options for the headless backend: "output" ("discard", "files" or "ring"),
+# "saveInterval", "outputFolder" and "ringSize"
+HEADLESS_KEY = "headless"
+# Options for streaming the composited video over HTTP: "enabled", "port",
+# "maxFps", "quality", "workers" and "host", the address to listen on
+MJPEG_STREAM_KEY = "mjpegStream"
+# Options for keeping the last few seconds of video in memory, so recordings
+# include them: "seconds" (0 to disable), "maxMegabytes" and "quality"
+PRE_ROLL_KEY = "preRoll"
+# Maps each overlay layer ("base", "data" or "message") to its blend mode
+BLEND_MODES_KEY = "blendModes"
 
 DEFAULT_BROKER_IP = "192.168.100.100"
 DEFAULT_BIKE = "V3"
 DEFAULT_VIEWPORT_SIZE = [1024, 600]
+DEFAULT_FRAMERATE = 60
 
 BATTERY_PUBLISH_INTERVAL = 5 * 60  # seconds
 
@@ -32,7 +79,16 @@ def get_overlays(directory=CURRENT_DIRECTORY):
     return overlays
 
 
-def set_overlay(new_overlays, directory=CURRENT_DIRECTORY):
+def get_config_directories(directory=None):
+    """Get the directories of configs.json and the overlays, which are both
+    directory if given. Otherwise, configs.json is in CONFIG_DIRECTORY and
+    the overlays are in CURRENT_DIRECTORY."""
+    if directory is None:
+        return CONFIG_DIRECTORY, CURRENT_DIRECTORY
+    return directory, directory
+
+
+def set_overlay(new_overlays, directory=None):
     """Set current camera overlay"""
     current_device = os.getenv("MHP_CAMERA")
     new_overlay = new_overlays[current_device]
@@ -42,33 +98,36 @@ def set_overlay(new_overlays, directory=CURRENT_DIRECTORY):
         configs.pop("device")
     configs[ACTIVE_OVERLAY_KEY] = new_overlay
 
-    with open(os.path.join(directory, CONFIG_FILE), "w") as file:
+    config_directory, _ = get_config_directories(directory)
+    with open(os.path.join(config_directory, CONFIG_FILE), "w") as file:
         json.dump(configs, file, indent=2, sort_keys=True)
 
 
-def set_rotation(rotation, directory=CURRENT_DIRECTORY):
+def set_rotation(rotation, directory=None):
     """Set rotation for device"""
     configs = read_configs(directory)
     if "device" in configs:
         configs.pop("device")
     configs[ROTATION_KEY] = rotation
 
-    with open(os.path.join(directory, CONFIG_FILE), "w") as file:
+    config_directory, _ = get_config_directories(directory)
+    with open(os.path.join(config_directory, CONFIG_FILE), "w") as file:
         json.dump(configs, file, indent=2, sort_keys=True)
 
 
-def read_configs(directory=CURRENT_DIRECTORY):
+def read_configs(directory=None):
     """Read config.json file"""
-    configs_file = os.path.join(directory, CONFIG_FILE)
+    config_directory, overlay_directory = get_config_directories(directory)
+    configs_file = os.path.join(config_directory, CONFIG_FILE)
 
     if not os.path.isfile(configs_file):
-        create_default_configs(directory)
+        create_default_configs(config_directory, overlay_directory)
 
     with open(configs_file) as file:
         configs = json.load(file)
 
     if ACTIVE_OVERLAY_KEY not in configs:
-        create_default_configs(directory)
+        create_default_configs(config_directory, overlay_directory)
         with open(configs_file) as file:
             configs = json.load(file)
 
@@ -117,9 +176,12 @@ def read_configs(directory=CURRENT_DIRECTORY):
     return configs
 
 
-def create_default_configs(directory):
-    """Create a default config file"""
-    random_overlay = random.choice(get_overlays(directory))
+def create_default_configs(directory, overlay_directory=None):
+    """Create a default config file in directory, with one of the overlays in
+    overlay_directory, which is directory by default"""
+    if overlay_directory is None:
+        overlay_directory = directory
+    random_overlay = random.choice(get_overlays(overlay_directory))
     with open(os.path.join(directory, CONFIG_FILE), "w") as file:
         json.dump(
             {ACTIVE_OVERLAY_KEY: random_overlay},
@@ -130,14 +192,17 @@ def create_default_configs(directory):
     return random_overlay
 
 
-def get_active_overlay(directory=CURRENT_DIRECTORY):
-    """Get the current active overlay"""
+def get_active_overlay(directory=None):
+    """Get the path of the current active overlay"""
+    config_directory, overlay_directory = get_config_directories(directory)
     configs = read_configs(directory)
     try:
         active_overlay = configs[ACTIVE_OVERLAY_KEY]
     except KeyError:
-        active_overlay = create_default_configs(directory)
-    return os.path.join(directory, active_overlay)
+        active_overlay = create_default_configs(
+            config_directory, overlay_directory
+        )
+    return os.path.join(overlay_directory, active_overlay)
 
 
 if __name__ == "__main__":
@@ -10,13 +10,21 @@ from mhp.topics import Camera, Topic
 
 from backend import BackendFactory
 from camera_error_handler import CameraErrorHandler
-from canvas import Canvas
-from config import read_configs
+from canvas import BlendMode, Canvas
+from config import BLEND_MODES_KEY, read_configs
 from data import Data, DataFactory
 
 
 class Overlay(ABC):
-    def __init__(self, bike, width=None, height=None, bg: str = None):
+    def __init__(
+        self,
+        bike,
+        width=None,
+        height=None,
+        bg: str = None,
+        backend: str = None,
+        video: str = None,
+    ):
 
         configs = read_configs()
 
@@ -26,17 +34,35 @@ class Overlay(ABC):
         else:
             self.width, self.height = configs["viewport_size"]
 
-        # Canvas set up
-        self.base_canvas = Canvas(self.width, self.height)
-        self.data_canvas = Canvas(self.width, self.height)
-        self.message_canvas = Canvas(self.width, self.height)
+        # Canvas set up. Each layer can be set to mask or alpha blending in
+        # the configs file.
+        blend_modes = configs.get(BLEND_MODES_KEY, {})
+        self.base_canvas = Canvas(
+            self.width,
+            self.height,
+            BlendMode(blend_modes.get("base", BlendMode.mask.value)),
+        )
+        self.data_canvas = Canvas(
+            self.width,
+            self.height,
+            BlendMode(blend_modes.get("data", BlendMode.mask.value)),
+        )
+        self.message_canvas = Canvas(
+            self.width,
+            self.height,
+            BlendMode(blend_modes.get("message", BlendMode.mask.value)),
+        )
 
         # Raspicam Backend set up
         self.backend = None
-        self.bg_path = None
-        if bg is not None:
+        self.bg_path = bg
+        self.video_path = video
+        if backend is not None:
+            self.backend_name = backend
+        elif video is not None:
+            self.backend_name = "video_file"
+        elif bg is not None:
             self.backend_name = "opencv_static_image"
-            self.bg_path = bg
         # Raspberry Pis run ARM, PCs run x86_64
         elif machine() in ["armv7l", "armv6l"]:
             self.backend_name = "picamera"
@@ -97,9 +123,18 @@ class Overlay(ABC):
                 self.publish_video_status,
                 self.exception_handler,
             ) as self.backend:
+                self.backend.set_data(self.data)
 
-                if self.backend_name == "opencv_static_image":
+                if self.bg_path is not None and self.backend_name in [
+                    "opencv_static_image",
+                    "headless",
+                ]:
                     self.backend.set_background(self.bg_path)
+                if (
+                    self.video_path is not None
+                    and self.backend_name == "video_file"
+                ):
+                    self.backend.set_video(self.video_path)
                 self.backend.on_base_canvas_updated(self.base_canvas)
 
                 # mqtt loop (does not block)
@@ -256,4 +291,27 @@ class Overlay(ABC):
             help="Replaces the video feed with a static background image at a\
                  given location",
         )
+        parser.add_argument(
+            "--backend",
+            action="store",
+            type=str,
+            choices=[
+                "picamera",
+                "opencv",
+                "opencv_static_image",
+                "headless",
+                "video_file",
+            ],
+            help="Backend to get and display video with. Chosen based on the\
+                 platform, --bg and --video by default. The headless backend\
+                 displays nothing, and prints the frame rate for benchmarking",
+        )
+        parser.add_argument(
+            "--video",
+            action="store",
+            type=str,
+            help="Replaces the video feed with a recorded video file (eg.\
+                 .h264 or .mp4) at a given location, which is played as set\
+                 by videoFile in configs.json",
+        )
         return parser.parse_args()
@@ -3,8 +3,10 @@ from canvas import Colour
 
 
 class OverlayAllStats(Overlay):
-    def __init__(self, bike=None, bg=None):
-        super(OverlayAllStats, self).__init__(bike, bg=bg)
+    def __init__(self, bike=None, bg=None, backend=None, video=None):
+        super(OverlayAllStats, self).__init__(
+            bike, bg=bg, backend=backend, video=video
+        )
         self.text_height = 50
         self.speed_height = 70
         self.message_received_time = 0
@@ -136,5 +138,5 @@ if __name__ == "__main__":
     args = Overlay.get_overlay_args(
         "Overlay displaying all (or just many) statistics"
     )
-    my_overlay = OverlayAllStats(args.bike, args.bg)
+    my_overlay = OverlayAllStats(args.bike, args.bg, args.backend, args.video)
     my_overlay.connect(ip=args.host)
@@ -14,8 +14,10 @@ class OverlayErrorTest(OverlayNew):
     To exit the script, press CTRL+C.
     """
 
-    def __init__(self, bike=DEFAULT_TEST_BIKE, bg=None):
-        super().__init__(bike, bg)
+    def __init__(
+        self, bike=DEFAULT_TEST_BIKE, bg=None, backend=None, video=None
+    ):
+        super().__init__(bike, bg=bg, backend=backend, video=video)
 
     def on_connect(self, client, userdata, flags, rc):
         """ Raises an exception which should be caught by _on_connect. """
@@ -25,5 +27,5 @@ class OverlayErrorTest(OverlayNew):
 
 if __name__ == "__main__":
     args = OverlayErrorTest.get_overlay_args("Test Overlay")
-    my_overlay = OverlayErrorTest(args.bike, args.bg)
+    my_overlay = OverlayErrorTest(args.bike, args.bg, args.backend, args.video)
     my_overlay.connect(ip=args.host)
@@ -6,14 +6,15 @@ from components import (
     CentrePower,
     DAShboardMessage,
     DASDisconnectMessage,
+    RetainedRenderer,
 )
 from components.logging_indicator import LoggingIndicator
 from overlay import Overlay
 
 
 class OverlayNew(Overlay):
-    def __init__(self, bike=None, bg=None):
-        super().__init__(bike, bg=bg)
+    def __init__(self, bike=None, bg=None, backend=None, video=None):
+        super().__init__(bike, bg=bg, backend=backend, video=video)
 
         # Generate coordinates for each of the data fields in the
         # bottom corners.
@@ -91,19 +92,17 @@ class OverlayNew(Overlay):
                 (self.width - spacing, top_right_rect[1][1] + spacing)
             ),
         ]
+        self.renderer = RetainedRenderer(self.components)
 
     def _draw_base_layer(self):
         for component in self.components:
             component.draw_base(self.base_canvas)
 
     def _update_data_layer(self):
-        self.data_canvas.clear()
-
-        for component in self.components:
-            component.draw_data(self.data_canvas, self.data)
+        self.renderer.draw_data(self.data_canvas, self.data)
 
 
 if __name__ == "__main__":
     args = Overlay.get_overlay_args("An empty, example overlay")
-    my_overlay = OverlayNew(args.bike, args.bg)
+    my_overlay = OverlayNew(args.bike, args.bg, args.backend, args.video)
     my_overlay.connect(ip=args.host)
@@ -0,0 +1,481 @@
+""" Renders an overlay over a recording after the race, from the telemetry
+    recorded alongside it.
+
+    The video is split into chunks which are rendered by a pool of worker
+    processes, each with its own instance of the overlay, and the rendered
+    chunks are then joined into one video. If ffmpeg is installed, raw
+    video is copied into a container which can seek to each chunk, and the
+    chunks are joined without being encoded again. """
+import argparse
+import importlib
+import inspect
+import os
+import shutil
+import subprocess
+from multiprocessing import Pool
+from tempfile import TemporaryDirectory
+from time import perf_counter, time
+from typing import (
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+)
+
+import cv2
+import numpy as np
+
+from backend.telemetry import TelemetryReader, telemetry_path
+from backend.video_recorder import VideoRecorder
+from canvas import FlattenedCanvas
+from config import ACTIVE_OVERLAY_KEY, read_configs
+from overlay import Overlay
+
+# Extensions of raw video streams, see is_raw_video
+RAW_VIDEO_EXTENSIONS = (".h264", ".264")
+
+
+class ChunkResult(NamedTuple):
+    """ What rendering a chunk of the video took """
+
+    index: int
+    path: str
+    # Process ID of the worker which rendered the chunk
+    worker: int
+    frames: int
+    seconds: float
+
+
+def find_overlay(overlay_file: str) -> Type[Overlay]:
+    """ Finds the overlay class defined in an overlay_*.py file """
+    module_name = os.path.splitext(os.path.basename(overlay_file))[0]
+    module = importlib.import_module(module_name)
+    for _, cls in inspect.getmembers(module, inspect.isclass):
+        if issubclass(cls, Overlay) and cls.__module__ == module_name:
+            return cls
+    raise ValueError(f"{overlay_file} has no overlay")
+
+
+def is_raw_video(path: str) -> bool:
+    """ Whether a video is a raw stream without a container, eg. the Pi's
+        H.264 recordings, which can't be seeked through by frame """
+    return os.path.splitext(path)[1].lower() in RAW_VIDEO_EXTENSIONS
+
+
+def count_frames(path: str, telemetry_file: Optional[str] = None) -> int:
+    """ Counts the frames of a video from its container. Raw video doesn't
+        store how many frames it has, so they are counted from the telemetry
+        recorded with it, which has a record for each frame, or by reading
+        through the video if no telemetry is given. """
+    if is_raw_video(path) and telemetry_file is not None:
+        with TelemetryReader(telemetry_file) as telemetry:
+            return len(telemetry)
+    video = cv2.VideoCapture(path)
+    count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+    if count <= 0:
+        count = 0
+        while video.grab():
+            count += 1
+    video.release()
+    return count
+
+
+def split_frames(frame_count: int, chunks: int) -> List[Tuple[int, int]]:
+    """ Splits the frames into up to `chunks` ranges of [start, end) of
+        nearly equal length """
+    chunks = max(1, min(chunks, frame_count))
+    bounds = [frame_count * i // chunks for i in range(chunks + 1)]
+    return list(zip(bounds, bounds[1:]))
+
+
+class ChunkRenderer:
+    """ Renders an overlay over chunks of a video, in a worker process.
+
+        For each frame, the overlay's data is loaded from the frame's
+        telemetry record. Like on the bike, the data layer is only redrawn
+        every overlay.data_update_interval seconds. These updates are at
+        fixed times from the start of the telemetry, so chunks render the
+        same as if the whole video was rendered at once. The overlay's time
+        shows the time since the start of the telemetry.
+
+        Frames are numbered from the start of the video file, which for
+        later segments of a recording is the telemetry's first frame. """
+
+    def __init__(self, overlay_file: str, bike: str, telemetry_file: str):
+        self.overlay = find_overlay(overlay_file)(bike)
+        self.data = self.overlay.data
+        self.telemetry = TelemetryReader(telemetry_file)
+        # Time of the first frame with data, as frames from the pre-roll
+        # have none
+        self.start_timestamp = None
+        for frame_index in range(len(self.telemetry)):
+            timestamp = self._get_record(frame_index)[0]
+            if timestamp is not None:
+                self.start_timestamp = timestamp
+                break
+
+        self.layer = FlattenedCanvas(self.overlay.width, self.overlay.height)
+        self.overlay.draw_base_layer()
+        # Data update the data layer was last drawn for, which is None for
+        # frames without telemetry
+        self._update: Optional[int] = -1
+        # Frames are scaled into this if they aren't the overlay's size
+        self.frame = np.empty(
+            (self.overlay.height, self.overlay.width, 3), np.uint8
+        )
+
+    def render(
+        self,
+        index: int,
+        video_path: str,
+        start: int,
+        end: int,
+        output_path: str,
+        framerate: float,
+    ) -> ChunkResult:
+        """ Renders frames [start, end) of the video to output_path """
+        start_time = perf_counter()
+        writer = cv2.VideoWriter(
+            output_path,
+            cv2.VideoWriter_fourcc(*VideoRecorder.fourcc),
+            framerate,
+            (self.overlay.width, self.overlay.height),
+        )
+        frames = 0
+        try:
+            for frame in self.render_frames(video_path, start, end):
+                writer.write(frame)
+                frames += 1
+        finally:
+            writer.release()
+        seconds = perf_counter() - start_time
+        return ChunkResult(index, output_path, os.getpid(), frames, seconds)
+
+    def render_frames(
+        self, video_path: str, start: int, end: int
+    ) -> Iterator[np.ndarray]:
+        """ Yields frames [start, end) of the video with the overlay on them.
+            Each frame is only valid until the next is yielded. """
+        self._update = -1
+        size = (self.overlay.width, self.overlay.height)
+        video = self._open_at(video_path, start)
+        try:
+            for frame_index in range(start, end):
+                success, frame = video.read()
+                if not success:
+                    break
+                self._load_data(frame_index)
+                if frame.shape[:2] != self.frame.shape[:2]:
+                    frame = cv2.resize(frame, size, self.frame)
+                self.layer.blend_onto(frame)
+                yield frame
+        finally:
+            video.release()
+
+    @staticmethod
+    def _open_at(video_path: str, start: int) -> cv2.VideoCapture:
+        """ Opens the video, ready to read the frame at start. Videos which
+            can't seek to it exactly are read through from the start. """
+        video = cv2.VideoCapture(video_path)
+        if start == 0:
+            return video
+        video.set(cv2.CAP_PROP_POS_FRAMES, start)
+        if int(video.get(cv2.CAP_PROP_POS_FRAMES)) != start:
+            video.release()
+            video = cv2.VideoCapture(video_path)
+            for _ in range(start):
+                video.grab()
+        return video
+
+    def _get_record(self, frame_index: int) -> Tuple[Optional[float], dict]:
+        """ Returns the telemetry of a frame of the video file """
+        return self.telemetry[self.telemetry.first_frame + frame_index]
+
+    def _get_update(self, frame_index: int) -> Tuple[Optional[int], dict]:
+        """ Returns which data update a frame is in, and its telemetry """
+        try:
+            timestamp, fields = self._get_record(frame_index)
+        except IndexError:
+            return None, {}
+        if timestamp is None:
+            return None, {}
+        elapsed = timestamp - self.start_timestamp
+        return int(elapsed // self.overlay.data_update_interval), fields
+
+    def _load_data(self, frame_index: int) -> None:
+        """ Redraws the overlay's data layer if an update is due by the
+            frame's time """
+        update, fields = self._get_update(frame_index)
+        if update == self._update:
+            return
+        self._update = update
+
+        # The data layer shows the data from the first frame of the update,
+        # which may be in the chunk before this one
+        if update is not None:
+            while frame_index > 0:
+                previous, previous_fields = self._get_update(frame_index - 1)
+                if previous != update:
+                    break
+                frame_index -= 1
+                fields = previous_fields
+            interval = self.overlay.data_update_interval
+            self.overlay.start_time = time() - update * interval
+
+        values = dict(self.data.data)
+        values["logging"] = self.data.logging
+        values["message"] = self.data.message
+        for field, value in values.items():
+            if fields.get(field) is None:
+                value.invalidate()
+            else:
+                value.update(fields[field])
+        self.overlay.update_data_layer()
+        self.layer.flatten(
+            [
+                self.overlay.base_canvas,
+                self.overlay.data_canvas,
+                self.overlay.message_canvas,
+            ]
+        )
+
+
+# The renderer of each worker process
+_renderer: Optional[ChunkRenderer] = None
+
+
+def _start_worker(overlay_file: str, bike: str, telemetry_file: str) -> None:
+    global _renderer
+    _renderer = ChunkRenderer(overlay_file, bike, telemetry_file)
+
+
+def _render_chunk(args: tuple) -> ChunkResult:
+    return _renderer.render(*args)
+
+
+def render_recording(
+    video_path: str,
+    output_path: str,
+    overlay_file: str,
+    bike: str,
+    telemetry_file: Optional[str] = None,
+    workers: Optional[int] = None,
+    chunks_per_worker: int = 4,
+    framerate: Optional[float] = None,
+    report: Callable[[str], None] = print,
+) -> Dict[int, Tuple[int, float]]:
+    """ Renders the overlay over the video into output_path, an .avi file.
+
+        Returns the frames rendered by each worker process and the seconds it
+        spent rendering them, keyed by process ID. """
+    if telemetry_file is None:
+        telemetry_file = telemetry_path(video_path)
+    if not os.path.isfile(telemetry_file):
+        raise FileNotFoundError(f"No telemetry at {telemetry_file}")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if framerate is None:
+        video = cv2.VideoCapture(video_path)
+        framerate = video.get(cv2.CAP_PROP_FPS) or 30
+        video.release()
+
+    frame_count = count_frames(video_path, telemetry_file)
+    chunk_count = workers * chunks_per_worker
+    worker_stats: Dict[int, Tuple[int, float]] = {}
+
+    output_folder = os.path.dirname(os.path.abspath(output_path))
+    with TemporaryDirectory(dir=output_folder) as chunk_folder:
+        # Chunks of raw video could only be reached by decoding every frame
+        # before them, so it is copied into a container which can seek
+        if is_raw_video(video_path):
+            if shutil.which("ffmpeg") is not None:
+                video_path = _remux(video_path, chunk_folder, framerate)
+            else:
+                report(
+                    "ffmpeg isn't installed, so the raw video is rendered"
+                    " in one chunk"
+                )
+                chunk_count = 1
+
+        ranges = split_frames(frame_count, chunk_count)
+        results: List[Optional[ChunkResult]] = [None] * len(ranges)
+        chunks = [
+            (
+                index,
+                video_path,
+                start,
+                end,
+                os.path.join(chunk_folder, f"chunk_{index}.avi"),
+                framerate,
+            )
+            for index, (start, end) in enumerate(ranges)
+        ]
+        with Pool(
+            workers, _start_worker, (overlay_file, bike, telemetry_file)
+        ) as pool:
+            for result in pool.imap_unordered(_render_chunk, chunks):
+                results[result.index] = result
+                frames, seconds = worker_stats.get(result.worker, (0, 0.0))
+                worker_stats[result.worker] = (
+                    frames + result.frames,
+                    seconds + result.seconds,
+                )
+                report(
+                    f"Chunk {result.index + 1}/{len(chunks)}: "
+                    f"{result.frames} frames at "
+                    f"{result.frames / result.seconds:.1f} fps "
+                    f"(worker {result.worker})"
+                )
+
+        _join_chunks(results, output_path, framerate)
+
+    for worker, (frames, seconds) in sorted(worker_stats.items()):
+        report(
+            f"Worker {worker}: {frames} frames in {seconds:.1f} s, "
+            f"{frames / seconds:.1f} fps"
+        )
+    return worker_stats
+
+
+def _remux(video_path: str, folder: str, framerate: float) -> str:
+    """ Copies a raw video stream into a Matroska file in folder, without
+        encoding it again, and returns its path """
+    output_path = os.path.join(folder, "video.mkv")
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-loglevel",
+            "error",
+            "-framerate",
+            str(framerate),
+            "-i",
+            video_path,
+            "-c",
+            "copy",
+            output_path,
+        ],
+        check=True,
+    )
+    return output_path
+
+
+def _join_chunks(
+    results: List[ChunkResult], output_path: str, framerate: float
+) -> None:
+    """ Joins the rendered chunks into one video, in order. With ffmpeg,
+        the encoded frames are copied as they are. Otherwise, the frames are
+        decoded and encoded again with OpenCV. """
+    if shutil.which("ffmpeg") is None:
+        _encode_chunks(results, output_path, framerate)
+        return
+
+    # Listed for ffmpeg's concat demuxer, next to the chunks
+    list_path = os.path.join(os.path.dirname(results[0].path), "chunks.txt")
+    with open(list_path, "w") as list_file:
+        for result in results:
+            list_file.write(f"file '{os.path.abspath(result.path)}'\n")
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-loglevel",
+            "error",
+            "-f",
+            "concat",
+            "-safe",
+            "0",
+            "-i",
+            list_path,
+            "-c",
+            "copy",
+            output_path,
+        ],
+        check=True,
+    )
+
+
+def _encode_chunks(
+    results: List[ChunkResult], output_path: str, framerate: float
+) -> None:
+    """ Copies the frames of the rendered chunks into one video, in order,
+        for when ffmpeg isn't installed """
+    writer = None
+    try:
+        for result in results:
+            chunk = cv2.VideoCapture(result.path)
+            while True:
+                success, frame = chunk.read()
+                if not success:
+                    break
+                if writer is None:
+                    height, width = frame.shape[:2]
+                    writer = cv2.VideoWriter(
+                        output_path,
+                        cv2.VideoWriter_fourcc(*VideoRecorder.fourcc),
+                        framerate,
+                        (width, height),
+                    )
+                writer.write(frame)
+            chunk.release()
+    finally:
+        if writer is not None:
+            writer.release()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    configs = read_configs()
+    parser = argparse.ArgumentParser(
+        description="Renders an overlay over a recording, using the telemetry"
+        " recorded with it",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("video", help="Recording to render the overlay over")
+    parser.add_argument("output", help="Video file to write, an .avi")
+    parser.add_argument(
+        "--overlay",
+        choices=configs["overlays"],
+        default=configs[ACTIVE_OVERLAY_KEY],
+        help="Overlay to render",
+    )
+    parser.add_argument(
+        "-b",
+        "--bike",
+        choices=["v2", "V2", "v3", "V3"],
+        default=configs["bike"],
+        help="Bike the telemetry was recorded from",
+    )
+    parser.add_argument(
+        "--telemetry",
+        help="Telemetry file recorded with the video. By default, the"
+        " .telemetry file next to the video.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of processes to render with",
+    )
+    parser.add_argument(
+        "--fps",
+        type=float,
+        help="Frame rate of the output. By default, that of the video.",
+    )
+    args = parser.parse_args(argv)
+    render_recording(
+        args.video,
+        args.output,
+        args.overlay,
+        args.bike,
+        args.telemetry,
+        args.workers,
+        framerate=args.fps,
+    )
+
+
+if __name__ == "__main__":
+    main()
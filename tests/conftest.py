@@ -0,0 +1,13 @@
+import pytest
+
+import config
+from backend import Backend
+
+
+@pytest.fixture(autouse=True)
+def isolated_files(tmp_path_factory, monkeypatch):
+    """ Keeps configs.json and recordings made by tests in a temporary
+        directory, rather than those of the repo """
+    directory = tmp_path_factory.mktemp("files")
+    monkeypatch.setattr(config, "CONFIG_DIRECTORY", str(directory))
+    monkeypatch.setattr(Backend, "recordings_folder", directory / "recordings")
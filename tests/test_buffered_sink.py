@@ -0,0 +1,139 @@
+import json
+import os
+from threading import Event
+
+import numpy as np
+import pytest
+
+from backend import buffered_sink
+from backend.buffered_sink import BufferedSink, FsyncPolicy
+
+
+def random_bytes(size):
+    return np.random.default_rng(0).integers(0, 256, size, np.uint8).tobytes()
+
+
+class TestBufferedSink:
+    @staticmethod
+    def test_writes_reach_file_in_order(tmp_path):
+        path = tmp_path / "video.h264"
+        data = random_bytes(20000)
+        sink = BufferedSink(str(path), 4096, 2)
+        for start in range(0, len(data), 3000):
+            end = start + 3000
+            sink.write(data[start:end])
+        sink.close()
+
+        assert path.read_bytes() == data
+        assert sink.bytes_written == len(data)
+
+    @staticmethod
+    def test_writes_dont_wait_for_file(tmp_path, monkeypatch):
+        unblocked = Event()
+        write = os.write
+
+        def blocked_write(fd, data):
+            unblocked.wait(5)
+            return write(fd, data)
+
+        monkeypatch.setattr(buffered_sink.os, "write", blocked_write)
+        path = tmp_path / "video.h264"
+        data = random_bytes(4096 * 6)
+        sink = BufferedSink(str(path), 4096, 2)
+
+        sink.write(data)
+        stats = sink.get_stats()
+        unblocked.set()
+        sink.close()
+
+        assert path.read_bytes() == data
+        # Extra buffers were allocated rather than waiting
+        assert sink.buffers_allocated > 2
+        assert stats["sinkHighWaterBytes"] == len(data)
+        assert stats["sinkPendingBytes"] == len(data)
+
+    @staticmethod
+    def test_writes_are_dropped_once_buffers_run_out(tmp_path, monkeypatch):
+        unblocked = Event()
+        write = os.write
+
+        def blocked_write(fd, data):
+            unblocked.wait(5)
+            return write(fd, data)
+
+        monkeypatch.setattr(buffered_sink.os, "write", blocked_write)
+        path = tmp_path / "video.h264"
+        data = random_bytes(4096 * 6)
+        sink = BufferedSink(
+            str(path), 4096, 2, max_buffers=3, block_seconds=0.01
+        )
+
+        for start in range(0, len(data), 4096):
+            end = start + 4096
+            assert sink.write(data[start:end]) == 4096
+        stats = sink.get_stats()
+        unblocked.set()
+        sink.close()
+
+        # Only as much as fits in the buffers is kept
+        kept = 4096 * 3
+        assert path.read_bytes() == data[:kept]
+        assert sink.buffers_allocated == 3
+        assert stats["sinkDroppedWrites"] == 3
+        assert stats["sinkDroppedBytes"] == 4096 * 3
+
+    @staticmethod
+    def test_switch_keeps_earlier_data_in_old_file(tmp_path):
+        first = tmp_path / "first.h264"
+        second = tmp_path / "second.h264"
+        sink = BufferedSink(str(first))
+        sink.write(b"abc")
+        sink.switch(str(second))
+        sink.write(b"def")
+        sink.close()
+
+        assert first.read_bytes() == b"abc"
+        assert second.read_bytes() == b"def"
+
+    @staticmethod
+    def test_stats_report_write_latency(tmp_path):
+        sink = BufferedSink(str(tmp_path / "video.h264"), 4096)
+        sink.write(random_bytes(4096 * 3))
+        sink.close()
+
+        stats = sink.get_stats()
+        assert 0 <= stats["writeLatencyP50"] <= stats["writeLatencyP99"]
+        assert stats["writeLatencyP99"] <= stats["writeLatencyMax"]
+        assert stats["sinkPendingBytes"] == 0
+        json.dumps(stats)
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "policy, syncs",
+        [(FsyncPolicy.never, 0), (FsyncPolicy.close, 2)],
+    )
+    def test_fsync_policy(tmp_path, monkeypatch, policy, syncs):
+        fsyncs = []
+        monkeypatch.setattr(buffered_sink.os, "fsync", fsyncs.append)
+        sink = BufferedSink(
+            str(tmp_path / "first.h264"), fsync_policy=policy
+        )
+        sink.write(b"abc")
+        sink.switch(str(tmp_path / "second.h264"))
+        sink.close()
+
+        assert len(fsyncs) == syncs
+
+    @staticmethod
+    def test_write_errors_are_raised(tmp_path, monkeypatch):
+        def failing_write(fd, data):
+            raise OSError("No space left on device")
+
+        monkeypatch.setattr(buffered_sink.os, "write", failing_write)
+        sink = BufferedSink(str(tmp_path / "video.h264"))
+        sink.write(b"abc")
+
+        with pytest.raises(OSError):
+            sink.close()
+        with pytest.raises(OSError):
+            sink.write(b"def")
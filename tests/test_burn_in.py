@@ -0,0 +1,168 @@
+import json
+from contextlib import nullcontext
+
+import cv2
+import numpy as np
+
+from backend import burn_in, picamera_backend
+from backend.burn_in import BurnInRecorder, PiCameraFrameOutput
+from backend.opencv_static_image_backend import OpenCVStaticImageBackend
+from backend.recordings import RecordingManager
+from canvas import Canvas, Colour, FlattenedCanvas
+from tests.test_picamera_overlays import FakePiCamera
+
+
+class FakeRawCamera(FakePiCamera):
+    """ Stands in for `picamera.PiCamera`, with splitter ports which record
+        raw frames """
+
+    def __init__(self, resolution=None):
+        super().__init__(resolution)
+        self.ports = {}
+
+    def start_recording(self, output, format=None, splitter_port=1, **opts):
+        self.ports[splitter_port] = output
+
+    def stop_recording(self, splitter_port=1):
+        del self.ports[splitter_port]
+
+    def wait_recording(self, timeout=0, splitter_port=1):
+        pass
+
+
+def read_frames(path):
+    video = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        success, frame = video.read()
+        if not success:
+            return frames
+        frames.append(frame)
+
+
+def enable_burn_in(monkeypatch, **configs):
+    monkeypatch.setattr(
+        burn_in,
+        "read_configs",
+        lambda: {"burnIn": {"enabled": True, **configs}},
+    )
+
+
+class TestBurnInRecorder:
+    @staticmethod
+    def test_overlay_is_burnt_in_at_recording_size(tmp_path):
+        canvas = Canvas(64, 48)
+        canvas.draw_rect((0, 0), (31, 47), Colour.red)
+        overlay = FlattenedCanvas(64, 48)
+        overlay.flatten([canvas])
+        path = str(tmp_path / "rec.avi")
+        recorder = BurnInRecorder(path, (32, 24), 1000, overlay)
+
+        recorder.start()
+        recorder.write(np.zeros((48, 64, 3), np.uint8))
+        recorder.stop()
+
+        recorder.check_errors()
+        (frame,) = read_frames(path)
+        assert frame.shape == (24, 32, 3)
+        # Red on the left, the black frame on the right
+        assert frame[12, 4, 2] > 200 and frame[12, 4, 1] < 50
+        assert frame[12, 28].max() < 50
+        assert recorder.get_stats()["encodeLag"] > 0
+
+    @staticmethod
+    def test_frames_are_taken_at_frame_rate(tmp_path):
+        path = str(tmp_path / "rec.avi")
+        recorder = BurnInRecorder(path, (64, 48), 1)
+
+        recorder.start()
+        for _ in range(5):
+            recorder.write(np.zeros((48, 64, 3), np.uint8))
+        recorder.stop()
+
+        assert len(read_frames(path)) == 1
+
+    @staticmethod
+    def test_overlay_changes_need_update(tmp_path):
+        canvas = Canvas(64, 48)
+        overlay = FlattenedCanvas(64, 48)
+        overlay.flatten([canvas])
+        recorder = BurnInRecorder(
+            str(tmp_path / "rec.avi"), (64, 48), 1000, overlay
+        )
+        recorder.start()
+
+        canvas.draw_rect((0, 0), (63, 47), Colour.white)
+        overlay.flatten([canvas])
+        assert recorder._overlay_copy.version != overlay.version
+        recorder.update_overlay()
+        recorder.stop()
+
+        assert recorder._overlay_copy.version == overlay.version
+
+
+class TestPiCameraFrameOutput:
+    @staticmethod
+    def test_padded_frames_are_reassembled():
+        frames = []
+        output = PiCameraFrameOutput(40, 20, lambda f: frames.append(f.copy()))
+        # Padded to 64x32
+        padded = np.arange(32 * 64 * 3, dtype=np.uint32).astype(np.uint8)
+        padded = padded.reshape(32, 64, 3)
+        data = padded.tobytes() * 2
+
+        for start in range(0, len(data), 1000):
+            end = start + 1000
+            output.write(data[start:end])
+
+        assert len(frames) == 2
+        assert (frames[1] == padded[:20, :40]).all()
+
+
+class TestBurnInBackends:
+    @staticmethod
+    def test_picamera_burns_overlay_into_raw_frames(tmp_path, monkeypatch):
+        enable_burn_in(monkeypatch)
+        monkeypatch.setattr(picamera_backend, "ON_PI", True)
+        monkeypatch.setattr(
+            picamera_backend, "PiCamera", FakeRawCamera, raising=False
+        )
+        statuses = []
+        backend = picamera_backend.PiCameraBackend(
+            64, 32, statuses.append, print, nullcontext()
+        )
+        backend.recordings = RecordingManager(tmp_path, "avi")
+        canvas = Canvas(64, 32)
+        canvas.draw_rect((0, 0), (63, 31), Colour.white)
+        backend.on_base_canvas_updated(canvas)
+
+        backend.start_recording()
+        output = backend.pi_camera.ports[backend.burn_in_splitter_port]
+        output.write(bytes(64 * 32 * 3))
+        backend.send_recording_status()
+        backend.stop_recording()
+
+        assert backend.pre_roll is None
+        assert backend.recording_output_file.endswith(".avi")
+        (frame,) = read_frames(backend.recording_output_file)
+        assert frame.min() > 200
+        assert "encodeLag" in json.loads(statuses[-2])
+        assert backend.pi_camera.ports == {}
+
+    @staticmethod
+    def test_opencv_recording_size(tmp_path, monkeypatch):
+        enable_burn_in(monkeypatch, width=32, height=24, fps=1000)
+        monkeypatch.setattr(cv2, "imshow", lambda name, frame: None)
+        monkeypatch.setattr(cv2, "waitKey", lambda delay: -1)
+        backend = OpenCVStaticImageBackend(
+            64, 48, print, print, nullcontext()
+        )
+        backend.pre_roll = None
+        backend.recordings = RecordingManager(tmp_path, "avi")
+
+        backend.start_recording()
+        backend._on_loop()
+        backend.stop_recording()
+
+        frames = read_frames(backend.recording_output_file)
+        assert frames and frames[0].shape == (24, 32, 3)
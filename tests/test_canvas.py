@@ -0,0 +1,459 @@
+import cv2
+import numpy as np
+
+from canvas import (
+    BlendMode,
+    Canvas,
+    Colour,
+    FlattenedCanvas,
+    GlyphAtlas,
+    SpriteCache,
+)
+from components.data_field import DataField, SpeedField
+
+
+class TestCanvasBlending:
+    @staticmethod
+    def test_blend_onto_replaces_opaque_pixels():
+        canvas = Canvas(40, 30)
+        canvas.draw_rect((10, 5), (19, 14), Colour.red)
+        frame = np.full((30, 40, 3), 100, np.uint8)
+
+        canvas.blend_onto(frame)
+
+        assert (frame[5:15, 10:20] == (0, 0, 255)).all()
+        assert (frame[:5] == 100).all(), "Transparent pixels were modified"
+        assert (frame[:, :10] == 100).all(), "Transparent pixels were modified"
+
+    @staticmethod
+    def test_blend_onto_ignores_mostly_transparent_pixels():
+        canvas = Canvas(20, 20)
+        canvas.draw_rect((0, 0), (19, 19), (255, 255, 255, 100))
+        frame = np.zeros((20, 20, 3), np.uint8)
+
+        canvas.blend_onto(frame)
+
+        # Their colour isn't added onto the frame either
+        assert not frame.any()
+
+    @staticmethod
+    def test_cache_rebuilt_after_drawing():
+        canvas = Canvas(20, 20)
+        frame = np.zeros((20, 20, 3), np.uint8)
+        canvas.blend_onto(frame)
+        assert not frame.any()
+
+        canvas.draw_circle((10, 10), 5, Colour.white)
+        canvas.blend_onto(frame)
+        assert (frame[10, 10] == 255).all()
+
+        canvas.clear()
+        frame[:] = 0
+        canvas.blend_onto(frame)
+        assert not frame.any()
+
+    @staticmethod
+    def test_copy_to_leaves_dest_unchanged():
+        canvas = Canvas(20, 20)
+        canvas.draw_rect((0, 0), (9, 9), Colour.blue)
+        frame = np.zeros((20, 20, 3), np.uint8)
+
+        result = canvas.copy_to(frame)
+
+        assert not frame.any()
+        assert (result[0:10, 0:10] == (255, 0, 0)).all()
+
+
+class TestAlphaBlending:
+    @staticmethod
+    def test_semi_transparent_pixels_blended():
+        canvas = Canvas(20, 20, BlendMode.alpha)
+        canvas.draw_rect((0, 0), (9, 19), Colour.semiTransparentBlack)
+        canvas.draw_rect((10, 0), (19, 19), (0, 0, 255, 255))
+        frame = np.full((20, 20, 3), 200, np.uint8)
+
+        canvas.blend_onto(frame)
+
+        expected_dark = round(200 * (255 - 181) / 255)
+        assert (np.abs(frame[:, :10].astype(int) - expected_dark) <= 1).all()
+        assert (frame[:, 10:] == (0, 0, 255)).all()
+
+    @staticmethod
+    def test_transparent_pixels_unchanged():
+        canvas = Canvas(20, 20, BlendMode.alpha)
+        canvas.draw_circle((10, 10), 4, Colour.white)
+        background = np.random.randint(0, 255, (20, 20, 3), np.uint8)
+        frame = background.copy()
+
+        canvas.blend_onto(frame)
+
+        transparent = canvas.img[:, :, 3] == 0
+        assert (frame[transparent] == background[transparent]).all()
+
+    @staticmethod
+    def test_changing_blend_mode():
+        canvas = Canvas(10, 10)
+        canvas.draw_rect((0, 0), (9, 9), (255, 255, 255, 100))
+        frame = np.zeros((10, 10, 3), np.uint8)
+        canvas.blend_onto(frame)
+        assert not frame.any()
+
+        canvas.blend_mode = BlendMode.alpha
+        canvas.blend_onto(frame)
+        assert (np.abs(frame.astype(int) - 100) <= 1).all()
+
+
+class TestFlattenedCanvas:
+    @staticmethod
+    def test_flatten_matches_blending_each_canvas():
+        back = Canvas(30, 30)
+        back.draw_rect((0, 0), (19, 19), Colour.red)
+        front = Canvas(30, 30)
+        front.draw_circle((15, 15), 8, Colour.green)
+        background = np.random.randint(0, 255, (30, 30, 3), np.uint8)
+
+        expected = background.copy()
+        back.blend_onto(expected)
+        front.blend_onto(expected)
+
+        flattened = FlattenedCanvas(30, 30)
+        flattened.flatten([back, front])
+        result = background.copy()
+        flattened.blend_onto(result)
+
+        assert (result == expected).all()
+
+    @staticmethod
+    def test_flatten_mixed_blend_modes():
+        back = Canvas(40, 40, BlendMode.alpha)
+        back.draw_rect((0, 0), (29, 29), (0, 0, 255, 128))
+        middle = Canvas(40, 40)
+        middle.draw_circle((20, 20), 8, Colour.green)
+        front = Canvas(40, 40, BlendMode.alpha)
+        front.draw_rect((15, 15), (39, 39), (255, 0, 0, 64))
+        background = np.random.randint(0, 255, (40, 40, 3), np.uint8)
+
+        expected = background.copy()
+        for canvas in [back, middle, front]:
+            canvas.blend_onto(expected)
+
+        flattened = FlattenedCanvas(40, 40)
+        flattened.flatten([back, middle, front])
+        result = background.copy()
+        flattened.blend_onto(result)
+
+        assert flattened.blend_mode is BlendMode.alpha
+        assert (np.abs(result.astype(int) - expected) <= 2).all()
+
+    @staticmethod
+    def test_reflatten_removes_cleared_content():
+        canvas = Canvas(10, 10)
+        canvas.draw_rect((0, 0), (9, 9), Colour.white)
+        flattened = FlattenedCanvas(10, 10)
+        flattened.flatten([canvas])
+
+        canvas.clear()
+        flattened.flatten([canvas])
+        frame = np.zeros((10, 10, 3), np.uint8)
+        flattened.blend_onto(frame)
+
+        assert not frame.any()
+
+    @staticmethod
+    def test_copy_layer_matches_original():
+        canvas = Canvas(40, 40, BlendMode.alpha)
+        canvas.draw_rect((0, 0), (19, 19), (0, 0, 255, 128))
+        flattened = FlattenedCanvas(40, 40)
+        flattened.flatten([canvas])
+        copy = FlattenedCanvas(40, 40)
+        flattened.copy_layer_to(copy)
+
+        # The copy follows the layer when it changes
+        canvas.clear()
+        canvas.draw_circle((30, 30), 5, Colour.green)
+        canvas.blend_mode = BlendMode.mask
+        flattened.flatten([canvas])
+        flattened.copy_layer_to(copy)
+
+        background = np.random.randint(0, 255, (40, 40, 3), np.uint8)
+        expected = background.copy()
+        flattened.blend_onto(expected)
+        result = background.copy()
+        copy.blend_onto(result)
+
+        assert copy.version == flattened.version
+        assert copy.blend_mode is BlendMode.mask
+        assert (result == expected).all()
+
+
+class TestCanvasRegions:
+    @staticmethod
+    def test_draw_methods_record_regions():
+        canvas = Canvas(100, 100)
+        assert canvas.regions == []
+
+        canvas.draw_rect((10, 10), (19, 19))
+        assert canvas.regions == [(10, 10, 20, 20)]
+
+        canvas.draw_text("42", (60, 90), 1, Colour.white)
+        canvas.draw_circle((80, 20), 5, Colour.white)
+        assert len(canvas.regions) == 3
+
+    @staticmethod
+    def test_regions_contain_all_content():
+        canvas = Canvas(300, 100)
+        canvas.draw_text("Qgjpy 00:00", (150, 60), 1.5, Colour.white, "centre")
+        canvas.draw_circle((10, 10), 8, Colour.white)
+
+        content = canvas.img[:, :, 3] > 0
+        for left, top, right, bottom in canvas.regions:
+            content[top:bottom, left:right] = False
+        assert not content.any()
+
+    @staticmethod
+    def test_overlapping_regions_are_merged():
+        canvas = Canvas(100, 100)
+        canvas.draw_rect((0, 0), (49, 49))
+        canvas.draw_rect((40, 40), (89, 89))
+        assert canvas.regions == [(0, 0, 90, 90)]
+
+    @staticmethod
+    def test_regions_clipped_to_canvas():
+        canvas = Canvas(100, 50)
+        canvas.draw_rect((80, 0), (100, 50))
+        assert canvas.regions == [(80, 0, 100, 50)]
+
+    @staticmethod
+    def test_clear_resets_content_and_regions():
+        canvas = Canvas(50, 50)
+        canvas.draw_rect((0, 0), (9, 9), Colour.white)
+        frame = np.zeros((50, 50, 3), np.uint8)
+        canvas.blend_onto(frame)
+
+        canvas.clear()
+        canvas.draw_rect((30, 30), (39, 39), Colour.red)
+        frame[:] = 0
+        canvas.blend_onto(frame)
+
+        assert canvas.regions == [(30, 30, 40, 40)]
+        assert not canvas.img[0:10, 0:10].any()
+        assert not frame[0:10, 0:10].any()
+        assert (frame[30:40, 30:40] == (0, 0, 255)).all()
+
+
+class TestTextLayout:
+    @staticmethod
+    def test_layout_matches_opencv():
+        thickness = Canvas._get_text_thickness(1.5)
+        (width, height), baseline = cv2.getTextSize(
+            "Qg 00:00", Canvas.font, 1.5, thickness
+        )
+        assert Canvas.get_text_layout("Qg 00:00", 1.5) == (
+            width,
+            height,
+            baseline,
+        )
+        assert Canvas.get_text_dimensions("Qg 00:00", 1.5) == (width, height)
+
+    @staticmethod
+    def test_repeated_layouts_are_cached():
+        Canvas._get_text_layout.cache_clear()
+        Canvas.get_text_layout("250w", 2.5)
+        Canvas.get_text_layout("250w", 2.5)
+        Canvas.get_text_dimensions("250w", 2.5)
+
+        info = Canvas._get_text_layout.cache_info()
+        assert (info.hits, info.misses) == (2, 1)
+
+    @staticmethod
+    def test_text_origin():
+        width, _ = Canvas.get_text_dimensions("42", 1)
+        assert Canvas.get_text_origin("42", (100, 50), 1) == (100, 50)
+        assert Canvas.get_text_origin("42", (100, 50), 1, "right") == (
+            100 - width,
+            50,
+        )
+        assert Canvas.get_text_origin("42", (100, 50), 1, "centre") == (
+            100 - width // 2,
+            50,
+        )
+
+    @staticmethod
+    def test_precomputed_origin_matches_alignment():
+        expected = Canvas(200, 100)
+        expected.draw_text("12:34", (150, 60), 1.5, Colour.white, "right")
+
+        origin = Canvas.get_text_origin("12:34", (150, 60), 1.5, "right")
+        canvas = Canvas(200, 100)
+        canvas.draw_text("12:34", origin, 1.5, Colour.white)
+
+        assert (canvas.img == expected.img).all()
+
+    @staticmethod
+    def test_data_field_titles_use_precomputed_origins():
+        field = SpeedField((20, 90))
+        expected = Canvas(200, 100)
+        expected.draw_text(
+            "KPH",
+            field.title_coord,
+            DataField.title_size,
+            Colour.white,
+            "right",
+        )
+
+        canvas = Canvas(200, 100)
+        field.title = "KPH"
+        DataField.draw_base(field, canvas)
+
+        assert (canvas.img == expected.img).all()
+        assert set(field.title_origins) == {"", "KPH"}
+
+
+class TestTextSprites:
+    @staticmethod
+    def test_draw_text_matches_opencv():
+        for colour in [Colour.white, Colour.red, Colour.yellow]:
+            canvas = Canvas(300, 100)
+            canvas.draw_rect((0, 0), (299, 49), Colour.semiTransparentBlack)
+            expected = canvas.img.copy()
+
+            canvas.draw_text("Qg 00:00", (20, 60), 1.5, colour)
+            cv2.putText(
+                expected,
+                "Qg 00:00",
+                (20, 60),
+                Canvas.font,
+                1.5,
+                Canvas._get_colour_tuple(colour),
+                Canvas._get_text_thickness(1.5),
+                cv2.LINE_AA,
+            )
+
+            difference = np.abs(canvas.img.astype(int) - expected)
+            assert difference.max() <= 1
+
+    @staticmethod
+    def test_draw_text_clipped_at_edges():
+        canvas = Canvas(60, 30)
+        canvas.draw_text("000", (-15, 40), 1.5, Colour.white)
+        expected = np.zeros((30, 60, 4), np.uint8)
+        cv2.putText(
+            expected,
+            "000",
+            (-15, 40),
+            Canvas.font,
+            1.5,
+            (255, 255, 255, 255),
+            Canvas._get_text_thickness(1.5),
+            cv2.LINE_AA,
+        )
+        assert (canvas.img == expected).all()
+
+    @staticmethod
+    def test_repeated_text_uses_cache(monkeypatch):
+        monkeypatch.setattr(Canvas, "sprite_cache", SpriteCache())
+        canvas = Canvas(200, 100)
+
+        canvas.draw_text("--", (10, 50), 1.5, Colour.white)
+        canvas.draw_text("--", (100, 50), 1.5, Colour.white)
+        canvas.draw_text("--", (100, 50), 1.5, Colour.red)
+
+        assert Canvas.sprite_cache.misses == 2
+        assert Canvas.sprite_cache.hits == 1
+
+
+class TestSpriteCache:
+    @staticmethod
+    def test_least_recently_used_evicted():
+        cache = SpriteCache(max_size=2)
+        cache.get("a", lambda: "sprite a")
+        cache.get("b", lambda: "sprite b")
+        cache.get("a", lambda: "new sprite a")
+        cache.get("c", lambda: "sprite c")
+
+        assert len(cache) == 2
+        assert cache.get("a", lambda: "new sprite a") == "sprite a"
+        assert cache.get("b", lambda: "new sprite b") == "new sprite b"
+
+    @staticmethod
+    def test_clear_resets_counters():
+        cache = SpriteCache()
+        cache.get("a", lambda: "sprite a")
+        cache.get("a", lambda: "sprite a")
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        cache.clear()
+        assert (cache.hits, cache.misses, len(cache)) == (0, 0, 0)
+
+
+class TestGlyphAtlas:
+    @staticmethod
+    def test_values_placed_like_draw_text():
+        atlas = GlyphAtlas(1.5, Colour.white)
+        for text in ["250w", "12:34", "--", "7.25"]:
+            for align in ["left", "right", "centre"]:
+                expected = Canvas(300, 100)
+                expected.draw_text(text, (150, 60), 1.5, Colour.white, align)
+                canvas = Canvas(300, 100)
+                atlas.draw_text(canvas, text, (150, 60), align)
+
+                assert atlas.get_text_width(text) == (
+                    Canvas.get_text_dimensions(text, 1.5)[0]
+                )
+                ys, xs = np.nonzero(canvas.img[:, :, 3])
+                expected_ys, expected_xs = np.nonzero(expected.img[:, :, 3])
+                assert (xs.min(), xs.max()) == (
+                    expected_xs.min(),
+                    expected_xs.max(),
+                )
+                assert (ys.min(), ys.max()) == (
+                    expected_ys.min(),
+                    expected_ys.max(),
+                )
+
+    @staticmethod
+    def test_values_drawn_exactly_like_draw_text():
+        # At size 1, some characters are drawn past their advance
+        for size in [1.0, 1.05, 1.5, 2.5]:
+            atlas = GlyphAtlas(size, Colour.white)
+            assert atlas.fits_advances == (size != 1.0)
+            for text in ["250w", "12:34", "1098.6"]:
+                expected = Canvas(400, 150)
+                expected.draw_text(text, (20, 100), size, Colour.white)
+                canvas = Canvas(400, 150)
+                atlas.draw_text(canvas, text, (20, 100))
+
+                assert (canvas.img == expected.img).all()
+
+    @staticmethod
+    def test_shorter_value_after_longer_value():
+        atlas = GlyphAtlas(1.5, Colour.white)
+        atlas.draw_text(Canvas(300, 100), "88888888888", (10, 60))
+
+        canvas = Canvas(300, 100)
+        atlas.draw_text(canvas, "1", (10, 60))
+
+        ys, xs = np.nonzero(canvas.img[:, :, 3])
+        assert xs.max() < 10 + atlas.get_text_width("1")
+
+    @staticmethod
+    def test_falls_back_for_other_characters():
+        atlas = GlyphAtlas(1.5, Colour.red)
+        canvas = Canvas(300, 100)
+        atlas.draw_text(canvas, "KPH", (10, 60))
+
+        expected = Canvas(300, 100)
+        expected.draw_text("KPH", (10, 60), 1.5, Colour.red)
+        assert (canvas.img == expected.img).all()
+
+    @staticmethod
+    def test_fixed_format_origin():
+        atlas = GlyphAtlas(1.5, Colour.white)
+        origin = atlas.get_text_origin("00:00", (150, 60), "right")
+
+        expected = Canvas(200, 100)
+        atlas.draw_text(expected, "12:59", (150, 60), "right")
+        canvas = Canvas(200, 100)
+        atlas.draw_text(canvas, "12:59", origin)
+
+        assert (canvas.img == expected.img).all()
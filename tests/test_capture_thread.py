@@ -0,0 +1,99 @@
+from threading import Event
+from time import sleep
+
+import numpy as np
+
+from backend.capture_thread import CaptureThread
+from backend.frame_pool import FramePool
+
+
+class FakeCapture:
+    """ Produces numbered frames, optionally waiting to be allowed to read
+        each one. """
+
+    def __init__(self, gated=False):
+        self.count = 0
+        self.gate = Event()
+        if not gated:
+            self.gate.set()
+
+    def read(self, image=None):
+        self.gate.wait()
+        sleep(0.001)
+        self.count += 1
+        if image is None:
+            image = np.empty((2, 2, 3), np.uint8)
+        image[:] = self.count % 256
+        return True, image
+
+
+class FailingCapture:
+    @staticmethod
+    def read():
+        return False, None
+
+
+class TestCaptureThread:
+    @staticmethod
+    def test_read_returns_newest_frame_once():
+        capture = FakeCapture(gated=True)
+        thread = CaptureThread(capture)
+        thread.start()
+        try:
+            assert thread.read() is None
+            capture.gate.set()
+            frame = thread.read(timeout=1)
+            assert frame is not None
+            sleep(0.05)
+            capture.gate.clear()
+            sleep(0.05)
+
+            latest = capture.count
+            frame = thread.read(timeout=1)
+            assert frame[0, 0, 0] in (latest % 256, (latest - 1) % 256)
+            assert thread.read() is None, "Frame was returned twice"
+        finally:
+            capture.gate.set()
+            thread.stop()
+
+    @staticmethod
+    def test_counters():
+        thread = CaptureThread(FakeCapture())
+        thread.fps_interval = 0.05
+        thread.start()
+        sleep(0.2)
+        thread.stop()
+
+        assert not thread.is_running()
+        assert thread.frames_captured > 1
+        # Nothing was read, so every frame but the newest was dropped
+        assert thread.frames_dropped == thread.frames_captured - 1
+        assert thread.fps > 0
+        assert thread.read_latency > 0
+        assert thread.mean_read_latency > 0
+
+    @staticmethod
+    def test_read_failures_are_counted():
+        thread = CaptureThread(FailingCapture())
+        thread.start()
+        assert thread.read(timeout=0.05) is None
+        thread.stop()
+
+        assert thread.read_failures > 0
+        assert thread.frames_captured == 0
+
+    @staticmethod
+    def test_frames_are_read_into_pool_buffers():
+        pool = FramePool()
+        thread = CaptureThread(FakeCapture(), pool)
+        thread.start()
+        try:
+            for _ in range(20):
+                frame = thread.read(timeout=1)
+                pool.release(frame)
+        finally:
+            thread.stop()
+
+        # The reader, the newest frame and the frame being read
+        assert thread.frames_captured >= 20
+        assert pool.allocations <= 3
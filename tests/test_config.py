@@ -0,0 +1,29 @@
+import json
+import os
+
+import config
+
+
+class TestConfig:
+    @staticmethod
+    def test_configs_are_kept_in_config_directory():
+        overlay = config.get_active_overlay()
+
+        assert os.path.dirname(overlay) == config.CURRENT_DIRECTORY
+        assert os.path.isfile(overlay)
+        assert os.path.isfile(
+            os.path.join(config.CONFIG_DIRECTORY, config.CONFIG_FILE)
+        )
+
+    @staticmethod
+    def test_given_directory_is_used(tmp_path):
+        (tmp_path / "overlay_test.py").touch()
+
+        overlay = config.get_active_overlay(str(tmp_path))
+        config.set_rotation(90, str(tmp_path))
+
+        assert overlay == str(tmp_path / "overlay_test.py")
+        with open(tmp_path / config.CONFIG_FILE) as file:
+            configs = json.load(file)
+        assert configs[config.ACTIVE_OVERLAY_KEY] == "overlay_test.py"
+        assert configs[config.ROTATION_KEY] == 90
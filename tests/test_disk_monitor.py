@@ -0,0 +1,118 @@
+import json
+from collections import namedtuple
+from contextlib import nullcontext
+
+from backend import disk_monitor
+from backend.disk_monitor import DiskMonitor, LowSpaceAction
+from backend.headless_backend import HeadlessBackend
+from backend.recordings import RecordingManager
+from tests.test_pre_roll import FakeClock
+
+DiskUsage = namedtuple("DiskUsage", "total used free")
+
+
+class FakeDisk:
+    """ Stands in for shutil.disk_usage, with a set amount of free space """
+
+    def __init__(self, free):
+        self.free = free
+        self.calls = 0
+
+    def __call__(self, path):
+        self.calls += 1
+        return DiskUsage(10 ** 12, 10 ** 12 - self.free, self.free)
+
+
+class TestDiskMonitor:
+    @staticmethod
+    def test_predicts_minutes_remaining(tmp_path, monkeypatch):
+        disk = FakeDisk(6 * 10 ** 6)
+        monkeypatch.setattr(disk_monitor, "disk_usage", disk)
+        clock = FakeClock()
+        recordings = RecordingManager(tmp_path, "h264")
+        monitor = DiskMonitor(tmp_path, recordings, clock=clock)
+        assert monitor.minutes_remaining is None
+
+        path = recordings.start()
+        monitor.sample()
+        with open(path, "wb") as file:
+            file.write(bytes(10000))
+        clock.time = 10
+        monitor.sample()
+
+        assert monitor.write_rate == 1000
+        assert monitor.minutes_remaining == 100
+        assert monitor.get_stats()["recordingMinutesRemaining"] == 100
+
+    @staticmethod
+    def test_rate_is_forgotten_when_recording_stops(tmp_path, monkeypatch):
+        monkeypatch.setattr(disk_monitor, "disk_usage", FakeDisk(10 ** 9))
+        clock = FakeClock()
+        recordings = RecordingManager(tmp_path, "h264")
+        monitor = DiskMonitor(tmp_path, recordings, clock=clock)
+
+        path = recordings.start()
+        monitor.sample()
+        with open(path, "wb") as file:
+            file.write(bytes(100))
+        clock.time = 1
+        monitor.sample()
+        recordings.stop()
+        monitor.sample()
+
+        assert monitor.minutes_remaining is None
+        assert "recordingMinutesRemaining" not in monitor.get_stats()
+
+    @staticmethod
+    def test_prunes_oldest_recordings(tmp_path, monkeypatch):
+        monkeypatch.setattr(disk_monitor, "disk_usage", FakeDisk(0))
+        names = ["rec_1_1.h264", "rec_1_2.h264", "rec_2.h264", "rec_10.h264"]
+        for name in names:
+            (tmp_path / name).write_bytes(bytes(100))
+        recordings = RecordingManager(tmp_path, "h264")
+        with open(recordings.start(), "wb") as file:
+            file.write(bytes(100))
+        monitor = DiskMonitor(
+            tmp_path,
+            recordings,
+            min_free_bytes=250,
+            action=LowSpaceAction.prune,
+        )
+
+        remaining = sorted(path.name for path in tmp_path.iterdir())
+        assert remaining == ["rec_10.h264", "rec_11.h264"]
+        assert monitor.files_pruned == 3
+        assert not monitor.low_space
+
+    @staticmethod
+    def test_backend_stops_recording_when_low(tmp_path, monkeypatch):
+        disk = FakeDisk(10 ** 9)
+        monkeypatch.setattr(disk_monitor, "disk_usage", disk)
+        statuses = []
+        backend = HeadlessBackend(
+            64, 48, statuses.append, print, nullcontext()
+        )
+        backend._start_recording = lambda: None
+        backend._stop_recording = lambda: None
+        backend.recordings = RecordingManager(tmp_path, "h264")
+        backend.disk_monitor = DiskMonitor(
+            tmp_path,
+            backend.recordings,
+            min_free_bytes=10 ** 6,
+            action=LowSpaceAction.stop,
+        )
+        backend.start_video()
+        backend.start_recording()
+        backend.recording = True
+
+        backend.on_loop()
+        assert backend.recording
+        calls = disk.calls
+        disk.free = 1000
+        backend.disk_monitor.sample()
+        backend.on_loop()
+
+        assert not backend.recording
+        assert json.loads(statuses[-1])["diskSpaceRemaining"] == 1000
+        # The frame loop never measures the disk itself
+        assert disk.calls == calls + 1
@@ -0,0 +1,79 @@
+import pytest
+
+from backend.frame_pacer import FramePacer
+
+
+class FakeClock:
+    """ A clock which only advances when told to, or when slept on """
+
+    def __init__(self):
+        self.time = 100.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.time
+
+    def sleep(self, duration):
+        self.sleeps.append(duration)
+        self.time += duration
+
+
+def make_pacer(framerate=10):
+    clock = FakeClock()
+    return FramePacer(framerate, clock, clock.sleep), clock
+
+
+class TestFramePacer:
+    @staticmethod
+    def test_sleeps_only_remaining_budget():
+        pacer, clock = make_pacer()
+        pacer.wait()
+
+        clock.time += 0.03
+        pacer.wait()
+
+        assert clock.sleeps[-1] == pytest.approx(0.07)
+        assert clock.time == pytest.approx(100.1)
+        assert pacer.overruns == 0
+
+    @staticmethod
+    def test_does_not_drift():
+        pacer, clock = make_pacer()
+        for _ in range(51):
+            clock.time += 0.042
+            pacer.wait()
+
+        # The first frame sets the deadline, the next 50 take 0.1s each
+        assert clock.time == pytest.approx(100.042 + 5)
+        assert pacer.fps == pytest.approx(10)
+
+    @staticmethod
+    def test_skips_missed_frames_after_overrun():
+        pacer, clock = make_pacer()
+        pacer.wait()
+
+        # Finishing 0.25s late misses two whole frame slots
+        clock.time += 0.35
+        pacer.wait()
+        assert pacer.overruns == 1
+        assert pacer.frames_skipped == 2
+
+        # The next frame keeps the original frame phase
+        clock.time += 0.01
+        pacer.wait()
+        assert clock.time == pytest.approx(100.4)
+
+    @staticmethod
+    def test_reset_restarts_deadline():
+        pacer, clock = make_pacer()
+        pacer.wait()
+        pacer.reset()
+
+        clock.time += 10
+        pacer.wait()
+        assert pacer.overruns == 0
+
+    @staticmethod
+    def test_invalid_framerate():
+        with pytest.raises(ValueError):
+            FramePacer(0)
@@ -0,0 +1,125 @@
+from contextlib import nullcontext
+from threading import Event, Thread
+
+import cv2
+import numpy as np
+import pytest
+
+from backend.frame_pool import AllocationCheck, FramePool
+from backend.opencv_static_image_backend import OpenCVStaticImageBackend
+from canvas import Canvas, Colour
+
+
+def allocate_frame(frames, allocated):
+    frames.append(np.ones((100, 100, 3), np.uint8))
+    allocated.set()
+
+
+def add_one(frame):
+    """ Adds one to a frame, through a temporary frame sized array """
+    temporary = frame + 1
+    np.copyto(frame, temporary)
+    del temporary
+    temporary = frame + 1
+    np.copyto(frame, temporary)
+
+
+class TestFramePool:
+    @staticmethod
+    def test_released_buffers_are_reused():
+        pool = FramePool()
+        frame = pool.acquire((4, 6, 3))
+        pool.release(frame)
+
+        assert pool.acquire((4, 6, 3)) is frame
+        assert pool.acquire((4, 6, 3)) is not frame
+        assert pool.allocations == 2
+
+    @staticmethod
+    def test_buffers_are_kept_by_format():
+        pool = FramePool()
+        pool.release(np.empty((4, 6, 3), np.uint8))
+
+        assert pool.acquire((4, 6)).shape == (4, 6)
+        assert pool.acquire((4, 6, 3), np.float32).dtype == np.float32
+
+    @staticmethod
+    def test_preallocate():
+        pool = FramePool()
+        pool.preallocate((4, 6, 3), 2)
+
+        pool.acquire((4, 6, 3))
+        pool.acquire((4, 6, 3))
+        assert pool.allocations == 2
+
+
+class TestAllocationCheck:
+    @staticmethod
+    def test_detects_frame_allocations():
+        check = AllocationCheck(10000, warmup_frames=0)
+        frame = np.zeros((100, 100, 3), np.uint8)
+        with pytest.raises(AssertionError):
+            with check:
+                frame = cv2.add(frame, 1)
+
+    @staticmethod
+    def test_detects_temporary_allocations():
+        check = AllocationCheck(10000, warmup_frames=0)
+        frame = np.zeros((100, 100, 3), np.uint8)
+        with pytest.raises(AssertionError):
+            with check:
+                frame[:] = cv2.resize(frame, (100, 100)) + 1
+
+    @staticmethod
+    def test_detects_allocations_freed_by_called_functions():
+        check = AllocationCheck(10000, warmup_frames=0)
+        frame = np.zeros((100, 100, 3), np.uint8)
+        with pytest.raises(AssertionError, match="2 frame sized arrays"):
+            with check:
+                add_one(frame)
+
+    @staticmethod
+    def test_allows_in_place_operations():
+        check = AllocationCheck(10000, warmup_frames=0)
+        frame = np.zeros((100, 100, 3), np.uint8)
+        with check:
+            cv2.add(frame, 1, dst=frame)
+            small = np.ones(100, np.uint8)
+        assert small.size == 100
+
+    @staticmethod
+    def test_ignores_other_threads():
+        check = AllocationCheck(10000, warmup_frames=0)
+        frames = []
+        allocated = Event()
+        thread = Thread(target=allocate_frame, args=(frames, allocated))
+        with check:
+            thread.start()
+            allocated.wait()
+        thread.join()
+        assert len(frames) == 1
+
+    @staticmethod
+    def test_static_image_backend_loop(monkeypatch):
+        # There may be no display to show frames on
+        monkeypatch.setattr(cv2, "imshow", lambda name, frame: None)
+        monkeypatch.setattr(cv2, "waitKey", lambda delay: -1)
+
+        backend = OpenCVStaticImageBackend(
+            320, 200, print, print, nullcontext()
+        )
+        backend.background = np.full((240, 360, 3), 50, np.uint8)
+        backend.video_rotation = 90
+        canvas = Canvas(320, 200)
+        canvas.draw_rect((10, 10), (100, 50), Colour.red)
+        backend.on_base_canvas_updated(canvas)
+
+        check = AllocationCheck(320 * 200, warmup_frames=2)
+        for i in range(5):
+            # Composite the frame again each time, rather than showing the
+            # last one
+            canvas.draw_rect((10, 10), (100, 50 + i), Colour.red)
+            backend.on_canvases_updated(canvas, canvas)
+            with check:
+                backend._on_loop()
+        assert check.frames_checked == 5
@@ -0,0 +1,110 @@
+import cv2
+import numpy as np
+import pytest
+
+from backend.frame_transform import FrameTransform
+
+ROTATE_CODES = {
+    0: None,
+    90: cv2.ROTATE_90_CLOCKWISE,
+    180: cv2.ROTATE_180,
+    270: cv2.ROTATE_90_COUNTERCLOCKWISE,
+}
+CAMERA_MATRIX = [[500, 0, 320], [0, 500, 240], [0, 0, 1]]
+
+
+def make_frame():
+    noise = np.random.default_rng(0).integers(0, 256, (480, 640, 3), np.uint8)
+    return cv2.GaussianBlur(noise, (9, 9), 3)
+
+
+def rotate_and_resize(frame, rotation, size):
+    code = ROTATE_CODES[rotation]
+    if code is not None:
+        frame = cv2.rotate(frame, code)
+    return cv2.resize(frame, size)
+
+
+def max_difference(a, b):
+    return np.abs(a.astype(int) - b).max()
+
+
+class TestFrameTransform:
+    @staticmethod
+    @pytest.mark.parametrize("rotation", ROTATE_CODES)
+    @pytest.mark.parametrize("size", [(1024, 600), (320, 200), (480, 640)])
+    def test_matches_rotate_and_resize(rotation, size):
+        frame = make_frame()
+        transform = FrameTransform(*size, rotation)
+
+        output = transform.apply(frame)
+
+        expected = rotate_and_resize(frame, rotation, size)
+        assert output.shape == expected.shape
+        assert max_difference(output, expected) <= 1
+
+    @staticmethod
+    def test_crop():
+        frame = make_frame()
+        transform = FrameTransform(200, 100, 90, crop=(0.25, 0, 0.75, 0.5))
+
+        output = transform.apply(frame)
+
+        expected = cv2.resize(
+            cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE)[:320, 120:360],
+            (200, 100),
+        )
+        assert max_difference(output, expected) <= 1
+
+    @staticmethod
+    def test_lens_correction_matches_undistort():
+        frame = make_frame()
+        distortion = [-0.2, 0.05, 0, 0, 0]
+        transform = FrameTransform(
+            640,
+            480,
+            camera_matrix=CAMERA_MATRIX,
+            distortion_coefficients=distortion,
+        )
+
+        output = transform.apply(frame)
+
+        expected = cv2.undistort(
+            frame, np.array(CAMERA_MATRIX, float), np.array(distortion)
+        )
+        assert max_difference(output, expected) <= 1
+
+    @staticmethod
+    @pytest.mark.parametrize("rotation", ROTATE_CODES)
+    def test_lens_correction_with_rotation(rotation):
+        frame = make_frame()
+        transform = FrameTransform(
+            1024,
+            600,
+            rotation,
+            camera_matrix=CAMERA_MATRIX,
+            distortion_coefficients=[0, 0, 0, 0, 0],
+        )
+
+        output = transform.apply(frame)
+
+        expected = rotate_and_resize(frame, rotation, (1024, 600))
+        assert max_difference(output, expected) <= 2
+
+    @staticmethod
+    def test_output_buffer_is_reused():
+        frame = make_frame()
+        transform = FrameTransform(320, 200, 90)
+        output = transform.apply(frame)
+
+        assert transform.apply(frame) is output
+
+        transform.rotation = 180
+        output = transform.apply(frame)
+        expected = rotate_and_resize(frame, 180, (320, 200))
+        assert max_difference(output, expected) <= 1
+
+    @staticmethod
+    def test_invalid_rotation():
+        with pytest.raises(ValueError):
+            FrameTransform(320, 200, 45).apply(make_frame())
@@ -0,0 +1,81 @@
+from contextlib import nullcontext
+
+import numpy as np
+
+from backend import BackendFactory, HeadlessBackend
+from backend.headless_backend import HeadlessOutput
+from overlay_new import OverlayNew
+
+
+def make_backend(output=HeadlessOutput.discard, width=320, height=200):
+    backend = BackendFactory.create(
+        "headless", width, height, print, print, nullcontext()
+    )
+    backend.output = output
+    return backend
+
+
+class TestHeadlessBackend:
+    @staticmethod
+    def test_composites_overlay():
+        overlay = OverlayNew("V3", backend="headless")
+        overlay.draw_base_layer()
+        overlay.update_data_layer()
+        backend = make_backend(
+            HeadlessOutput.ring, overlay.width, overlay.height
+        )
+        backend.ring_size = 4
+
+        with backend:
+            backend.on_base_canvas_updated(overlay.base_canvas)
+            backend.on_canvases_updated(
+                overlay.data_canvas, overlay.message_canvas
+            )
+            for _ in range(6):
+                backend.on_loop()
+
+        assert isinstance(backend, HeadlessBackend)
+        assert backend.frame_count == 6
+        assert backend.ring_index == 2
+        # Opaque overlay pixels replace the frame
+        expected = np.zeros((overlay.height, overlay.width, 3), np.uint8)
+        overlay.base_canvas.blend_onto(expected)
+        overlay.data_canvas.blend_onto(expected)
+        covered = overlay.data_canvas.img[:, :, 3] == 255
+        assert (backend.ring[1][covered] == expected[covered]).all()
+
+    @staticmethod
+    def test_saves_every_nth_frame(tmp_path):
+        backend = make_backend(HeadlessOutput.files)
+        backend.output_folder = tmp_path
+        backend.save_interval = 3
+
+        with backend:
+            for _ in range(7):
+                backend.on_loop()
+
+        assert sorted(path.name for path in tmp_path.iterdir()) == [
+            "frame_000000.png",
+            "frame_000003.png",
+            "frame_000006.png",
+        ]
+
+    @staticmethod
+    def test_is_unthrottled_and_reports_fps(capsys):
+        backend = make_backend()
+        backend.report_interval = 0
+        backend.frame_pacer.framerate = 1
+        backend.frame_pacer.frame_period = 1
+
+        with backend:
+            for _ in range(5):
+                backend.on_loop()
+
+        assert "frames/second" in capsys.readouterr().out
+        assert backend.fps > 5
+
+    @staticmethod
+    def test_overlay_backend_argument():
+        overlay = OverlayNew("V3", bg="background.png", backend="headless")
+        assert overlay.backend_name == "headless"
+        assert overlay.bg_path == "background.png"
@@ -0,0 +1,116 @@
+from time import sleep
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import cv2
+import numpy as np
+import pytest
+
+from backend import mjpeg_stream
+from backend.mjpeg_stream import MjpegStream
+
+
+def make_frame(value):
+    return np.full((48, 64, 3), value, np.uint8)
+
+
+def wait_for(condition, timeout=5):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        sleep(0.01)
+    raise AssertionError("Timed out")
+
+
+@pytest.fixture
+def stream():
+    stream = MjpegStream(port=0, max_fps=1000, host="127.0.0.1")
+    stream.start()
+    yield stream
+    stream.stop()
+
+
+def read_part(response):
+    """ Reads the next JPEG from a multipart MJPEG response """
+    headers = {}
+    line = response.readline()
+    while line.strip() != b"--" + MjpegStream.boundary.encode():
+        line = response.readline()
+    line = response.readline()
+    while line.strip():
+        name, value = line.decode().split(":", 1)
+        headers[name.strip().lower()] = value.strip()
+        line = response.readline()
+    return response.read(int(headers["content-length"]))
+
+
+class TestMjpegStream:
+    @staticmethod
+    def test_snapshot(stream):
+        url = f"http://127.0.0.1:{stream.server_port}/frame.jpg"
+        with pytest.raises(HTTPError):
+            urlopen(url, timeout=5)
+
+        assert stream.submit(make_frame(200))
+        wait_for(lambda: stream.frames_encoded == 1)
+
+        jpeg = urlopen(url, timeout=5).read()
+        frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+        assert abs(int(frame[0, 0, 0]) - 200) <= 2
+        assert stream.encode_time > 0
+
+    @staticmethod
+    def test_stream_sends_latest_frames(stream):
+        stream.submit(make_frame(10))
+        wait_for(lambda: stream.frames_encoded == 1)
+
+        url = f"http://127.0.0.1:{stream.server_port}/"
+        with urlopen(url, timeout=5) as response:
+            first = read_part(response)
+            wait_for(lambda: stream.clients == 1)
+            assert stream.get_stats()["streamClients"] == 1
+
+            stream.submit(make_frame(100))
+            wait_for(lambda: stream.frames_encoded == 2)
+            second = read_part(response)
+
+        decoded = cv2.imdecode(np.frombuffer(second, np.uint8), 1)
+        assert first != second
+        assert abs(int(decoded[0, 0, 0]) - 100) <= 2
+        wait_for(lambda: stream.clients == 0)
+
+    @staticmethod
+    def test_submit_is_rate_limited():
+        stream = MjpegStream(port=0, max_fps=1, host="127.0.0.1")
+        stream.start()
+        try:
+            assert stream.submit(make_frame(0))
+            assert not stream.submit(make_frame(0))
+            assert stream.frames_skipped == 1
+        finally:
+            stream.stop()
+
+    @staticmethod
+    def test_submit_does_nothing_when_stopped():
+        assert not MjpegStream(port=0).submit(make_frame(0))
+
+    @staticmethod
+    def test_only_serves_this_machine_by_default(monkeypatch):
+        monkeypatch.setattr(
+            mjpeg_stream,
+            "read_configs",
+            lambda: {"mjpegStream": {"enabled": True, "port": 0}},
+        )
+        stream = MjpegStream.from_configs()
+        stream.start()
+        try:
+            assert stream._server.server_address[0] == "127.0.0.1"
+        finally:
+            stream.stop()
+
+        monkeypatch.setattr(
+            mjpeg_stream,
+            "read_configs",
+            lambda: {"mjpegStream": {"enabled": True, "host": ""}},
+        )
+        assert MjpegStream.from_configs().host == ""
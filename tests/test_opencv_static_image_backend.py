@@ -0,0 +1,62 @@
+from contextlib import nullcontext
+
+import cv2
+import numpy as np
+import pytest
+
+from backend.opencv_static_image_backend import OpenCVStaticImageBackend
+from canvas import Canvas, Colour
+
+
+@pytest.fixture
+def shown_frames(monkeypatch):
+    """ Collects the frames shown, as there may be no display to show them """
+    frames = []
+    monkeypatch.setattr(
+        cv2, "imshow", lambda name, frame: frames.append(frame.copy())
+    )
+    monkeypatch.setattr(cv2, "waitKey", lambda delay: -1)
+    return frames
+
+
+def make_backend():
+    backend = OpenCVStaticImageBackend(40, 30, print, print, nullcontext())
+    backend.background = np.full((30, 40, 3), 50, np.uint8)
+    return backend
+
+
+class TestOpenCVStaticImageBackend:
+    @staticmethod
+    def test_frame_is_only_composited_on_change(shown_frames):
+        backend = make_backend()
+        data_canvas = Canvas(40, 30)
+        backend.on_canvases_updated(data_canvas, Canvas(40, 30))
+
+        for _ in range(3):
+            backend._on_loop()
+        assert len(shown_frames) == 1
+
+        # Updating the canvases without changing them does nothing
+        backend.on_canvases_updated(data_canvas, backend.message_canvas)
+        backend._on_loop()
+        assert len(shown_frames) == 1
+
+        data_canvas.draw_rect((0, 0), (9, 9), Colour.red)
+        backend.on_canvases_updated(data_canvas, backend.message_canvas)
+        backend._on_loop()
+        assert len(shown_frames) == 2
+        assert (shown_frames[-1][:10, :10] == (0, 0, 255)).all()
+        assert (shown_frames[-1][10:] == 50).all()
+
+    @staticmethod
+    def test_rotation_change_recomposites(shown_frames):
+        backend = make_backend()
+        backend.background[:, :20] = 200
+        backend._on_loop()
+
+        backend.video_rotation = 180
+        backend._on_loop()
+
+        assert len(shown_frames) == 2
+        assert (shown_frames[-1][:, 20:] == 200).all()
+        assert (shown_frames[-1][:, :20] == 50).all()
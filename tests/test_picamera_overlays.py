@@ -0,0 +1,152 @@
+from contextlib import nullcontext
+
+import numpy as np
+
+from backend import picamera_backend
+from backend.picamera_overlays import (
+    PiCameraOverlayLayer,
+    PiCameraOverlayManager,
+)
+from canvas import Canvas, Colour
+
+
+class FakeRenderer:
+    """ Stands in for `picamera.PiOverlayRenderer` """
+
+    def __init__(self, source, size):
+        self.size = size
+        self.sources = [np.array(source)]
+        self.source_ids = [id(source)]
+        self.layer = 0
+        self.fullscreen = True
+        self.window = None
+
+    def update(self, source):
+        self.sources.append(np.array(source))
+        self.source_ids.append(id(source))
+
+
+class FakePiCamera:
+    """ Stands in for `picamera.PiCamera`, counting renderer allocations """
+
+    def __init__(self, resolution=None):
+        self.resolution = resolution
+        self.renderers = []
+        self.removed = []
+        self.previewing = False
+        self.recording = False
+        self.rotation = 0
+
+    def add_overlay(self, source, size=None, format=None, **options):
+        width, height = size
+        # picamera requires buffers padded to multiples of 32x16
+        assert source.shape == (-(-height // 16) * 16, -(-width // 32) * 32, 4)
+        renderer = FakeRenderer(source, size)
+        self.renderers.append(renderer)
+        return renderer
+
+    def remove_overlay(self, renderer):
+        self.removed.append(renderer)
+
+    def start_preview(self, **options):
+        self.previewing = True
+
+    def stop_preview(self):
+        self.previewing = False
+
+    def close(self):
+        pass
+
+
+class TestPiCameraOverlayManager:
+    @staticmethod
+    def test_renderer_is_created_once_per_layer():
+        camera = FakePiCamera()
+        manager = PiCameraOverlayManager(camera, 100, 50)
+        canvas = Canvas(100, 50)
+
+        for i in range(5):
+            canvas.clear()
+            canvas.draw_text(str(i), (10, 40), 20)
+            manager.update(canvas, PiCameraOverlayLayer.data)
+        manager.update(Canvas(100, 50), PiCameraOverlayLayer.message)
+
+        assert len(camera.renderers) == 2
+        assert camera.renderers[0].layer == PiCameraOverlayLayer.data.value
+        assert camera.renderers[0].window == (0, 0, 100, 50)
+        assert len(camera.renderers[0].sources) == 5
+        assert manager.uploads == 6
+
+    @staticmethod
+    def test_unchanged_canvases_are_not_uploaded():
+        camera = FakePiCamera()
+        manager = PiCameraOverlayManager(camera, 100, 50)
+        canvas = Canvas(100, 50)
+        canvas.draw_rect((0, 0), (9, 9), Colour.red)
+        manager.update(canvas, PiCameraOverlayLayer.data)
+
+        assert not manager.update(canvas, PiCameraOverlayLayer.data)
+
+        # Redrawn, but with the same contents
+        canvas.clear()
+        canvas.draw_rect((0, 0), (9, 9), Colour.red)
+        assert not manager.update(canvas, PiCameraOverlayLayer.data)
+
+        canvas.draw_rect((20, 0), (29, 9), Colour.red)
+        assert manager.update(canvas, PiCameraOverlayLayer.data)
+        assert manager.uploads == 2
+        assert manager.skipped == 2
+
+    @staticmethod
+    def test_buffers_alternate_and_contain_canvas():
+        camera = FakePiCamera()
+        manager = PiCameraOverlayManager(camera, 100, 50)
+        canvas = Canvas(100, 50)
+
+        for i in range(3):
+            canvas.draw_rect((i * 10, 0), (i * 10 + 9, 9), Colour.red)
+            manager.update(canvas, PiCameraOverlayLayer.data)
+
+        renderer = camera.renderers[0]
+        assert renderer.source_ids[0] != renderer.source_ids[1]
+        assert renderer.source_ids[0] == renderer.source_ids[2]
+        source = renderer.sources[-1]
+        assert source.shape == (64, 128, 4)
+        assert (source[:50, :100] == canvas.img).all()
+        assert (source[50:] == 0).all() and (source[:, 100:] == 0).all()
+
+    @staticmethod
+    def test_close_removes_overlays():
+        camera = FakePiCamera()
+        manager = PiCameraOverlayManager(camera, 100, 50)
+        manager.update(Canvas(100, 50), PiCameraOverlayLayer.base)
+        manager.close()
+
+        assert camera.removed == camera.renderers
+
+
+class TestPiCameraBackend:
+    @staticmethod
+    def test_canvas_updates_reuse_renderers(monkeypatch):
+        monkeypatch.setattr(picamera_backend, "ON_PI", True)
+        monkeypatch.setattr(
+            picamera_backend, "PiCamera", FakePiCamera, raising=False
+        )
+        backend = picamera_backend.PiCameraBackend(
+            100, 50, print, print, nullcontext()
+        )
+        data_canvas = Canvas(100, 50)
+        message_canvas = Canvas(100, 50)
+
+        backend.on_base_canvas_updated(Canvas(100, 50))
+        for i in range(10):
+            data_canvas.clear()
+            data_canvas.draw_text(str(i % 2), (10, 40), 20)
+            backend.on_canvases_updated(data_canvas, message_canvas)
+
+        camera = backend.pi_camera
+        assert len(camera.renderers) == 3
+        assert camera.removed == []
+        # The message canvas never changes after it is first shown
+        assert len(camera.renderers[2].sources) == 1
+        assert len(camera.renderers[1].sources) == 10
@@ -0,0 +1,292 @@
+from collections import namedtuple
+from contextlib import nullcontext
+from threading import Event
+from time import sleep
+
+import cv2
+import numpy as np
+
+from backend import picamera_backend
+from backend.opencv_static_image_backend import OpenCVStaticImageBackend
+from backend.pre_roll import JpegPreRollEncoder, PreRollBuffer
+from backend.recordings import PiCameraOutput
+
+FakeFrame = namedtuple("FakeFrame", "frame_type complete")
+
+
+def collect(chunks):
+    """ Returns a sink which appends the chunks passed to it to chunks """
+    return lambda data, *flags: chunks.append(data)
+
+
+class FakeClock:
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self):
+        return self.time
+
+
+class FakeEncodingCamera:
+    """ Stands in for `picamera.PiCamera`, with an H.264 encoder which only
+        produces the chunks it is given """
+
+    def __init__(self, resolution=None):
+        self.resolution = resolution
+        self.previewing = False
+        self.recording = False
+        self.rotation = 0
+        self.frame = None
+        self.output = None
+
+    def encode(self, data, frame_type=0):
+        """ Writes a chunk to the recording output, as picamera does for
+            each encoded frame """
+        self.frame = FakeFrame(frame_type, True)
+        self.output.write(data)
+
+    def start_preview(self, **options):
+        self.previewing = True
+
+    def stop_preview(self):
+        self.previewing = False
+
+    def start_recording(self, output, format=None, **options):
+        self.output = output
+        self.recording = True
+
+    def wait_recording(self, timeout=0):
+        pass
+
+    def stop_recording(self):
+        self.output = None
+        self.recording = False
+
+    def close(self):
+        pass
+
+
+class TestPreRollBuffer:
+    @staticmethod
+    def test_old_chunks_are_discarded():
+        clock = FakeClock()
+        buffer = PreRollBuffer(2, 1000, clock)
+        for i in range(10):
+            clock.time = i * 0.5
+            buffer.write(bytes([i]))
+
+        chunks = []
+        buffer.replay(collect(chunks))
+        # Only chunks written in the last 2 seconds are kept
+        assert chunks == [bytes([i]) for i in range(5, 10)]
+
+    @staticmethod
+    def test_size_is_bounded():
+        buffer = PreRollBuffer(60, 100)
+        for _ in range(50):
+            buffer.write(bytes(30))
+
+        assert len(buffer) == 3
+        assert buffer.size == 90
+
+    @staticmethod
+    def test_repeated_chunks_are_counted_once():
+        buffer = PreRollBuffer(60, 100)
+        chunk = bytes(30)
+        for _ in range(50):
+            buffer.write(chunk)
+
+        assert len(buffer) == 50
+        assert buffer.size == 30
+        buffer.write(bytes(80))
+        # The repeated chunk is only discarded once none of it is left
+        assert len(buffer) == 1
+        assert buffer.size == 80
+
+    @staticmethod
+    def test_replay_starts_at_keyframe():
+        buffer = PreRollBuffer(60, 1000)
+        buffer.write(b"a", keyframe=False)
+        buffer.write(b"b", keyframe=True)
+        buffer.write(b"c", keyframe=False)
+
+        chunks = []
+        assert buffer.replay(collect(chunks)) == 2
+        assert chunks == [b"b", b"c"]
+
+    @staticmethod
+    def test_new_chunks_follow_buffered_ones_until_stopped():
+        buffer = PreRollBuffer(60, 1000)
+        buffer.write(b"a")
+        chunks = []
+
+        buffer.start(collect(chunks))
+        buffer.write(b"b")
+        buffer.stop()
+        buffer.write(b"c")
+
+        assert chunks == [b"a", b"b"]
+        assert len(buffer) == 3
+
+
+class TestPiCameraPreRoll:
+    @staticmethod
+    def test_chunks_are_keyframes_at_sps_headers():
+        camera = FakeEncodingCamera()
+        buffer = PreRollBuffer(60, 1000)
+        camera.start_recording(PiCameraOutput(buffer, camera))
+
+        camera.encode(b"p1")
+        camera.encode(b"sps", PiCameraOutput.sps_header)
+        camera.encode(b"i")
+        camera.encode(b"p2")
+
+        chunks = []
+        buffer.replay(collect(chunks))
+        assert chunks == [b"sps", b"i", b"p2"]
+
+    @staticmethod
+    def test_recording_includes_pre_roll(tmp_path, monkeypatch):
+        monkeypatch.setattr(picamera_backend, "ON_PI", True)
+        monkeypatch.setattr(
+            picamera_backend, "PiCamera", FakeEncodingCamera, raising=False
+        )
+        backend = picamera_backend.PiCameraBackend(
+            100, 50, print, print, nullcontext()
+        )
+        backend.recording_output_file = str(tmp_path / "rec.h264")
+        camera = backend.pi_camera
+
+        backend.start_video()
+        camera.encode(b"0")
+        camera.encode(b"1", PiCameraOutput.sps_header)
+        camera.encode(b"2")
+        backend._start_recording()
+        camera.encode(b"3")
+        backend.stop_recording()
+        camera.encode(b"4")
+        backend.stop_video()
+
+        with open(backend.recording_output_file, "rb") as file:
+            assert file.read() == b"123"
+        assert not camera.recording
+
+
+class TestJpegPreRollEncoder:
+    @staticmethod
+    def test_frames_are_encoded():
+        buffer = PreRollBuffer(60, 10 ** 6)
+        encoder = JpegPreRollEncoder(buffer)
+        encoder.start()
+        frame = np.full((48, 64, 3), 200, np.uint8)
+        encoder.submit(frame)
+        encoder.stop()
+
+        chunks = []
+        buffer.replay(collect(chunks))
+        assert len(chunks) == 1
+        decoded = cv2.imdecode(np.frombuffer(chunks[0], np.uint8), 1)
+        assert decoded.shape == frame.shape
+        assert abs(int(decoded[0, 0, 0]) - 200) <= 2
+
+    @staticmethod
+    def test_unchanged_frames_reuse_jpeg():
+        buffer = PreRollBuffer(60, 10 ** 6)
+        encoder = JpegPreRollEncoder(buffer)
+        encoder.start()
+        frame = np.zeros((48, 64, 3), np.uint8)
+        encoder.submit(frame)
+        encoder.stop()
+        for _ in range(3):
+            encoder.submit(frame, changed=False)
+
+        chunks = []
+        buffer.replay(collect(chunks))
+        assert encoder.frames_encoded == 1
+        assert len(chunks) == 4
+        assert len(set(chunks)) == 1
+
+    @staticmethod
+    def test_jpegs_are_written_with_submit_time():
+        clock = FakeClock()
+        buffer = PreRollBuffer(60, 10 ** 6, clock)
+        encoder = JpegPreRollEncoder(buffer)
+        frame = np.zeros((48, 64, 3), np.uint8)
+        clock.time = 1.0
+        encoder.submit(frame)
+        # Replaces the first frame, which hasn't been encoded yet
+        clock.time = 2.0
+        encoder.submit(frame)
+        clock.time = 3.0
+        encoder.start()
+        encoder.stop()
+
+        times = []
+        buffer.replay_frames(lambda data, time: times.append(time))
+        assert times == [2.0]
+        assert encoder.frames_dropped == 1
+
+    @staticmethod
+    def test_frame_being_encoded_is_in_recording(tmp_path, monkeypatch):
+        monkeypatch.setattr(cv2, "imshow", lambda name, frame: None)
+        monkeypatch.setattr(cv2, "waitKey", lambda delay: -1)
+        backend = OpenCVStaticImageBackend(
+            64, 48, print, print, nullcontext()
+        )
+        backend.recording_output_file = str(tmp_path / "rec.avi")
+        encoding = Event()
+        imencode = cv2.imencode
+
+        def slow_imencode(*args):
+            encoding.set()
+            sleep(0.2)
+            return imencode(*args)
+
+        monkeypatch.setattr(cv2, "imencode", slow_imencode)
+        backend.start_video()
+        backend._on_loop()
+        encoding.wait(5)
+        # Only the frame which is being encoded comes before the recording
+        backend._start_recording()
+        backend._on_loop()
+        backend.stop_recording()
+        backend.pre_roll_encoder.stop()
+
+        video = cv2.VideoCapture(backend.recording_output_file)
+        count = 0
+        while video.read()[0]:
+            count += 1
+        assert count == 2
+
+    @staticmethod
+    def test_static_image_backend_recording_includes_pre_roll(
+        tmp_path, monkeypatch
+    ):
+        monkeypatch.setattr(cv2, "imshow", lambda name, frame: None)
+        monkeypatch.setattr(cv2, "waitKey", lambda delay: -1)
+        backend = OpenCVStaticImageBackend(
+            64, 48, print, print, nullcontext()
+        )
+        backend.recording_output_file = str(tmp_path / "rec.avi")
+        clock = FakeClock()
+        backend.pre_roll.clock = clock
+
+        backend.start_video()
+        backend._on_loop()
+        # Wait for the first frame to be encoded. As the frame doesn't change,
+        # later frames reuse its JPEG without the encoder thread.
+        backend.pre_roll_encoder.stop()
+        for i in range(3):
+            clock.time = (i + 1) / backend.frame_pacer.framerate
+            backend._on_loop()
+
+        backend._start_recording()
+        for _ in range(5):
+            backend._on_loop()
+        backend.stop_recording()
+
+        video = cv2.VideoCapture(backend.recording_output_file)
+        count = 0
+        while video.read()[0]:
+            count += 1
+        assert count == 4 + 5
@@ -0,0 +1,182 @@
+import json
+import os
+from contextlib import nullcontext
+from itertools import count
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from backend import picamera_backend
+from backend.opencv_static_image_backend import OpenCVStaticImageBackend
+from backend.recordings import (
+    PiCameraOutput,
+    RecordingManager,
+    SegmentedFile,
+)
+from backend.video_recorder import VideoRecorder
+from tests.test_pre_roll import FakeClock, FakeEncodingCamera
+
+
+def count_frames(path):
+    video = cv2.VideoCapture(path)
+    frames = 0
+    while video.read()[0]:
+        frames += 1
+    return frames
+
+
+class TestRecordingManager:
+    @staticmethod
+    def test_numbers_follow_existing_recordings(tmp_path):
+        for name in ["rec_3.h264", "rec_10_2.avi", "rec_x.avi", "notes.txt"]:
+            (tmp_path / name).touch()
+        recordings = RecordingManager(tmp_path, "avi")
+
+        assert recordings.start() == str(tmp_path / "rec_11.avi")
+        recordings.stop()
+        assert recordings.start() == str(tmp_path / "rec_12.avi")
+
+    @staticmethod
+    def test_folder_is_listed_once(tmp_path, monkeypatch):
+        listings = []
+        scandir = os.scandir
+
+        def counting_scandir(path):
+            listings.append(path)
+            return scandir(path)
+
+        monkeypatch.setattr(os, "scandir", counting_scandir)
+        recordings = RecordingManager(tmp_path / "recordings", "h264")
+        for _ in range(5):
+            recordings.start()
+            recordings.stop()
+
+        assert len(listings) == 1
+        assert recordings.start().endswith("rec_6.h264")
+
+    @staticmethod
+    def test_segments_roll_over_by_duration(tmp_path):
+        clock = FakeClock()
+        recordings = RecordingManager(tmp_path, "avi", 10, clock=clock)
+        recordings.start()
+
+        clock.time = 9
+        assert not recordings.should_roll()
+        clock.time = 10
+        assert recordings.should_roll()
+        recordings.next_segment()
+        assert not recordings.should_roll()
+
+        assert recordings.segments == [
+            str(tmp_path / "rec_1_1.avi"),
+            str(tmp_path / "rec_1_2.avi"),
+        ]
+        assert recordings.path == recordings.segments[-1]
+
+    @staticmethod
+    def test_segments_roll_over_by_size(tmp_path):
+        recordings = RecordingManager(tmp_path, "h264", segment_bytes=100)
+        assert not recordings.should_roll(1000)
+
+        recordings.start()
+        assert not recordings.should_roll(99)
+        assert recordings.should_roll(100)
+
+    @staticmethod
+    def test_unsegmented_recordings_never_roll(tmp_path):
+        clock = FakeClock()
+        recordings = RecordingManager(tmp_path, "h264", clock=clock)
+        recordings.start()
+        clock.time = 10 ** 6
+
+        assert not recordings.should_roll(10 ** 12)
+
+
+class TestSegmentedFile:
+    @staticmethod
+    def test_segments_start_at_keyframes(tmp_path):
+        recordings = RecordingManager(tmp_path, "h264", segment_bytes=4)
+        output = SegmentedFile(recordings.start(), recordings)
+
+        output.write(b"K123")
+        output.write(b"4567", keyframe=False)
+        output.write(b"K890")
+        output.close()
+
+        contents = [Path(path).read_bytes() for path in recordings.segments]
+        assert contents == [b"K1234567", b"K890"]
+
+
+class TestSegmentedRecording:
+    @staticmethod
+    def test_video_recorder_keeps_every_frame(tmp_path):
+        # Each segment lasts a few frames
+        clock = count().__next__
+        recordings = RecordingManager(tmp_path, "avi", 4, clock=clock)
+        recorder = VideoRecorder(
+            recordings.start(), 30, (64, 48), recordings=recordings
+        )
+        recorder.start()
+        for i in range(10):
+            recorder.write(np.full((48, 64, 3), i * 20, np.uint8))
+        recorder.stop()
+
+        recorder.check_errors()
+        assert len(recordings.segments) > 1
+        assert sum(map(count_frames, recordings.segments)) == 10
+
+    @staticmethod
+    def test_status_lists_segments(tmp_path, monkeypatch):
+        monkeypatch.setattr(cv2, "imshow", lambda name, frame: None)
+        monkeypatch.setattr(cv2, "waitKey", lambda delay: -1)
+        statuses = []
+        backend = OpenCVStaticImageBackend(
+            64, 48, statuses.append, print, nullcontext()
+        )
+        backend.pre_roll = None
+        clock = FakeClock()
+        backend.recordings = RecordingManager(tmp_path, "avi", 60, clock=clock)
+
+        backend.start_recording()
+        backend._on_loop()
+        clock.time = 60
+        backend._on_loop()
+        backend.recorder.stop()
+        backend.send_recording_status()
+        backend.stop_recording()
+
+        status = json.loads(statuses[-2])
+        assert status["recordingSegments"] == [
+            str(tmp_path / "rec_1_1.avi"),
+            str(tmp_path / "rec_1_2.avi"),
+        ]
+        assert status["recordingFile"] == str(tmp_path / "rec_1_2.avi")
+        assert "recordingSegments" not in json.loads(statuses[-1])
+
+    @staticmethod
+    def test_picamera_splits_at_keyframes(tmp_path, monkeypatch):
+        monkeypatch.setattr(picamera_backend, "ON_PI", True)
+        monkeypatch.setattr(
+            picamera_backend, "PiCamera", FakeEncodingCamera, raising=False
+        )
+        backend = picamera_backend.PiCameraBackend(
+            100, 50, print, print, nullcontext()
+        )
+        backend.pre_roll = None
+        clock = FakeClock()
+        backend.recordings = RecordingManager(
+            tmp_path, "h264", 60, clock=clock
+        )
+        camera = backend.pi_camera
+
+        backend.start_recording()
+        camera.encode(b"K1", PiCameraOutput.sps_header)
+        clock.time = 60
+        camera.encode(b"2")
+        camera.encode(b"K3", PiCameraOutput.sps_header)
+        segments = backend.recordings.segments
+        backend.stop_recording()
+
+        contents = [Path(path).read_bytes() for path in segments]
+        assert contents == [b"K12", b"K3"]
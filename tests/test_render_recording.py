@@ -0,0 +1,247 @@
+import shutil
+
+import cv2
+import numpy as np
+
+import render_recording as render_module
+from backend.recordings import RecordingManager
+from backend.telemetry import TelemetryWriter, telemetry_path
+from data import DataV3
+from overlay_new import OverlayNew
+from render_recording import (
+    ChunkRenderer,
+    ChunkResult,
+    count_frames,
+    find_overlay,
+    render_recording,
+    split_frames,
+)
+from tests.test_burn_in import read_frames
+from tests.test_pre_roll import FakeClock
+
+
+def make_recording(tmp_path, frames=20):
+    """ Records a video of grey frames, and telemetry in which the power
+        changes after a second """
+    recordings = RecordingManager(tmp_path, "avi")
+    path = recordings.start()
+    writer = cv2.VideoWriter(
+        path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (160, 120)
+    )
+    data = DataV3()
+    clock = FakeClock()
+    telemetry = TelemetryWriter(data, recordings, clock)
+    telemetry.start()
+    for i in range(frames):
+        writer.write(np.full((120, 160, 3), 128, np.uint8))
+        clock.time = i / 10
+        data["power"].update(100 if i < 10 else 300)
+        telemetry.write(telemetry.snapshot())
+    writer.release()
+    telemetry.stop()
+    return path
+
+
+def make_segments(tmp_path):
+    """ Records a video of two segments, and telemetry in which the power
+        is 300 in the second, and the first frame is from the pre-roll """
+    recordings = RecordingManager(tmp_path, "avi", segment_bytes=1)
+    paths = [recordings.start()]
+    data = DataV3()
+    clock = FakeClock()
+    telemetry = TelemetryWriter(data, recordings, clock)
+    telemetry.start()
+    for segment in range(2):
+        writer = cv2.VideoWriter(
+            paths[-1], cv2.VideoWriter_fourcc(*"MJPG"), 10, (160, 120)
+        )
+        for i in range(5):
+            writer.write(np.full((120, 160, 3), 128, np.uint8))
+            clock.time = (segment * 5 + i) / 10
+            data["power"].update(100 if segment == 0 else 300)
+            if segment == 0 and i == 0:
+                telemetry.write()
+            else:
+                telemetry.write(telemetry.snapshot())
+        writer.release()
+        paths.append(recordings.next_segment())
+    telemetry.stop()
+    return paths[:2]
+
+
+class TestRenderRecording:
+    @staticmethod
+    def test_frames_are_split_evenly():
+        assert split_frames(10, 3) == [(0, 3), (3, 6), (6, 10)]
+        assert split_frames(2, 4) == [(0, 1), (1, 2)]
+
+    @staticmethod
+    def test_overlay_is_found_in_file():
+        assert find_overlay("overlay_new.py") is OverlayNew
+
+    @staticmethod
+    def test_chunks_render_like_whole_video(tmp_path):
+        video = make_recording(tmp_path)
+        renderer = ChunkRenderer("overlay_new.py", "V3", telemetry_path(video))
+
+        whole = [
+            frame.copy() for frame in renderer.render_frames(video, 0, 20)
+        ]
+        chunked = []
+        for start, end in [(13, 20), (0, 6), (6, 13)]:
+            chunk = renderer.render_frames(video, start, end)
+            chunked.append([frame.copy() for frame in chunk])
+        chunked = chunked[1] + chunked[2] + chunked[0]
+
+        assert len(whole) == 20
+        assert whole[0].shape == (600, 1024, 3)
+        assert all((a == b).all() for a, b in zip(whole, chunked))
+        # The data layer is redrawn when the power changes, after a second
+        assert (whole[9] == whole[0]).all()
+        assert (whole[10] != whole[9]).any()
+
+    @staticmethod
+    def test_workers_render_whole_video(tmp_path):
+        video = make_recording(tmp_path)
+        output = str(tmp_path / "output.avi")
+        reports = []
+
+        stats = render_recording(
+            video,
+            output,
+            "overlay_new.py",
+            "V3",
+            workers=3,
+            report=reports.append,
+        )
+
+        frames = read_frames(output)
+        assert len(frames) == 20
+        assert frames[0].shape == (600, 1024, 3)
+        assert sum(frames for frames, _ in stats.values()) == 20
+        workers = [report for report in reports if report.startswith("Worker")]
+        assert len(workers) == len(stats)
+        assert all("fps" in report for report in workers)
+
+    @staticmethod
+    def test_later_segments_use_their_own_telemetry(tmp_path):
+        _, second = make_segments(tmp_path)
+        renderer = ChunkRenderer(
+            "overlay_new.py", "V3", telemetry_path(second)
+        )
+
+        assert renderer.telemetry.first_frame == 5
+        next(renderer.render_frames(second, 0, 5))
+        assert renderer.data["power"].get() == 300
+        assert renderer.start_timestamp == 0.5
+
+    @staticmethod
+    def test_frames_without_data_are_rendered_without_it(tmp_path):
+        first, _ = make_segments(tmp_path)
+        renderer = ChunkRenderer("overlay_new.py", "V3", telemetry_path(first))
+
+        frames = renderer.render_frames(first, 0, 5)
+        next(frames)
+        assert not renderer.data["power"].is_valid()
+        next(frames)
+        assert renderer.data["power"].get() == 100
+        # The time starts at the first frame with data
+        assert renderer.start_timestamp == 0.1
+
+    @staticmethod
+    def test_chunks_are_joined_without_encoding(tmp_path, monkeypatch):
+        commands = []
+        monkeypatch.setattr(render_module.shutil, "which", lambda name: name)
+        monkeypatch.setattr(
+            render_module.subprocess,
+            "run",
+            lambda command, check: commands.append(command),
+        )
+        results = [
+            ChunkResult(i, str(tmp_path / f"chunk_{i}.avi"), 0, 10, 1.0)
+            for i in range(2)
+        ]
+
+        render_module._join_chunks(results, "output.avi", 30)
+
+        (command,) = commands
+        assert command[0] == "ffmpeg"
+        assert command[-3:] == ["-c", "copy", "output.avi"]
+        with open(command[command.index("-i") + 1]) as list_file:
+            assert list_file.read().splitlines() == [
+                f"file '{result.path}'" for result in results
+            ]
+
+    @staticmethod
+    def test_raw_video_is_counted_from_telemetry(tmp_path):
+        video = make_recording(tmp_path)
+        raw = tmp_path / "rec_1.h264"
+        raw.touch()
+
+        assert count_frames(str(raw), telemetry_path(video)) == 20
+
+    @staticmethod
+    def test_raw_video_is_rendered_in_one_chunk_without_ffmpeg(
+        tmp_path, monkeypatch
+    ):
+        video = make_recording(tmp_path)
+        raw = str(tmp_path / "rec_1.h264")
+        shutil.copy(video, raw)
+        monkeypatch.setattr(render_module.shutil, "which", lambda name: None)
+        reports = []
+
+        render_recording(
+            raw,
+            str(tmp_path / "output.avi"),
+            "overlay_new.py",
+            "V3",
+            telemetry_path(video),
+            workers=3,
+            report=reports.append,
+        )
+
+        assert len(read_frames(str(tmp_path / "output.avi"))) == 20
+        chunks = [report for report in reports if report.startswith("Chunk")]
+        assert len(chunks) == 1
+        assert chunks[0].startswith("Chunk 1/1: 20 frames")
+
+    @staticmethod
+    def test_raw_video_is_remuxed_for_chunks(tmp_path, monkeypatch):
+        video = make_recording(tmp_path)
+        raw = str(tmp_path / "rec_1.h264")
+        shutil.copy(video, raw)
+        commands = []
+
+        def run(command, check):
+            """ Stands in for ffmpeg, copying the video for the remux and
+                encoding the chunks again for the join """
+            commands.append(command)
+            source = command[command.index("-i") + 1]
+            if command[-1].endswith(".mkv"):
+                shutil.copy(source, command[-1])
+                return
+            with open(source) as list_file:
+                paths = [line.split("'")[1] for line in list_file]
+            results = [ChunkResult(0, path, 0, 0, 0.0) for path in paths]
+            render_module._encode_chunks(results, command[-1], 10)
+
+        monkeypatch.setattr(render_module.shutil, "which", lambda name: name)
+        monkeypatch.setattr(render_module.subprocess, "run", run)
+        reports = []
+
+        render_recording(
+            raw,
+            str(tmp_path / "output.avi"),
+            "overlay_new.py",
+            "V3",
+            telemetry_path(video),
+            workers=2,
+            report=reports.append,
+        )
+
+        remux = commands[0]
+        assert remux[remux.index("-i") + 1] == raw
+        assert remux[-3:-1] == ["-c", "copy"]
+        assert len(read_frames(str(tmp_path / "output.avi"))) == 20
+        chunks = [report for report in reports if report.startswith("Chunk")]
+        assert len(chunks) == 8
@@ -0,0 +1,117 @@
+from canvas import Canvas, Colour
+from components import Component, RetainedRenderer
+from data import DataFactory
+
+
+class FakeRect(Component):
+    """ Draws a rectangle whose colour is taken from the data """
+
+    def __init__(self, field, top_left, bottom_right):
+        self.field = field
+        self.top_left = top_left
+        self.bottom_right = bottom_right
+        self.draw_count = 0
+
+    def draw_base(self, canvas):
+        pass
+
+    def draw_data(self, canvas, data):
+        self.draw_count += 1
+        canvas.draw_rect(
+            self.top_left, self.bottom_right, data.colours[self.field]
+        )
+
+    def get_render_state(self, data):
+        return (data.colours[self.field],)
+
+
+def make_data():
+    data = DataFactory.create("V3")
+    data.colours = {"a": Colour.red, "b": Colour.white, "c": Colour.yellow}
+    return data
+
+
+class TestRetainedRenderer:
+    @staticmethod
+    def test_first_update_draws_everything():
+        canvas = Canvas(60, 20)
+        components = [
+            FakeRect("a", (0, 0), (9, 9)),
+            FakeRect("b", (20, 0), (29, 9)),
+        ]
+        renderer = RetainedRenderer(components)
+
+        assert renderer.draw_data(canvas, make_data())
+        assert [c.draw_count for c in components] == [1, 1]
+
+    @staticmethod
+    def test_unchanged_components_are_not_redrawn():
+        canvas = Canvas(60, 20)
+        components = [
+            FakeRect("a", (0, 0), (9, 9)),
+            FakeRect("b", (20, 0), (29, 9)),
+        ]
+        renderer = RetainedRenderer(components)
+        data = make_data()
+        renderer.draw_data(canvas, data)
+        version = canvas.version
+
+        assert not renderer.draw_data(canvas, data)
+        assert canvas.version == version, "Canvas was modified"
+
+        data.colours["b"] = Colour.red
+        assert renderer.draw_data(canvas, data)
+        assert [c.draw_count for c in components] == [1, 2]
+        assert tuple(canvas.img[5, 25]) == Colour.red.value
+
+    @staticmethod
+    def test_overlapping_components_are_redrawn():
+        canvas = Canvas(60, 20)
+        components = [
+            FakeRect("a", (0, 0), (19, 9)),
+            FakeRect("b", (10, 0), (29, 9)),
+            FakeRect("c", (40, 0), (49, 9)),
+        ]
+        renderer = RetainedRenderer(components)
+        data = make_data()
+        renderer.draw_data(canvas, data)
+
+        data.colours["a"] = Colour.black
+        renderer.draw_data(canvas, data)
+
+        assert [c.draw_count for c in components] == [2, 2, 1]
+        # The component drawn later still covers the overlap
+        assert tuple(canvas.img[5, 15]) == Colour.white.value
+        assert tuple(canvas.img[5, 5]) == Colour.black.value
+
+    @staticmethod
+    def test_output_matches_full_redraw():
+        data = make_data()
+        components = [
+            FakeRect("a", (0, 0), (19, 9)),
+            FakeRect("b", (10, 5), (29, 14)),
+            FakeRect("c", (25, 0), (49, 9)),
+        ]
+        canvas = Canvas(60, 20)
+        renderer = RetainedRenderer(components)
+        renderer.draw_data(canvas, data)
+        data.colours["b"] = Colour.black
+        renderer.draw_data(canvas, data)
+
+        expected = Canvas(60, 20)
+        for component in components:
+            component.draw_data(expected, data)
+
+        assert (canvas.img == expected.img).all()
+
+    @staticmethod
+    def test_components_without_state_are_always_redrawn():
+        canvas = Canvas(60, 20)
+        component = FakeRect("a", (0, 0), (9, 9))
+        component.get_render_state = lambda data: None
+        renderer = RetainedRenderer([component])
+        data = make_data()
+
+        renderer.draw_data(canvas, data)
+        assert renderer.draw_data(canvas, data)
+        assert component.draw_count == 2
@@ -0,0 +1,180 @@
+import os
+from contextlib import nullcontext
+
+import cv2
+import numpy as np
+
+from backend.headless_backend import HeadlessBackend
+from backend.recordings import RecordingManager
+from backend.telemetry import TelemetryReader, TelemetryWriter, telemetry_path
+from backend.video_recorder import VideoRecorder
+from data import DataV3
+from tests.test_pre_roll import FakeClock
+from tests.test_video_recorder import count_frames
+
+
+class TestTelemetry:
+    @staticmethod
+    def test_records_are_read_by_frame(tmp_path):
+        data = DataV3()
+        clock = FakeClock()
+        recordings = RecordingManager(tmp_path, "h264")
+        writer = TelemetryWriter(data, recordings, clock)
+
+        path = recordings.start()
+        writer.start()
+        for i in range(10):
+            clock.time = i / 30
+            data["power"].update(100 + i)
+            if i == 5:
+                data["plan_name"].update("qualifying")
+                data.set_logging(True)
+                data.load_message("Box this lap")
+            writer.write(writer.snapshot())
+        writer.stop()
+
+        with TelemetryReader(telemetry_path(path)) as reader:
+            assert len(reader) == 10
+            time, fields = reader[7]
+            assert time == 7 / 30
+            assert fields["power"] == 107
+            assert fields["plan_name"] == "qualifying"
+            assert fields["logging"] is True
+            assert fields["message"] == "Box this lap"
+            # Never updated, so never valid
+            assert fields["cadence"] is None
+            assert reader[2][1]["plan_name"] is None
+            assert reader[2][1]["message"] is None
+            assert reader.fields == writer.fields
+
+    @staticmethod
+    def test_data_is_taken_when_frame_is_captured(tmp_path):
+        data = DataV3()
+        recordings = RecordingManager(tmp_path, "h264")
+        writer = TelemetryWriter(data, recordings)
+
+        path = recordings.start()
+        writer.start()
+        data["power"].update(100)
+        snapshot = writer.snapshot()
+        data["power"].update(200)
+        writer.write(snapshot)
+        writer.stop()
+
+        with TelemetryReader(telemetry_path(path)) as reader:
+            assert reader[0][1]["power"] == 100
+
+    @staticmethod
+    def test_frames_without_data_offset_later_records(tmp_path):
+        data = DataV3()
+        data["power"].update(250)
+        recordings = RecordingManager(tmp_path, "h264")
+        writer = TelemetryWriter(data, recordings)
+
+        path = recordings.start()
+        writer.start()
+        for _ in range(3):
+            writer.write()
+        writer.write(writer.snapshot())
+        writer.stop()
+
+        with TelemetryReader(telemetry_path(path)) as reader:
+            assert len(reader) == 4
+            assert reader[0] == (
+                None,
+                {field: None for field in writer.fields},
+            )
+            assert reader[3][0] is not None
+            assert reader[3][1]["power"] == 250
+
+    @staticmethod
+    def test_new_file_for_each_segment(tmp_path):
+        data = DataV3()
+        recordings = RecordingManager(tmp_path, "h264", segment_bytes=1)
+        writer = TelemetryWriter(data, recordings)
+
+        first = recordings.start()
+        writer.start()
+        for _ in range(3):
+            writer.write(writer.snapshot())
+        second = recordings.next_segment()
+        for _ in range(2):
+            writer.write(writer.snapshot())
+        writer.stop()
+
+        with TelemetryReader(telemetry_path(first)) as reader:
+            assert (reader.first_frame, len(reader)) == (0, 3)
+        with TelemetryReader(telemetry_path(second)) as reader:
+            assert (reader.first_frame, len(reader)) == (3, 2)
+            reader[4]
+
+    @staticmethod
+    def test_records_are_only_written_once_started(tmp_path):
+        data = DataV3()
+        recordings = RecordingManager(tmp_path, "h264")
+        writer = TelemetryWriter(data, recordings)
+        path = recordings.start()
+
+        # eg. from a recorder which started before the telemetry file did
+        writer.write(writer.snapshot())
+        writer.start()
+        writer.write(writer.snapshot())
+        writer.stop()
+
+        with TelemetryReader(telemetry_path(path)) as reader:
+            assert len(reader) == 1
+            assert reader.first_frame == 0
+
+    @staticmethod
+    def test_recorder_writes_a_record_per_frame(tmp_path):
+        data = DataV3()
+        data["power"].update(250)
+        recordings = RecordingManager(tmp_path, "avi")
+        writer = TelemetryWriter(data, recordings)
+        path = recordings.start()
+        writer.start()
+        recorder = VideoRecorder(
+            path, 30, (64, 48), recordings=recordings, telemetry=writer
+        )
+        frame = np.zeros((48, 64, 3), np.uint8)
+        jpeg = cv2.imencode(".jpg", frame)[1].tobytes()
+
+        recorder.write_pre_roll(jpeg)
+        recorder.write_pre_roll(jpeg)
+        recorder.start()
+        for _ in range(3):
+            recorder.write(frame)
+        recorder.stop()
+        writer.stop()
+
+        assert count_frames(path) == 5
+        with TelemetryReader(telemetry_path(path)) as reader:
+            assert len(reader) == 5
+            assert reader[1][0] is None
+            assert reader[2][1]["power"] == 250
+
+    @staticmethod
+    def test_backend_records_each_frame_written(tmp_path):
+        backend = HeadlessBackend(64, 48, print, print, nullcontext())
+        backend.recordings = RecordingManager(tmp_path, "avi")
+        backend.paced = False
+        data = DataV3()
+        data["power"].update(250)
+        backend.set_data(data)
+
+        with backend:
+            backend.on_loop()
+            backend.start_recording()
+            for _ in range(4):
+                backend.on_loop()
+            backend.stop_recording()
+            backend.on_loop()
+
+        video = backend.recording_output_file
+        path = telemetry_path(video)
+        assert os.path.basename(path) == "rec_1.telemetry"
+        with TelemetryReader(path) as reader:
+            # The frame from before the recording is in its pre-roll
+            assert len(reader) == count_frames(video) == 5
+            assert reader[0][0] is None
+            assert reader[4][1]["power"] == 250
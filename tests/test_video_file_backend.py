@@ -0,0 +1,155 @@
+import json
+from contextlib import nullcontext
+from time import sleep
+
+import cv2
+import numpy as np
+
+from backend import BackendFactory, VideoFileBackend, video_file_backend
+from backend.frame_pool import FramePool
+from backend.video_file_backend import VideoFileReader, VideoPacing
+from tests.test_pre_roll import FakeClock
+
+
+def make_video(tmp_path, frames=5):
+    """ Records a video whose frames get brighter, by 40 each frame """
+    path = str(tmp_path / "video.avi")
+    writer = cv2.VideoWriter(
+        path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (64, 48)
+    )
+    for i in range(frames):
+        writer.write(np.full((48, 64, 3), 40 * i, np.uint8))
+    writer.release()
+    return path
+
+
+def brightness(frame):
+    return round(frame.mean() / 40)
+
+
+def wait_for_frames(reader, count):
+    for _ in range(500):
+        if reader.frames_decoded >= count:
+            return
+        sleep(0.01)
+
+
+class TestVideoFileReader:
+    @staticmethod
+    def test_fast_pacing_plays_every_frame_and_loops(tmp_path):
+        reader = VideoFileReader(
+            cv2.VideoCapture(make_video(tmp_path)),
+            FramePool(),
+            VideoPacing.fast,
+            decode_ahead=2,
+        )
+        reader.start()
+        frames = [brightness(reader.read()) for _ in range(7)]
+        reader.stop()
+
+        assert frames == [0, 1, 2, 3, 4, 0, 1]
+        assert reader.loops == 1
+        assert reader.frames_dropped == 0
+
+    @staticmethod
+    def test_realtime_pacing_drops_late_frames(tmp_path):
+        clock = FakeClock()
+        reader = VideoFileReader(
+            cv2.VideoCapture(make_video(tmp_path)),
+            FramePool(),
+            VideoPacing.realtime,
+            loop=False,
+            clock=clock,
+        )
+        reader.start()
+        wait_for_frames(reader, 5)
+
+        assert brightness(reader.read()) == 0
+        assert reader.read() is None
+        clock.time = 0.35
+        assert brightness(reader.read()) == 3
+        reader.stop()
+
+        assert reader.frames_dropped == 2
+        assert reader.finished
+
+    @staticmethod
+    def test_fixed_pacing_uses_set_frame_rate(tmp_path):
+        clock = FakeClock()
+        reader = VideoFileReader(
+            cv2.VideoCapture(make_video(tmp_path)),
+            FramePool(),
+            VideoPacing.fixed,
+            framerate=2,
+            clock=clock,
+        )
+        reader.start()
+        wait_for_frames(reader, 5)
+
+        reader.read()
+        clock.time = 0.35
+        assert reader.read() is None
+        clock.time = 0.5
+        assert brightness(reader.read()) == 1
+        reader.stop()
+
+
+class TestVideoFileBackend:
+    @staticmethod
+    def test_plays_video_as_feed(tmp_path, monkeypatch):
+        monkeypatch.setattr(
+            video_file_backend,
+            "read_configs",
+            lambda: {"videoFile": {"pacing": "fast"}},
+        )
+        monkeypatch.setattr(cv2, "imshow", lambda name, frame: None)
+        monkeypatch.setattr(cv2, "waitKey", lambda delay: -1)
+        monkeypatch.setattr(cv2, "destroyAllWindows", lambda: None)
+        statuses = []
+        backend = BackendFactory.create(
+            "video_file", 128, 96, print, statuses.append, nullcontext()
+        )
+        assert isinstance(backend, VideoFileBackend)
+        assert not backend.paced
+
+        with backend:
+            # Nothing is played until a video is set
+            backend.on_loop()
+            backend.set_video(make_video(tmp_path))
+            for _ in range(3):
+                backend.on_loop()
+            assert backend.frame.shape == (96, 128, 3)
+            assert brightness(backend.frame) == 2
+            backend.send_video_status()
+
+        status = json.loads(statuses[-2])
+        assert status["online"]
+        assert status["videoFramesDecoded"] >= 3
+
+    @staticmethod
+    def test_paced_once_video_ends(tmp_path, monkeypatch):
+        monkeypatch.setattr(
+            video_file_backend,
+            "read_configs",
+            lambda: {"videoFile": {"pacing": "fast", "loop": False}},
+        )
+        monkeypatch.setattr(cv2, "imshow", lambda name, frame: None)
+        monkeypatch.setattr(cv2, "waitKey", lambda delay: -1)
+        monkeypatch.setattr(cv2, "destroyAllWindows", lambda: None)
+        backend = BackendFactory.create(
+            "video_file", 128, 96, print, print, nullcontext()
+        )
+        video = make_video(tmp_path, frames=3)
+
+        with backend:
+            backend.set_video(video)
+            for _ in range(2):
+                backend.on_loop()
+            assert not backend.paced
+            backend.on_loop()
+            # The last frame stays shown, and the loop waits for the pacer
+            assert backend.paced
+            assert brightness(backend.frame) == 2
+
+            backend.set_video(video)
+            assert not backend.paced
@@ -0,0 +1,186 @@
+import json
+from contextlib import nullcontext
+from threading import Event
+
+import cv2
+import numpy as np
+import pytest
+
+from backend.headless_backend import HeadlessBackend
+from backend.opencv_static_image_backend import OpenCVStaticImageBackend
+from backend.video_recorder import QueueFullPolicy, VideoRecorder
+
+
+class BlockedWriter:
+    """ Stands in for cv2.VideoWriter, only writing once unblocked """
+
+    unblocked = Event()
+    frames = []
+
+    def __init__(self, *args):
+        BlockedWriter.frames = []
+        BlockedWriter.unblocked.clear()
+
+    @staticmethod
+    def isOpened():
+        return True
+
+    @staticmethod
+    def write(frame):
+        BlockedWriter.unblocked.wait(5)
+        BlockedWriter.frames.append(frame[0, 0, 0])
+
+    @staticmethod
+    def release():
+        pass
+
+
+def make_frame(value):
+    return np.full((48, 64, 3), value, np.uint8)
+
+
+def count_frames(path):
+    video = cv2.VideoCapture(path)
+    count = 0
+    while video.read()[0]:
+        count += 1
+    return count
+
+
+class TestVideoRecorder:
+    @staticmethod
+    def test_records_all_frames(tmp_path):
+        path = str(tmp_path / "test.avi")
+        recorder = VideoRecorder(path, 30, (64, 48))
+        recorder.start()
+        for i in range(10):
+            recorder.write(make_frame(i * 20))
+        recorder.stop()
+
+        recorder.check_errors()
+        assert recorder.frames_encoded == 10
+        assert recorder.frames_dropped == 0
+        assert count_frames(path) == 10
+
+    @staticmethod
+    def test_drop_oldest_policy(monkeypatch):
+        monkeypatch.setattr(cv2, "VideoWriter", BlockedWriter)
+        recorder = VideoRecorder("test.avi", 30, (64, 48), queue_size=3)
+        recorder.start()
+        for i in range(10):
+            recorder.write(make_frame(i))
+
+        stats = recorder.get_stats()
+        assert stats["queueDepth"] == 3
+        BlockedWriter.unblocked.set()
+        recorder.stop()
+
+        # The first frame was taken by the blocked writer, and only the
+        # newest frames were kept in the queue
+        assert BlockedWriter.frames[-3:] == [7, 8, 9]
+        assert recorder.frames_dropped == 10 - len(BlockedWriter.frames)
+        assert stats["droppedFrames"] == recorder.frames_dropped
+
+    @staticmethod
+    def test_block_policy_keeps_every_frame(monkeypatch):
+        monkeypatch.setattr(cv2, "VideoWriter", BlockedWriter)
+        recorder = VideoRecorder(
+            "test.avi",
+            30,
+            (64, 48),
+            queue_size=2,
+            policy=QueueFullPolicy.block,
+        )
+        recorder.start()
+        BlockedWriter.unblocked.set()
+        for i in range(10):
+            recorder.write(make_frame(i))
+        recorder.stop()
+
+        assert BlockedWriter.frames == list(range(10))
+        assert recorder.frames_dropped == 0
+
+    @staticmethod
+    def test_pre_roll_gaps_are_filled(tmp_path):
+        path = str(tmp_path / "rec.avi")
+        recorder = VideoRecorder(path, 10, (64, 48))
+        jpegs = [
+            cv2.imencode(".jpg", make_frame(value))[1].tobytes()
+            for value in (0, 100, 200)
+        ]
+        recorder.start()
+        # The second frame is 0.3 s after the first, so the first is repeated
+        # for the two frames dropped in between. The third frame's slot is
+        # already taken by the second.
+        assert recorder.write_pre_roll(jpegs[0], 5.0) == 1
+        assert recorder.write_pre_roll(jpegs[1], 5.3) == 3
+        assert recorder.write_pre_roll(jpegs[2], 5.32) == 0
+        recorder.write(make_frame(250))
+        recorder.stop()
+
+        video = cv2.VideoCapture(path)
+        values = []
+        while True:
+            success, frame = video.read()
+            if not success:
+                break
+            values.append(round(frame.mean() / 50) * 50)
+        assert values == [0, 0, 0, 100, 250]
+        assert recorder.pre_roll_frames == 4
+
+    @staticmethod
+    def test_unopened_file_raises(tmp_path):
+        path = str(tmp_path / "missing" / "test.avi")
+        recorder = VideoRecorder(path, 30, (64, 48))
+        with pytest.raises(RuntimeError):
+            recorder.start()
+
+
+class TestOpenCVRecording:
+    @staticmethod
+    def test_static_image_backend_records(tmp_path, monkeypatch):
+        monkeypatch.setattr(cv2, "imshow", lambda name, frame: None)
+        monkeypatch.setattr(cv2, "waitKey", lambda delay: -1)
+        statuses = []
+        backend = OpenCVStaticImageBackend(
+            64, 48, statuses.append, print, nullcontext()
+        )
+        backend.recording_output_file = str(tmp_path / "rec.avi")
+
+        backend._start_recording()
+        for _ in range(5):
+            backend._on_loop()
+        backend.send_recording_status()
+        backend.stop_recording()
+
+        status = json.loads(statuses[0])
+        assert status["status"] == "recording"
+        assert "encodedFps" in status and "queueDepth" in status
+        assert status["droppedFrames"] == 0
+        assert json.loads(statuses[-1])["status"] == "off"
+        assert count_frames(backend.recording_output_file) == 5
+
+    @staticmethod
+    def test_stopping_video_only_stops_recordings(monkeypatch):
+        monkeypatch.setattr(cv2, "destroyAllWindows", lambda: None)
+        statuses = []
+        backend = OpenCVStaticImageBackend(
+            64, 48, statuses.append, print, nullcontext()
+        )
+
+        backend.stop_video()
+
+        assert statuses == []
+
+    @staticmethod
+    def test_headless_backend_records():
+        backend = HeadlessBackend(64, 48, print, print, nullcontext())
+
+        with backend:
+            backend.start_recording()
+            for _ in range(5):
+                backend.on_loop()
+            backend.stop_recording()
+
+        assert backend.recording_output_file.endswith(".avi")
+        assert count_frames(backend.recording_output_file) == 5